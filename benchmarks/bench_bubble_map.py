@@ -0,0 +1,68 @@
+"""
+CPU time and peak memory of the get_animated_bubble_map figure: plotly.express
+(engine="express") against the NumPy/ dict builder (engine="fast").
+Each measurement runs in a fresh process, so that the peak resident memory is its own.
+
+    python benchmarks/bench_bubble_map.py
+"""
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+from poivizdynamic import poivizdynamic as pv
+
+BUILDS = {
+    "express": pv._build_bubble_figure_express,
+    "fast": pv._build_bubble_figure,
+}
+
+
+def make_pois(n, n_dates=365, n_groups=20, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "spot_name": rng.integers(0, n_groups, n).astype(str),
+            "interest_value": rng.integers(1, 100, n),
+            "date": pd.Timestamp("2021-01-01")
+            + pd.to_timedelta(rng.integers(0, n_dates, n), unit="D"),
+            "latitude": 41 + rng.random(n),
+            "longitude": -73 + rng.random(n),
+        }
+    )
+    return df.sort_values("date", ignore_index=True)
+
+
+def measure(engine, n):
+    df = make_pois(n)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.process_time()
+    fig = BUILDS[engine](df)
+    pio.to_json(fig, validate=False)
+    seconds = time.process_time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kB on Linux
+    return seconds, (peak - base) / 1e3
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        seconds, peak = measure(sys.argv[1], int(sys.argv[2]))
+        print(f"{seconds} {peak}")
+        sys.exit()
+
+    print(f"{'rows':>9} {'engine':>8} {'CPU (s)':>9} {'peak (MB)':>10}")
+    for n in [10_000, 100_000, 1_000_000]:
+        for engine in BUILDS:
+            out = subprocess.run(
+                [sys.executable, __file__, engine, str(n)],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            seconds, peak = map(float, out.stdout.split()[-2:])
+            print(f"{n:>9} {engine:>8} {seconds:>9.2f} {peak:>10.1f}")
@@ -0,0 +1,90 @@
+"""
+Time and peak memory of clean_dataset on a 10M-row frame of raw (string) dates and coordinates, sorted by date:
+the former version (in place, inferred date format, full sort) against the new one, with and without
+an explicit date format and downcasting. Each measurement runs in a fresh process;
+the peak memory is the one allocated by the cleaning on top of its input.
+
+    python benchmarks/bench_clean_dataset.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from poivizdynamic import poivizdynamic as pv
+
+
+def legacy_clean_dataset(df):
+    df["date"] = pd.to_datetime(df["date"])
+    df["longitude"] = pd.to_numeric(df["longitude"])
+    df["latitude"] = pd.to_numeric(df["latitude"])
+    df = df.sort_values(by="date")
+    return df
+
+
+CLEANERS = {
+    "legacy": legacy_clean_dataset,
+    "default": pv.clean_dataset,
+    "format": lambda df: pv.clean_dataset(df, date_format="%Y-%m-%d %H:%M:%S"),
+    "format+downcast": lambda df: pv.clean_dataset(
+        df, date_format="%Y-%m-%d %H:%M:%S", downcast=True
+    ),
+}
+
+
+def make_raw_pois(n, n_spots=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    spots = np.array([f"spot {i}" for i in range(n_spots)], dtype=object)
+    dates = pd.Series(pd.date_range("2021-01-01", periods=n, freq="S"))
+    return pd.DataFrame(
+        {
+            "spot_name": spots[rng.integers(0, n_spots, n)],
+            "symbol": "car",
+            "interest_value": rng.integers(1, 100, n),
+            "date": dates.dt.strftime("%Y-%m-%d %H:%M:%S"),
+            "latitude": 40 + rng.random(n),
+            "longitude": -74 + rng.random(n),
+        }
+    )
+
+
+def measure(cleaner, path):
+    df = pd.read_pickle(path)
+    start = time.perf_counter()
+    out = CLEANERS[cleaner](df)
+    seconds = time.perf_counter() - start
+    # the memory allocated by the cleaning of a fresh input (NumPy reports to tracemalloc)
+    del out, df
+    df = pd.read_pickle(path)
+    tracemalloc.start()
+    out = CLEANERS[cleaner](df)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    size = out.memory_usage(deep=True).sum() / 1e6
+    return seconds, peak / 1e6, size
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        print(*measure(sys.argv[1], sys.argv[2]))
+        sys.exit()
+
+    # built once, loaded by each measurement
+    path = os.path.join(tempfile.mkdtemp(), "raw_pois.pkl")
+    make_raw_pois(10_000_000).to_pickle(path)
+    print(f"{'cleaner':>16} {'time (s)':>9} {'peak (MB)':>10} {'output (MB)':>12}")
+    for cleaner in CLEANERS:
+        out = subprocess.run(
+            [sys.executable, __file__, cleaner, path],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        seconds, peak, size = map(float, out.stdout.split()[-3:])
+        print(f"{cleaner:>16} {seconds:>9.2f} {peak:>10.1f} {size:>12.1f}")
+    os.remove(path)
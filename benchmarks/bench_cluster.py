@@ -0,0 +1,33 @@
+"""
+Points drawn and figure build + JSON time of a dense bubble map (engine = "fast"),
+without and with clustering at a few zoom levels.
+
+    python benchmarks/bench_cluster.py
+"""
+import time
+
+import plotly.io as pio
+
+from poivizdynamic import poivizdynamic as pv
+from poivizdynamic.cluster import cluster_points
+
+from bench_bubble_map import make_pois
+
+
+def measure(df):
+    start = time.perf_counter()
+    pio.to_json(pv._build_bubble_figure(df), validate=False)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    df = make_pois(1_000_000, n_dates=30)
+    print(f"{'zoom':>6} {'points':>9} {'cluster (s)':>11} {'build (s)':>9}")
+    print(f"{'-':>6} {len(df):>9} {0:>11.2f} {measure(df):>9.2f}")
+    for zoom in [2.5, 8, 10]:
+        start = time.perf_counter()
+        clusters = cluster_points(df, zoom)
+        seconds = time.perf_counter() - start
+        print(
+            f"{zoom:>6} {len(clusters):>9} {seconds:>11.2f} {measure(clusters):>9.2f}"
+        )
@@ -0,0 +1,42 @@
+"""
+Size and write time of the animated maps' html files: plotly.io.write_html against
+the compact export (base64 typed arrays and static frame attributes written once).
+
+    python benchmarks/bench_export.py
+"""
+import os
+import tempfile
+import time
+
+import plotly.io as pio
+
+from poivizdynamic import poivizdynamic as pv
+from poivizdynamic.export import write_compact_html
+
+from bench_bubble_map import make_pois
+from bench_footprint_map import make_trace
+
+WRITERS = {
+    "plotly": lambda fig, path: pio.write_html(fig, path, validate=False),
+    "compact": write_compact_html,
+}
+
+
+def measure(name, fig):
+    with tempfile.TemporaryDirectory() as tmp:
+        for writer, write in WRITERS.items():
+            path = os.path.join(tmp, f"{writer}.html")
+            start = time.perf_counter()
+            write(fig, path)
+            seconds = time.perf_counter() - start
+            size = os.path.getsize(path) / 1e6
+            print(f"{name:>24} {writer:>8} {seconds:>9.2f} {size:>10.1f}")
+
+
+if __name__ == "__main__":
+    print(f"{'figure':>24} {'writer':>8} {'write (s)':>9} {'size (MB)':>10}")
+    for n in [2_000, 10_000]:
+        fig = pv._build_footprint_figure("token", make_trace(n), max_frames=200)
+        measure(f"footprint {n}", fig)
+    for n in [100_000, 1_000_000]:
+        measure(f"bubble {n}", pv._build_bubble_figure(make_pois(n)))
@@ -0,0 +1,73 @@
+"""
+Build time and html size of the get_footprint_map figure against the trace length.
+
+"go.Frame loop" is the former construction (a growing list copied into a validated
+go.Frame per point), "dict frames" the current one with one frame per point, and
+"max_frames=200" the bounded animation for long traces.
+
+    python benchmarks/bench_footprint_map.py
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from poivizdynamic import poivizdynamic as pv
+
+
+def make_trace(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "spot_name": [f"spot {i}" for i in range(n)],
+            "symbol": "car",
+            "latitude": 40 + rng.random(n).cumsum() / n,
+            "longitude": -74 + rng.random(n).cumsum() / n,
+        }
+    )
+
+
+def legacy_figure(df_in):
+    lon_ls = df_in["longitude"].values.tolist()
+    lat_ls = df_in["latitude"].values.tolist()
+    lon, lat = [lon_ls[0]], [lat_ls[0]]
+    frames = []
+    for i in range(1, len(df_in)):
+        lon.append(lon_ls[i])
+        lat.append(lat_ls[i])
+        frames.append(go.Frame(data=[go.Scattermapbox(lon=lon, lat=lat)]))
+    return go.Figure(
+        data=[go.Scattermapbox(mode="markers+text+lines", lon=lon_ls, lat=lat_ls)],
+        frames=frames,
+    )
+
+
+def measure(build, df):
+    start = time.perf_counter()
+    fig = build(df)
+    html = pio.to_html(fig, validate=False)
+    return time.perf_counter() - start, len(html) / 1e6
+
+
+if __name__ == "__main__":
+    builds = {
+        "go.Frame loop": legacy_figure,
+        "dict frames": lambda df: pv._build_footprint_figure("token", df),
+        "max_frames=200": lambda df: pv._build_footprint_figure(
+            "token", df, max_frames=200
+        ),
+    }
+    print(f"{'points':>7} {'path':>15} {'build+html (s)':>15} {'size (MB)':>10}")
+    for n in [500, 2_000, 5_000, 20_000, 100_000]:
+        df = make_trace(n)
+        for name, build in builds.items():
+            # the quadratic paths are only run where they finish in reasonable time
+            if name != "max_frames=200" and n > (
+                2_000 if name == "go.Frame loop" else 5_000
+            ):
+                continue
+            seconds, size = measure(build, df)
+            print(f"{n:>7} {name:>15} {seconds:>15.3f} {size:>10.1f}")
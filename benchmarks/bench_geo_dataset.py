@@ -0,0 +1,66 @@
+"""
+Scaling of get_geo_dataset with a mocked geocoder (no network).
+
+Compares the columnar result building of get_geo_dataset with the former
+row-by-row accumulation (one one-line DataFrame concatenated per address).
+
+    python benchmarks/bench_geo_dataset.py
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from poivizdynamic import poivizdynamic as pv
+
+
+def make_addresses(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "unique_id": np.arange(n),
+            "spot_name": [f"spot {i}" for i in range(n)],
+            "street": [f"{i} Main St" for i in range(n)],
+            "city": rng.choice(["New York", "Seattle", "Miami", "New Haven"], n),
+            "state": rng.choice(["NY", "WA", "FL", "CT"], n),
+            "country": "us",
+            "interest_value": rng.integers(0, 100, n),
+            "date": "1/1/2022",
+            "symbol": "car",
+        }
+    )
+
+
+def mock_record(api_key, addr, maptype="world", cache=None, provider=None):
+    return {"latitude": 40.0, "longitude": -73.0, "formattedAddress": addr[0]}
+
+
+def legacy_accumulate(df):
+    # the previous implementation: a one-line DataFrame per address, appended one at a time
+    temp_nodup = df.drop_duplicates(subset=["street", "city"])
+    for i in range(len(temp_nodup)):
+        temp = temp_nodup.iloc[i, :]
+        temp = pd.DataFrame([temp.values], columns=temp.index)
+        addr = temp[["street", "city", "state", "country"]].values.tolist()[0]
+        temp2 = pd.DataFrame([mock_record(None, addr)])
+        mid = pd.concat([temp, temp2], axis=1)
+        df_out = mid if i == 0 else pd.concat([df_out, mid], ignore_index=True)
+    return df_out
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    pv._get_coordinate_record = mock_record
+    print(f"{'rows':>8} {'columnar (s)':>14} {'row-by-row (s)':>16}")
+    for n in [1_000, 10_000, 100_000]:
+        df = make_addresses(n)
+        columnar = timed(pv.get_geo_dataset, "key", df)
+        # the quadratic path is only run where it finishes in reasonable time
+        legacy = timed(legacy_accumulate, df) if n <= 10_000 else float("nan")
+        print(f"{n:>8} {columnar:>14.3f} {legacy:>16.3f}")
@@ -0,0 +1,48 @@
+"""
+Startup cost of a geocoding-only job: wall time and peak memory of a fresh interpreter that imports
+poivizdynamic and geocodes a few POIs offline, and whether plotly was loaded.
+
+    python benchmarks/bench_import.py
+"""
+import subprocess
+import sys
+
+JOBS = {
+    "import": "import poivizdynamic.poivizdynamic as pv",
+    "import + geocode": """
+import pandas as pd
+import poivizdynamic.poivizdynamic as pv
+from poivizdynamic.providers import GazetteerProvider
+df = pd.DataFrame({"street": ["1 Main St"], "city": ["Reno"], "state": ["NV"], "country": ["US"]})
+gazetteer = GazetteerProvider(df.assign(latitude=39.5, longitude=-119.8))
+pv.get_geo_dataset(None, df, provider=gazetteer)
+""",
+}
+
+MEASURE = """
+import resource, sys, time
+start = time.perf_counter()
+exec(sys.argv[1])
+seconds = time.perf_counter() - start
+plotly = any(name.split(".")[0] == "plotly" for name in sys.modules)
+# ru_maxrss is in kB on Linux
+print(seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, plotly)
+"""
+
+
+if __name__ == "__main__":
+    repeat = 5
+    print(f"{'job':>18} {'time (s)':>9} {'peak (MB)':>10} {'plotly':>7}")
+    for name, code in JOBS.items():
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", MEASURE, code],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            seconds, peak, plotly = out.stdout.split()[-3:]
+            runs.append((float(seconds), float(peak)))
+        seconds, peak = min(runs)
+        print(f"{name:>18} {seconds:>9.3f} {peak:>10.1f} {plotly:>7}")
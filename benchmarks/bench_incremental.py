@@ -0,0 +1,32 @@
+"""
+Cost of adding one day of POIs to an animated bubble map with a long history:
+full rebuild (get_animated_bubble_map, engine = "fast") against update_bubble_map.
+
+    python benchmarks/bench_incremental.py
+"""
+import tempfile
+import time
+
+from poivizdynamic import poivizdynamic as pv
+from poivizdynamic.incremental import update_bubble_map
+
+from bench_bubble_map import make_pois
+
+if __name__ == "__main__":
+    print(f"{'days':>5} {'rows':>9} {'rebuild (s)':>11} {'update (s)':>10}")
+    for n_days in [90, 365]:
+        df = make_pois(3_000 * n_days, n_dates=n_days)
+        last_day = df["date"].max()
+        history, new = df[df["date"] < last_day], df[df["date"] == last_day]
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            pv.get_animated_bubble_map(
+                df, engine="fast", show=False, output_dir=tmp, fig_name="full"
+            )
+            rebuild = time.perf_counter() - start
+
+            update_bubble_map(history, fig_name="map", output_dir=tmp)
+            start = time.perf_counter()
+            update_bubble_map(new, fig_name="map", output_dir=tmp)
+            update = time.perf_counter() - start
+        print(f"{n_days:>5} {len(df):>9} {rebuild:>11.2f} {update:>10.2f}")
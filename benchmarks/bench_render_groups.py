@@ -0,0 +1,30 @@
+"""
+Throughput of render_groups (one bubble map per group) with 1 worker and with one worker per CPU core.
+
+    python benchmarks/bench_render_groups.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from poivizdynamic.render import render_groups
+
+from bench_bubble_map import make_pois
+
+if __name__ == "__main__":
+    df = make_pois(400_000)
+    df["region"] = np.random.default_rng(1).integers(0, 40, len(df))
+    cores = os.cpu_count()
+    print(f"{'workers':>8} {'maps':>5} {'wall (s)':>9} {'maps/s':>7}")
+    for workers in sorted({1, cores}):
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            summary = render_groups(
+                df, "region", output_dir=tmp, engine="fast", max_workers=workers
+            )
+            seconds = time.perf_counter() - start
+        print(
+            f"{workers:>8} {len(summary):>5} {seconds:>9.2f} {len(summary) / seconds:>7.1f}"
+        )
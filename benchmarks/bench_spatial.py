@@ -0,0 +1,90 @@
+"""
+Reverse geocoding of GPS points against a geocoded POI table (reverse_geocode), without any API call.
+
+The POIs are clustered around 50 cities; the points are drawn near random POIs. "brute force" computes the haversine
+distance to every POI (in chunks), "grid" is the NumPy PointIndex, "kdtree" the scipy one (when scipy is installed).
+
+    python benchmarks/bench_spatial.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from poivizdynamic.spatial import PointIndex, reverse_geocode
+from poivizdynamic.trajectory import haversine
+
+
+def make_reference(n, n_cities=50, seed=0):
+    rng = np.random.default_rng(seed)
+    city_lat = rng.uniform(26, 48, n_cities)
+    city_lon = rng.uniform(-122, -70, n_cities)
+    city = rng.integers(0, n_cities, n)
+    return pd.DataFrame(
+        {
+            "spot_name": [f"spot {i}" for i in range(n)],
+            "formattedAddress": [f"{i} Main St" for i in range(n)],
+            "latitude": city_lat[city] + rng.normal(0, 0.1, n),
+            "longitude": city_lon[city] + rng.normal(0, 0.1, n),
+        }
+    )
+
+
+def make_points(reference, n, seed=1):
+    rng = np.random.default_rng(seed)
+    near = rng.integers(0, len(reference), n)
+    return pd.DataFrame(
+        {
+            "latitude": reference["latitude"].to_numpy()[near]
+            + rng.normal(0, 0.002, n),
+            "longitude": reference["longitude"].to_numpy()[near]
+            + rng.normal(0, 0.002, n),
+        }
+    )
+
+
+def brute_force(points, reference, chunk=200):
+    lat, lon = points["latitude"].to_numpy(), points["longitude"].to_numpy()
+    out = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), chunk):
+        d = haversine(
+            lat[start : start + chunk, None],
+            lon[start : start + chunk, None],
+            reference["latitude"].to_numpy(),
+            reference["longitude"].to_numpy(),
+        )
+        out[start : start + chunk] = d.argmin(axis=1)
+    return out
+
+
+if __name__ == "__main__":
+    reference = make_reference(100_000)
+    print(
+        f"{'backend':>12} {'points':>9} {'build (s)':>10} {'query (s)':>10} {'points/s':>10}"
+    )
+
+    sample = make_points(reference, 2_000)
+    start = time.perf_counter()
+    expected = brute_force(sample, reference)
+    seconds = time.perf_counter() - start
+    print(
+        f"{'brute force':>12} {len(sample):>9} {0:>10.2f} {seconds:>10.2f} {len(sample) / seconds:>10.0f}"
+    )
+
+    points = make_points(reference, 1_000_000)
+    for backend in ["grid", "kdtree"]:
+        try:
+            start = time.perf_counter()
+            index = PointIndex(reference, backend=backend)
+            build = time.perf_counter() - start
+        except ImportError:
+            print(f"{backend:>12} skipped: scipy is not installed")
+            continue
+        _, position = index.query(sample["latitude"], sample["longitude"])
+        assert (position == expected).all()
+        start = time.perf_counter()
+        reverse_geocode(points, index)
+        seconds = time.perf_counter() - start
+        print(
+            f"{backend:>12} {len(points):>9} {build:>10.2f} {seconds:>10.2f} {len(points) / seconds:>10.0f}"
+        )
@@ -0,0 +1,72 @@
+"""
+Size and load time of a cleaned, geocoded POI dataset saved as CSV, Parquet and Arrow
+(all columns, and only the MAP_COLUMNS of the map functions).
+
+    python benchmarks/bench_storage.py
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from poivizdynamic import poivizdynamic as pv
+from poivizdynamic.storage import MAP_COLUMNS, read_dataset, write_dataset
+
+
+def make_geo_pois(n, n_spots=10_000, seed=0):
+    rng = np.random.default_rng(seed)
+    spot = rng.integers(0, n_spots, n)
+    streets = np.array([f"{i} Main Street" for i in range(n_spots)], dtype=object)
+    df = pd.DataFrame(
+        {
+            "unique_id": np.arange(n),
+            "spot_name": np.array([f"spot {i}" for i in range(n_spots)])[spot],
+            "street": streets[spot],
+            "city": "New York",
+            "state": "NY",
+            "country": "US",
+            "interest_value": rng.integers(1, 100, n),
+            "date": pd.date_range("2021-01-01", periods=n, freq="S"),
+            "symbol": "car",
+            "latitude": 40 + rng.random(n),
+            "longitude": -74 + rng.random(n),
+        }
+    )
+    df["formattedAddress"] = df["street"] + ", New York, NY"
+    return pv.clean_dataset(df, downcast=True)
+
+
+def csv_read(path, columns):
+    df = pd.read_csv(path, usecols=columns)
+    return pv.clean_dataset(df, date_format="%Y-%m-%d %H:%M:%S", downcast=True)
+
+
+if __name__ == "__main__":
+    n = 5_000_000
+    df = make_geo_pois(n)
+    print(
+        f"{'format':>8} {'size (MB)':>10} {'write (s)':>9} {'read all (s)':>12} {'read map (s)':>12}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ["csv", "parquet", "arrow"]:
+            path = os.path.join(tmp, f"pois.{fmt}")
+            start = time.perf_counter()
+            if fmt == "csv":
+                df.to_csv(path, index=False)
+                read = csv_read
+            else:
+                write_dataset(df, path)
+                read = lambda path, columns: read_dataset(path, columns=columns)
+            write = time.perf_counter() - start
+            size = os.path.getsize(path) / 1e6
+
+            timings = []
+            for columns in [None, MAP_COLUMNS]:
+                start = time.perf_counter()
+                read(path, columns)
+                timings.append(time.perf_counter() - start)
+            print(
+                f"{fmt:>8} {size:>10.1f} {write:>9.2f} {timings[0]:>12.2f} {timings[1]:>12.2f}"
+            )
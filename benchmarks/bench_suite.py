@@ -0,0 +1,340 @@
+"""
+End-to-end benchmark suite, without network: synthetic POIs are geocoded through a local fake Radar/ Census server
+with a configurable latency, cleaned, and mapped. Reports the throughput, the geo-API request latency and the
+peak memory of get_geo_dataset, clean_dataset, get_footprint_map and get_animated_bubble_map, and appends them
+to a CSV file, so that the results of two versions can be compared.
+
+    python bench_suite.py --rows 1000 10000 --latency 20 --workers 16
+    python bench_suite.py --compare 0.1.7+721ba29
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from poivizdynamic import __version__
+from poivizdynamic import poivizdynamic as pv
+from poivizdynamic.clients import configure_client
+from poivizdynamic.metrics import Metrics, set_metrics
+from poivizdynamic.providers import CensusProvider, RadarProvider, register_provider
+
+CITIES = {
+    "New York": ("NY", 40.71, -74.01),
+    "Seattle": ("WA", 47.61, -122.33),
+    "Miami": ("FL", 25.76, -80.19),
+    "Chicago": ("IL", 41.88, -87.63),
+    "Denver": ("CO", 39.74, -104.99),
+}
+BRANDS = [f"brand {i}" for i in range(10)]
+COLUMNS = [
+    "label",
+    "version",
+    "commit",
+    "timestamp",
+    "python",
+    "machine",
+    "stage",
+    "rows",
+    "latency_ms",
+    "workers",
+    "seconds",
+    "rows_per_s",
+    "p50_ms",
+    "p95_ms",
+    "p99_ms",
+    "peak_mb",
+]
+
+
+def make_pois(n, n_addresses=None, n_days=90, seed=0):
+    """
+    n raw POI rows, as read from a user file (string dates, no coordinates):
+    visits of n_addresses distinct addresses (n // 5 by default) of 10 brands in 5 cities over n_days.
+    """
+    rng = np.random.default_rng(seed)
+    n_addresses = n_addresses or max(n // 5, 1)
+    k = rng.integers(0, n_addresses, n)
+    cities = np.array(list(CITIES), dtype=object)[np.arange(n_addresses) % len(CITIES)]
+    dates = pd.Timestamp("2022-01-01") + pd.to_timedelta(
+        rng.integers(0, n_days, n), unit="D"
+    )
+    return pd.DataFrame(
+        {
+            "unique_id": np.arange(n),
+            "spot_name": np.array(BRANDS, dtype=object)[k % len(BRANDS)],
+            "street": np.array(
+                [f"{i} Main St" for i in range(n_addresses)], dtype=object
+            )[k],
+            "city": cities[k],
+            "state": [CITIES[city][0] for city in cities[k]],
+            "country": "us",
+            "interest_value": rng.integers(1, 100, n),
+            "date": dates.strftime("%Y-%m-%d"),
+            "symbol": "car",
+        }
+    )
+
+
+def fake_coordinates(text):
+    # a fixed point per address, within 0.2 degree of the center of its city
+    lat, lon = 40.71, -74.01
+    for city, (_, city_lat, city_lon) in CITIES.items():
+        if city in text:
+            lat, lon = city_lat, city_lon
+    h = zlib.crc32(text.encode())
+    return lat + (h % 1000 - 500) / 2500, lon + (h // 1000 % 1000 - 500) / 2500
+
+
+class FakeGeocoderHandler(BaseHTTPRequestHandler):
+    # local stand-in for the Radar (/radar) and Census (/census) single address endpoints
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+    # send the small responses at once: with keep-alive, Nagle waits for the delayed ACK of the client (~40 ms)
+    disable_nagle_algorithm = True
+    latency = 0.0
+    jitter = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        if url.path == "/radar":
+            text = query["query"]
+            lat, lon = fake_coordinates(text)
+            body = {
+                "addresses": [
+                    {"latitude": lat, "longitude": lon, "formattedAddress": text}
+                ]
+            }
+        else:
+            text = f"{query['street']}, {query['city']}, {query['state']}"
+            lat, lon = fake_coordinates(text)
+            body = {
+                "result": {
+                    "addressMatches": [
+                        {"coordinates": {"x": lon, "y": lat}, "matchedAddress": text}
+                    ]
+                }
+            }
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGeocoderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops the connections of a burst of workers (1 s SYN retry)
+    request_queue_size = 128
+
+
+def start_fake_server(latency, jitter=0.0):
+    """
+    Serve the fake geo-APIs on a free local port with latency (+ up to jitter) seconds per request,
+    and register them as the "world" and "US" maptypes, without rate limit. Returns the server.
+    """
+    FakeGeocoderHandler.latency = latency
+    FakeGeocoderHandler.jitter = jitter
+    server = FakeGeocoderServer(("127.0.0.1", 0), FakeGeocoderHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    register_provider("world", lambda key: RadarProvider(key, api_url=base + "/radar"))
+    register_provider("US", lambda key: CensusProvider(key, api_url=base + "/census"))
+    return server
+
+
+def measure(func, *args, **kwargs):
+    """
+    Run func once timed, then once under tracemalloc. Returns the seconds, the peak memory in MB
+    and the latencies in seconds of the geo-API requests of the timed run.
+    """
+    latencies = []
+
+    def hook(kind, name, value, tags):
+        if name == "geocode.request":
+            latencies.append(value)
+
+    metrics = Metrics()
+    metrics.add_hook(hook)
+    previous = set_metrics(metrics)
+    try:
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    finally:
+        set_metrics(previous)
+
+    tracemalloc.start()
+    func(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 1e6, latencies
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(rows, latency, jitter, workers):
+    commit = git_commit()
+    info = {
+        "label": f"{__version__}+{commit}",
+        "version": __version__,
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.machine()} x{os.cpu_count()}",
+        "latency_ms": latency * 1000,
+        "workers": workers,
+    }
+    server = start_fake_server(latency, jitter)
+    for maptype in ["world", "US"]:
+        configure_client(maptype, rate=None, max_retries=0, pool_size=workers)
+
+    results = []
+    output_dir = tempfile.mkdtemp()
+    try:
+        for n in rows:
+            raw = make_pois(n)
+            geo = pv.get_geo_dataset(None, raw, maptype="world", max_workers=workers)
+            clean = pv.clean_dataset(geo, date_format="%Y-%m-%d")
+            maps = {"show": False, "output_dir": output_dir}
+            stages = {
+                "geocode[world]": (
+                    pv.get_geo_dataset,
+                    (None, raw),
+                    {"maptype": "world", "max_workers": workers},
+                ),
+                "geocode[US]": (
+                    pv.get_geo_dataset,
+                    (None, raw),
+                    {"maptype": "US", "max_workers": workers},
+                ),
+                "clean_dataset": (
+                    pv.clean_dataset,
+                    (geo,),
+                    {"date_format": "%Y-%m-%d"},
+                ),
+                "footprint_map": (
+                    pv.get_footprint_map,
+                    ("token", clean),
+                    dict(maps, fig_name="footprint", max_frames=200),
+                ),
+                "bubble_map[fast]": (
+                    pv.get_animated_bubble_map,
+                    (clean,),
+                    dict(maps, fig_name="bubble_fast", engine="fast"),
+                ),
+                "bubble_map[express]": (
+                    pv.get_animated_bubble_map,
+                    (clean,),
+                    dict(maps, fig_name="bubble_express", engine="express"),
+                ),
+            }
+            for stage, (func, args, kwargs) in stages.items():
+                seconds, peak, latencies = measure(func, *args, **kwargs)
+                p50, p95, p99 = (
+                    np.percentile(latencies, [50, 95, 99]) * 1000
+                    if latencies
+                    else [np.nan] * 3
+                )
+                results.append(
+                    dict(
+                        info,
+                        stage=stage,
+                        rows=n,
+                        seconds=seconds,
+                        rows_per_s=n / seconds,
+                        p50_ms=p50,
+                        p95_ms=p95,
+                        p99_ms=p99,
+                        peak_mb=peak,
+                    )
+                )
+                print(
+                    f"{stage:>20} {n:>8} {seconds:>9.3f} {n / seconds:>11.0f}"
+                    f" {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {peak:>10.1f}"
+                )
+    finally:
+        server.shutdown()
+    return pd.DataFrame(results, columns=COLUMNS)
+
+
+def compare(path, baseline, label):
+    results = pd.read_csv(path)
+    keys = ["stage", "rows"]
+    # the last run of each label
+    base = results[results["label"] == baseline].groupby(keys, sort=False).last()
+    new = results[results["label"] == label].groupby(keys, sort=False).last()
+    table = base[["seconds", "peak_mb"]].join(
+        new[["seconds", "peak_mb"]], lsuffix="_base", rsuffix="_new", how="inner"
+    )
+    table["speedup"] = table["seconds_base"] / table["seconds_new"]
+    print(f"{baseline} -> {label}")
+    print(table.round(3).to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument(
+        "--latency", type=float, default=20, help="fake geo-API latency (ms)"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=10, help="random extra latency (ms)"
+    )
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--output", default="bench_results.csv")
+    parser.add_argument(
+        "--compare",
+        metavar="LABEL",
+        help="compare the results of this run (or of --label) with those of LABEL in --output",
+    )
+    parser.add_argument("--label", help="with --compare: the label to compare, no run")
+    args = parser.parse_args()
+
+    if args.compare and args.label:
+        compare(args.output, args.compare, args.label)
+        sys.exit()
+
+    print(
+        f"{'stage':>20} {'rows':>8} {'time (s)':>9} {'rows/s':>11}"
+        f" {'p50 (ms)':>8} {'p95 (ms)':>8} {'p99 (ms)':>8} {'peak (MB)':>10}"
+    )
+    results = run(args.rows, args.latency / 1000, args.jitter / 1000, args.workers)
+    results.to_csv(
+        args.output,
+        mode="a",
+        header=not os.path.exists(args.output),
+        index=False,
+    )
+    print(f"Saved to {args.output} as {results['label'].iloc[0]}")
+    if args.compare:
+        compare(args.output, args.compare, results["label"].iloc[0])
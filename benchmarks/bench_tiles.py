@@ -0,0 +1,59 @@
+"""
+Single html file against the tiled export on large POI datasets (weekly frames).
+
+"html" is get_animated_bubble_map(engine="fast"): the browser loads the whole file before showing anything.
+"tiles" is export_tiles (zoom 0 to 10): the viewer loads tiles.json, then the tiles of the viewport;
+"first view" is the bytes of the tiles of the first frame at the zoom fitting the data in a 1024 x 768 window.
+
+    python benchmarks/bench_tiles.py
+"""
+import glob
+import math
+import os
+import tempfile
+import time
+
+from bench_bubble_map import make_pois
+
+from poivizdynamic import poivizdynamic as pv
+from poivizdynamic.tiles import export_tiles
+
+
+def first_view_bytes(output_dir, df, width=1024, height=768):
+    # the zoom of Leaflet's fitBounds, then the tiles of frame 0 at that zoom
+    span_lon = df["longitude"].max() - df["longitude"].min()
+    zoom = int(min(10, math.floor(math.log2(width / 256 * 360 / max(span_lon, 1e-9)))))
+    files = glob.glob(os.path.join(output_dir, "0", str(zoom), "*", "*.geojson"))
+    return sum(os.path.getsize(f) for f in files) + os.path.getsize(
+        os.path.join(output_dir, "tiles.json")
+    )
+
+
+if __name__ == "__main__":
+    print(
+        f"{'points':>9} {'export':>7} {'time (s)':>9} {'total (MB)':>11} {'first view (MB)':>16}"
+    )
+    for n in [100_000, 1_000_000]:
+        df = make_pois(n)
+        output_dir = tempfile.mkdtemp()
+
+        start = time.perf_counter()
+        pv.get_animated_bubble_map(
+            df,
+            engine="fast",
+            show=False,
+            frame_freq="week",
+            output_dir=output_dir,
+            fig_name="bubble",
+        )
+        seconds = time.perf_counter() - start
+        size = os.path.getsize(os.path.join(output_dir, "bubble.html")) / 1e6
+        print(f"{n:>9} {'html':>7} {seconds:>9.2f} {size:>11.1f} {size:>16.1f}")
+
+        start = time.perf_counter()
+        summary = export_tiles(df, output_dir, max_zoom=10, frame_freq="week")
+        seconds = time.perf_counter() - start
+        first = first_view_bytes(output_dir, df) / 1e6
+        print(
+            f"{n:>9} {'tiles':>7} {seconds:>9.2f} {summary['bytes'] / 1e6:>11.1f} {first:>16.2f}"
+        )
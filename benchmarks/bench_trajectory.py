@@ -0,0 +1,87 @@
+"""
+Trajectory stage of get_footprint_map on long GPS-like logs (1 point per second: straight legs, turns and stops).
+
+Time of trajectory_stats against a per-row loop of math.* haversine calls, and time of simplify_trace;
+then build time and html size of the footprint figure (max_frames=200) with and without simplify=10 meters.
+
+    python benchmarks/bench_trajectory.py
+"""
+import math
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+from poivizdynamic import poivizdynamic as pv
+from poivizdynamic.trajectory import EARTH_RADIUS, simplify_trace, trajectory_stats
+
+
+def make_gps_log(n, seed=0):
+    # legs of 5 minutes at walking or driving speed in a random heading, one in four is a stop; 3 m of GPS noise
+    rng = np.random.default_rng(seed)
+    n_legs = n // 300 + 1
+    speed = rng.choice([1.4, 12.0, 0.0], n_legs, p=[0.4, 0.35, 0.25])
+    heading = rng.uniform(0, 2 * np.pi, n_legs)
+    leg = np.arange(n) // 300
+    north = np.cumsum(speed[leg] * np.cos(heading[leg])) + rng.normal(0, 3, n)
+    east = np.cumsum(speed[leg] * np.sin(heading[leg])) + rng.normal(0, 3, n)
+    lat = 40 + np.degrees(north / EARTH_RADIUS)
+    lon = -74 + np.degrees(east / (EARTH_RADIUS * np.cos(np.radians(40))))
+    return pd.DataFrame(
+        {
+            "spot_name": "me",
+            "symbol": "car",
+            "date": pd.date_range("2022-01-01", periods=n, freq="S"),
+            "latitude": lat,
+            "longitude": lon,
+        }
+    )
+
+
+def loop_distances(df):
+    lat = df["latitude"].tolist()
+    lon = df["longitude"].tolist()
+    out = [0.0]
+    for i in range(1, len(lat)):
+        p1, p2 = math.radians(lat[i - 1]), math.radians(lat[i])
+        a = (
+            math.sin((p2 - p1) / 2) ** 2
+            + math.cos(p1)
+            * math.cos(p2)
+            * math.sin(math.radians(lon[i] - lon[i - 1]) / 2) ** 2
+        )
+        out.append(2 * EARTH_RADIUS * math.asin(math.sqrt(a)))
+    return out
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    out = func(*args, **kwargs)
+    return time.perf_counter() - start, out
+
+
+if __name__ == "__main__":
+    print(
+        f"{'points':>9} {'loop (s)':>9} {'stats (s)':>10} {'simplify (s)':>13} {'kept':>7}"
+    )
+    for n in [100_000, 1_000_000]:
+        df = make_gps_log(n)
+        loop, _ = timed(loop_distances, df)
+        stats, _ = timed(trajectory_stats, df)
+        simplify, kept = timed(simplify_trace, df, 10)
+        print(f"{n:>9} {loop:>9.2f} {stats:>10.3f} {simplify:>13.3f} {len(kept):>7}")
+
+    print(f"\n{'points':>9} {'simplify':>9} {'build (s)':>10} {'html (MB)':>10}")
+    for n in [10_000, 100_000]:
+        df = make_gps_log(n)
+        for simplify in [None, 10]:
+            start = time.perf_counter()
+            fig = pv._build_footprint_figure(
+                "token", df, max_frames=200, simplify=simplify, stats=True
+            )
+            html = pio.to_html(fig, validate=False)
+            seconds = time.perf_counter() - start
+            print(
+                f"{n:>9} {str(simplify):>9} {seconds:>10.2f} {len(html) / 1e6:>10.1f}"
+            )
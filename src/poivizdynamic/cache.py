@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import threading
+import time
+
+# the last_access updates of the cache hits are written together, every ACCESS_FLUSH hits (and before an eviction or on close)
+ACCESS_FLUSH = 1000
+
+_WHERE_KEY = "WHERE street = ? AND city = ? AND state = ? AND country = ? AND maptype = ?"
+
+
+def _normalize_address(addr):
+    """
+    Normalize an address tuple (street, city, state, country) into the cache key form:
+    lower case, surrounding spaces stripped and inner runs of whitespace collapsed.
+    """
+    return tuple(" ".join(str(part).lower().split()) for part in addr)
+
+
+class GeocodeCache:
+    """
+    A persistent geocode cache stored in a local SQLite file.
+
+    Entries are keyed on the normalized address tuple (street, city, state, country) plus the
+    geo-API used (maptype), so the "US" and "world" results of the same address never mix.
+
+    Parameters
+    ---
+    path: str, default "geocode_cache.sqlite"
+        Location of the SQLite file. ":memory:" keeps the cache in memory for the current process only.
+    ttl: float/ int or None, default 30 days
+        Time to live of an entry in seconds. Expired entries are treated as misses and removed.
+        None keeps entries forever.
+    max_size: int or None, default 100000
+        Maximum number of entries. When the cache grows beyond it, the least recently used entries are evicted.
+        None means no size cap.
+
+    Example
+    ---
+    cache = GeocodeCache("geocode_cache.sqlite", ttl = 7 * 24 * 3600)
+    get_geo_dataset(api_key = GEO_RADAR_API_KEY, travel, maptype = "world", cache = cache)
+    cache.stats()
+
+    """
+
+    def __init__(self, path="geocode_cache.sqlite", ttl=30 * 24 * 3600, max_size=100000):
+        if path != ":memory:":
+            folder = os.path.dirname(os.path.abspath(path))
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # get_geo_dataset may share one cache across its worker threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            # write-ahead log: a commit appends to the log instead of syncing the database file
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS geocode (
+                street TEXT, city TEXT, state TEXT, country TEXT, maptype TEXT,
+                latitude REAL, longitude REAL, formattedAddress TEXT,
+                created REAL, last_access REAL,
+                PRIMARY KEY (street, city, state, country, maptype)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS geocode_last_access ON geocode (last_access)"
+        )
+        self._conn.commit()
+        # pending last_access of the hits, and the number of entries kept up to date (no count(*) per insert)
+        self._accessed = {}
+        self._size = self._conn.execute("SELECT count(*) FROM geocode").fetchone()[0]
+
+    def _flush_accesses(self):
+        # called with the lock held
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE geocode SET last_access = ? " + _WHERE_KEY,
+                [(now,) + key for key, now in self._accessed.items()],
+            )
+            self._conn.commit()
+            self._accessed = {}
+
+    def get(self, addr, maptype):
+        """
+        Return the cached record {"latitude", "longitude", "formattedAddress"} of an address, or None on a miss.
+        addr is the (street, city, state, country) list/ tuple of the POI.
+        """
+        key = _normalize_address(addr) + (maptype,)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT latitude, longitude, formattedAddress, created FROM geocode "
+                + _WHERE_KEY,
+                key,
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[3] > self.ttl:
+                self._conn.execute("DELETE FROM geocode " + _WHERE_KEY, key)
+                self._conn.commit()
+                self._size -= 1
+                self._accessed.pop(key, None)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= ACCESS_FLUSH:
+                self._flush_accesses()
+            self.hits += 1
+        return {"latitude": row[0], "longitude": row[1], "formattedAddress": row[2]}
+
+    def set(self, addr, maptype, record):
+        """
+        Store the geocoded record {"latitude", "longitude", "formattedAddress"} of an address.
+        """
+        key = _normalize_address(addr) + (maptype,)
+        now = time.time()
+        values = (
+            float(record["latitude"]),
+            float(record["longitude"]),
+            record["formattedAddress"],
+            now,
+            now,
+        )
+        with self._lock:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO geocode VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key + values,
+            ).rowcount
+            if inserted:
+                self._size += 1
+            else:
+                self._conn.execute(
+                    """
+                    UPDATE geocode SET latitude = ?, longitude = ?, formattedAddress = ?, created = ?, last_access = ?
+                    """
+                    + _WHERE_KEY,
+                    values + key,
+                )
+                self._accessed.pop(key, None)
+            if self.max_size is not None and self._size > self.max_size:
+                # LRU eviction: drop the entries that were read/ written the longest time ago
+                self._flush_accesses()
+                self._conn.execute(
+                    """
+                    DELETE FROM geocode WHERE rowid IN (
+                        SELECT rowid FROM geocode ORDER BY last_access ASC LIMIT ?
+                    )
+                    """,
+                    (self._size - self.max_size,),
+                )
+                self._size = self.max_size
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Return the hit/ miss counters and the current number of entries.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM geocode")
+            self._conn.commit()
+            self._accessed = {}
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def close(self):
+        with self._lock:
+            self._flush_accesses()
+            self._conn.close()
+
+    def __len__(self):
+        return self._size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
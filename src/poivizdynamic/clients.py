@@ -0,0 +1,233 @@
+import socket
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import incr, observe
+
+# status codes worth another try: throttled, or a temporary server side failure
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# methods safe to send again after a read timeout: the server may still be processing the first attempt of the others
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# default quota (requests per second, burst) of each geo-API, keyed on maptype
+DEFAULT_RATE_LIMITS = {
+    "world": (10, 10),
+    "US": (20, 20),
+}
+
+
+class TokenBucket:
+    """
+    A thread-safe token-bucket rate limiter.
+
+    Parameters
+    ---
+    rate: float
+        Number of tokens added per second, i.e. the sustained request rate.
+    capacity: float, default None
+        Maximum number of tokens stored, i.e. the size of a burst. None uses rate.
+
+    Example
+    ---
+    bucket = TokenBucket(10)
+    bucket.acquire()  # blocks until the request is allowed
+
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, sleeping until it is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            # reserve the token now; a negative balance is the queue of waiting callers
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            observe("http.rate_limit_wait", wait)
+            time.sleep(wait)
+
+
+def _retry_after(response):
+    """
+    Seconds to wait according to the Retry-After header of a response (delay or HTTP date), or None.
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _name_resolution_error(exc):
+    """
+    Whether a connection error comes from a failed DNS lookup (a socket.gaierror somewhere in the wrapped exceptions):
+    the host will not resolve any better after a backoff, so it is not retried.
+    """
+    stack, seen = [exc], set()
+    while stack:
+        e = stack.pop()
+        if e is None or id(e) in seen:
+            continue
+        seen.add(id(e))
+        if isinstance(e, socket.gaierror):
+            return True
+        stack.extend([e.__cause__, e.__context__, getattr(e, "reason", None)])
+        stack.extend(arg for arg in e.args if isinstance(arg, BaseException))
+    return False
+
+
+class ProviderClient:
+    """
+    HTTP client of one geo-API provider: a pooled requests.Session (keep-alive, connection reuse),
+    a token-bucket rate limiter, and retries with exponential backoff on 429/ 5xx responses and connection errors
+    (except DNS failures, and read timeouts of non-idempotent requests such as POST, raised at once).
+
+    Parameters
+    ---
+    rate: float, default None
+        Sustained requests per second allowed by the provider quota. None disables the rate limiter.
+    burst: float, default None
+        Number of requests that may be sent at once before the rate applies. None uses rate.
+    max_retries: int, default 5
+        Number of retries after the first attempt.
+    backoff_factor: float, default 0.5
+        The n-th retry waits backoff_factor * 2 ** n seconds, unless the response has a Retry-After header.
+    max_backoff: float, default 60
+        Upper bound of a single wait, in seconds.
+    pool_size: int, default 10
+        Number of kept-alive connections; should be at least the max_workers of get_geo_dataset.
+    timeout: float, default 30
+        Timeout of a single request, in seconds.
+
+    Example
+    ---
+    client = ProviderClient(rate = 10, max_retries = 3)
+    r = client.get("https://api.radar.io/v1/geocode/forward?query=...", headers = {"Authorization": GEO_RADAR_API_KEY})
+
+    """
+
+    def __init__(
+        self,
+        rate=None,
+        burst=None,
+        max_retries=5,
+        backoff_factor=0.5,
+        max_backoff=60,
+        pool_size=10,
+        timeout=30,
+    ):
+        self.limiter = TokenBucket(rate, burst) if rate is not None else None
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _backoff(self, attempt, response=None):
+        wait = _retry_after(response) if response is not None else None
+        if wait is None:
+            wait = self.backoff_factor * 2**attempt
+        incr("http.retries")
+        time.sleep(min(wait, self.max_backoff))
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request, retrying throttled and failed ones. Returns the last response;
+        connection errors are raised once the retries are used up. A timeout keyword overrides the client timeout,
+        e.g. for a long upload.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                if (
+                    attempt == self.max_retries
+                    or _name_resolution_error(e)
+                    or (
+                        isinstance(e, requests.exceptions.ReadTimeout)
+                        and method.upper() not in IDEMPOTENT_METHODS
+                    )
+                ):
+                    raise
+                self._backoff(attempt)
+                continue
+            if r.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                return r
+            self._backoff(attempt, r)
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(maptype):
+    """
+    Return the shared ProviderClient of a geo-API ("world" or "US"), created on first use
+    with the DEFAULT_RATE_LIMITS of that provider.
+    """
+    with _clients_lock:
+        if maptype not in _clients:
+            rate, burst = DEFAULT_RATE_LIMITS.get(maptype, (None, None))
+            _clients[maptype] = ProviderClient(rate=rate, burst=burst)
+        return _clients[maptype]
+
+
+def configure_client(maptype, **kwargs):
+    """
+    Replace the shared ProviderClient of a geo-API ("world" or "US"), e.g. to match the quota of your plan.
+    The keyword arguments are those of ProviderClient.
+
+    Example
+    ---
+    configure_client("world", rate = 50, burst = 100, max_retries = 8)
+
+    """
+    client = ProviderClient(**kwargs)
+    with _clients_lock:
+        old = _clients.pop(maptype, None)
+        _clients[maptype] = client
+    if old is not None:
+        old.close()
+    return client
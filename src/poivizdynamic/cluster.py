@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from .frames import _drop_missing_coordinates, frame_buckets
+
+# width in pixels of the Web Mercator world at zoom 0, as used by Mapbox
+TILE_SIZE = 256
+# latitude limit of the Web Mercator projection
+MAX_LATITUDE = 85.0511287798
+
+
+def grid_cells(lat, lon, zoom, cell_pixels=10):
+    """
+    Return the id of the square screen cell of cell_pixels x cell_pixels pixels holding every point at a zoom level:
+    a Web Mercator grid, so that one cell covers the same screen area wherever it is on the map.
+    """
+    lat = np.clip(np.asarray(lat, dtype=float), -MAX_LATITUDE, MAX_LATITUDE)
+    lon = np.asarray(lon, dtype=float)
+    # number of cells across the world at this zoom
+    n_cells = int(np.ceil(TILE_SIZE * 2.0**zoom / cell_pixels))
+
+    x = (lon + 180) / 360
+    y = (1 - np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) / np.pi) / 2
+    cx = np.clip(np.floor(x * n_cells), 0, n_cells - 1).astype(np.int64)
+    cy = np.clip(np.floor(y * n_cells), 0, n_cells - 1).astype(np.int64)
+    return cy * n_cells + cx
+
+
+def cluster_points(
+    df,
+    zoom,
+    color_group_lab="spot_name",
+    bubble_size="interest_value",
+    agg="sum",
+    cell_pixels=10,
+    frame_freq="day",
+):
+    """
+    This function merges the POIs of a dataset that would overlap on an animated bubble map: per frame and per color group,
+    the points falling into the same screen cell of cell_pixels pixels at the zoom level become one cluster bubble,
+    placed at their mean position.
+
+    Parameters
+    ---
+    df: pd.DataFrame
+        The dataframe of get_animated_bubble_map, with date, latitude and longitude columns.
+    zoom: float/ int
+        The zoom level of the map: the cells are smaller when zooming in (half the size per zoom level).
+    color_group_lab: str, default "spot_name"
+        The color column. Non-numeric values are kept apart (one cluster per group and cell);
+        numeric values (continuous color bar) are aggregated like the bubble size, or averaged if it is another column.
+    bubble_size: str -> name of column, or int -> constant bubble_size; default "interest_value"
+        The bubble size column, aggregated with agg.
+    agg: {"sum", "mean"}, default "sum"
+        How the values of the clustered points are combined.
+    cell_pixels: int, default 10
+        Size in screen pixels of the cells.
+    frame_freq: str or int, default "day"
+        The frames of the map (see poivizdynamic.frames.frame_buckets); None keeps the dates as they are, e.g. already resampled.
+
+    Returns
+    ---
+    Output a pandans.DataFrame with one row per cluster: date (the start of the frame), latitude, longitude, the color and size columns,
+    and n_points, the number of POIs of the cluster.
+
+    Example
+    ---
+    cluster_points(starb2, zoom = 10, color_group_lab = "spot_name", agg = "mean")
+
+    """
+    if agg not in ("sum", "mean"):
+        raise ValueError(f"Unknown agg {agg!r}; choose 'sum' or 'mean'")
+    df = _drop_missing_coordinates(df)
+
+    frame = pd.DataFrame(
+        {
+            "date": (
+                pd.to_datetime(df["date"])
+                if frame_freq is None
+                else frame_buckets(df["date"], frame_freq)
+            ).to_numpy(),
+            "cell": grid_cells(df["latitude"], df["longitude"], zoom, cell_pixels),
+            "latitude": df["latitude"].to_numpy(dtype=float),
+            "longitude": df["longitude"].to_numpy(dtype=float),
+        }
+    )
+    aggs = {
+        "latitude": ("latitude", "mean"),
+        "longitude": ("longitude", "mean"),
+        "n_points": ("latitude", "size"),
+    }
+    if type(bubble_size) == str:
+        frame[bubble_size] = pd.to_numeric(df[bubble_size]).to_numpy()
+        aggs[bubble_size] = (bubble_size, agg)
+
+    keys = ["date", "cell"]
+    if pd.api.types.is_numeric_dtype(df[color_group_lab]):
+        if color_group_lab != bubble_size:
+            frame[color_group_lab] = df[color_group_lab].to_numpy()
+            aggs[color_group_lab] = (color_group_lab, "mean")
+    else:
+        frame[color_group_lab] = df[color_group_lab].to_numpy()
+        keys.insert(1, color_group_lab)
+
+    # sort = False keeps the dates and groups in order of appearance, like the frames of the maps
+    out = frame.groupby(keys, sort=False).agg(**aggs).reset_index()
+    return out.drop(columns="cell")
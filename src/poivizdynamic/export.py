@@ -0,0 +1,246 @@
+import base64
+import os
+import time
+
+import numpy as np
+
+from .metrics import incr, observe
+
+# first plotly.py release bundling plotly.js 2.28, which decodes the typed arrays
+PLOTLY_TYPED_ARRAYS = (5, 19)
+# typed array codes understood by plotly.js (>= 2.28) in {"dtype": ..., "bdata": ...}
+_INT_DTYPES = [
+    ("i1", np.int8),
+    ("u1", np.uint8),
+    ("i2", np.int16),
+    ("u2", np.uint16),
+    ("i4", np.int32),
+    ("u4", np.uint32),
+]
+
+
+def _encode_array(values, float_dtype="f4", min_length=8):
+    """
+    Encode a numeric array as a base64 typed array {"dtype", "bdata"}, or return it untouched
+    (text, mixed values, or arrays too short for the encoding to pay off).
+    """
+    if isinstance(values, (list, tuple)):
+        if len(values) < min_length or not all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in values
+        ):
+            return values
+    elif not isinstance(values, np.ndarray):
+        return values
+    arr = np.asarray(values)
+    if arr.ndim != 1 or len(arr) < min_length:
+        return values
+
+    if arr.dtype.kind in "iu":
+        lo, hi = (arr.min(), arr.max()) if len(arr) > 0 else (0, 0)
+        for code, dtype in _INT_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= lo and hi <= info.max:
+                arr = arr.astype(dtype)
+                break
+        else:
+            code, arr = "f8", arr.astype(np.float64)
+    elif arr.dtype.kind == "f":
+        code = float_dtype
+        arr = arr.astype(np.float32 if float_dtype == "f4" else np.float64)
+    else:
+        return values
+
+    # typed arrays are little-endian in the browser
+    arr = arr.astype(arr.dtype.newbyteorder("<"), copy=False)
+    return {"dtype": code, "bdata": base64.b64encode(arr.tobytes()).decode("ascii")}
+
+
+def _encode_trace(trace, float_dtype, min_length):
+    out = {}
+    for key, value in trace.items():
+        if isinstance(value, dict):
+            out[key] = _encode_trace(value, float_dtype, min_length)
+        else:
+            out[key] = _encode_array(value, float_dtype, min_length)
+    return out
+
+
+def _copy_dicts(trace):
+    # copy the nested dicts (not the arrays), so that dropping keys leaves the input figure untouched
+    return {
+        key: _copy_dicts(value) if isinstance(value, dict) else value
+        for key, value in trace.items()
+    }
+
+
+def _same(a, b):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, (np.ndarray, list, tuple)) or isinstance(
+        b, (np.ndarray, list, tuple)
+    ):
+        a, b = np.asarray(a), np.asarray(b)
+        return a.shape == b.shape and bool(np.all(a == b))
+    return a == b
+
+
+def _drop_static(base, frame_traces):
+    """
+    Remove from the frame traces every attribute that has the same value in the initial trace
+    and in all the frames: plotly.js merges a frame onto the current trace, so the attribute keeps its value.
+    """
+    for key in list(base):
+        values = [trace[key] for trace in frame_traces if key in trace]
+        if not values:
+            continue
+        if isinstance(base[key], dict) and all(isinstance(v, dict) for v in values):
+            _drop_static(
+                base[key], [trace[key] for trace in frame_traces if key in trace]
+            )
+            for trace in frame_traces:
+                if key in trace and not trace[key]:
+                    del trace[key]
+        elif all(_same(base[key], value) for value in values):
+            for trace in frame_traces:
+                trace.pop(key, None)
+
+
+def _check_plotly():
+    # the plotly.js bundled with older plotly.py cannot decode the typed arrays: the points would be lost silently
+    import plotly
+
+    version = tuple(int(part) for part in plotly.__version__.split(".")[:2])
+    if version < PLOTLY_TYPED_ARRAYS:
+        raise ImportError(
+            f"Compact figures require plotly >= {'.'.join(map(str, PLOTLY_TYPED_ARRAYS))} "
+            f"(plotly.js >= 2.28), found {plotly.__version__}: pip install -U plotly"
+        )
+
+
+def compact_figure(fig, float_dtype="f4", dedup=True, min_length=8):
+    """
+    This function returns a compact copy of a plotly figure for export: the numeric arrays of the traces and
+    frames (coordinates, bubble sizes, color values) are packed as base64 typed arrays, which plotly.js decodes natively,
+    instead of JSON float text; and optionally the attributes that never change along the animation are written once.
+    The typed arrays need plotly >= 5.19 (plotly.js >= 2.28); an older plotly raises an ImportError.
+
+    Parameters
+    ---
+    fig: plotly.graph_objects.Figure or dict
+        The figure, e.g. built by get_footprint_map or get_animated_bubble_map.
+    float_dtype: {"f4", "f8"}, default "f4"
+        "f4" stores the floats in 32 bits (about 1 m precision for coordinates, half the size of "f8").
+        "f8" keeps the full precision.
+    dedup: bool, default True
+        Remove from the frames the attributes (symbols, text, marker settings...) equal in the initial traces and in every frame.
+    min_length: int, default 8
+        Arrays shorter than this are left as JSON.
+
+    Returns
+    ---
+    Output a plotly figure dict; write it with plotly.io.write_html(fig, path, validate = False) or write_compact_html.
+
+    """
+    _check_plotly()
+    if not isinstance(fig, dict):
+        fig = fig.to_dict()
+    data = [dict(trace) for trace in fig.get("data", [])]
+    frames = [
+        dict(frame, data=[_copy_dicts(trace) for trace in frame.get("data", [])])
+        for frame in fig.get("frames", [])
+    ]
+
+    if dedup:
+        for i, base in enumerate(data):
+            frame_traces = [
+                frame["data"][i] for frame in frames if len(frame["data"]) > i
+            ]
+            _drop_static(base, frame_traces)
+
+    out = dict(fig)
+    out["data"] = [_encode_trace(trace, float_dtype, min_length) for trace in data]
+    if frames:
+        out["frames"] = [
+            dict(
+                frame,
+                data=[
+                    _encode_trace(trace, float_dtype, min_length)
+                    for trace in frame["data"]
+                ],
+            )
+            for frame in frames
+        ]
+    return out
+
+
+def write_compact_html(fig, html_path, float_dtype="f4", dedup=True, **kwargs):
+    """
+    Write a plotly figure to an html file through compact_figure (same parameters).
+    Other keyword arguments are passed to plotly.io.write_html.
+
+    Example
+    ---
+    write_compact_html(fig, "demo_output/starbuck.html")
+
+    """
+    import plotly.io as pio
+
+    pio.write_html(
+        compact_figure(fig, float_dtype=float_dtype, dedup=dedup),
+        html_path,
+        validate=False,
+        **kwargs,
+    )
+
+
+SINKS = {"html": ".html", "json": ".json"}
+
+
+def save_figure(fig, output_dir, fig_name, sink="html", compact=False):
+    """
+    Write a plotly figure to output_dir/fig_name with the extension of the sink, and return the path.
+
+    Parameters
+    ---
+    fig: plotly.graph_objects.Figure or dict
+        The figure to write.
+    output_dir: str
+        The directory of the file, created when missing.
+    fig_name: str
+        The name of the file, without extension.
+    sink: {"html", "json", None}, default "html"
+        "html": a standalone html page (plotly.io.write_html).
+        "json": the plotly figure JSON (plotly.io.write_json), e.g. for a web app that calls Plotly.newPlot itself.
+        None: nothing is written and None is returned.
+    compact: bool, default False
+        Write the figure through compact_figure (base64 typed arrays, static frame attributes once).
+
+    Example
+    ---
+    save_figure(fig, "demo_output", "starbuck", sink = "json")
+
+    """
+    if sink is None:
+        return None
+    if sink not in SINKS:
+        raise ValueError(
+            f"Unknown sink {sink!r}; choose one of {sorted(SINKS)} or None"
+        )
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    path = os.path.join(output_dir, fig_name + SINKS[sink])
+
+    import plotly.io as pio
+
+    start = time.perf_counter()
+    if compact:
+        fig = compact_figure(fig)
+    # the frames are plain dicts: skip plotly's validation of every frame
+    if sink == "html":
+        pio.write_html(fig, path, validate=False)
+    else:
+        pio.write_json(fig, path, validate=False)
+    observe("render.write", time.perf_counter() - start, sink=sink)
+    incr("render.bytes_written", os.path.getsize(path), sink=sink)
+    return path
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+FRAME_FREQS = {"minute": "T", "hour": "H", "day": "D", "week": "W", "month": "M"}
+FRAME_AGGS = ("sum", "mean", "max", "last")
+
+
+def _drop_missing_coordinates(df):
+    """
+    Return the rows with both coordinates; the dataframe itself (no copy) when none is missing.
+    """
+    missing = df["longitude"].isna().to_numpy() | df["latitude"].isna().to_numpy()
+    return df[~missing] if missing.any() else df
+
+
+def frame_buckets(dates, freq):
+    """
+    Return the start of the time bucket of every date, as a datetime Series aligned with dates.
+
+    freq is "minute", "hour", "day", "week" (from Monday), "month", another pandas period alias (e.g. "15T", "2H"),
+    or an int N: N buckets of equal length between the first and the last date.
+    """
+    dates = pd.Series(pd.to_datetime(dates))
+    if isinstance(freq, (int, np.integer)) and not isinstance(freq, bool):
+        if freq < 1:
+            raise ValueError(f"The number of frames must be positive, got {freq}")
+        lo, hi = dates.min(), dates.max()
+        if len(dates) == 0 or lo == hi:
+            return dates.copy()
+        edges = pd.date_range(lo, hi, periods=freq + 1).to_numpy()
+        k = np.searchsorted(edges, dates.to_numpy(), side="right") - 1
+        return pd.Series(edges[np.clip(k, 0, freq - 1)], index=dates.index)
+    period = FRAME_FREQS.get(freq, freq)
+    return dates.dt.to_period(period).dt.start_time
+
+
+def frame_format(buckets):
+    """
+    Return the shortest strftime format that tells the buckets apart: the day, down to the minute or the second.
+    """
+    buckets = pd.Series(pd.to_datetime(buckets)).drop_duplicates()
+    if (buckets == buckets.dt.normalize()).all():
+        return "%Y-%m-%d"
+    if (buckets.dt.second == 0).all() and (buckets.dt.microsecond == 0).all():
+        return "%Y-%m-%d %H:%M"
+    return "%Y-%m-%d %H:%M:%S"
+
+
+def freq_format(freq):
+    """
+    Return the strftime format of the buckets of a frequency, whatever dates fall into them: the day for "day" and longer,
+    down to the minute for "hour" or "15T", to the second below. Unlike frame_format, it does not depend on the data,
+    e.g. a first batch of hourly buckets all at midnight still gets the hours.
+    """
+    period = FRAME_FREQS.get(freq, freq)
+    return frame_format(
+        pd.period_range("2000-01-03", periods=2, freq=period).start_time
+    )
+
+
+def resample_frames(
+    df,
+    freq,
+    color_group_lab="spot_name",
+    bubble_size="interest_value",
+    agg="sum",
+):
+    """
+    This function resamples the date column of a POI dataset into time buckets, so that an animated map gets one frame per bucket
+    instead of one per distinct date. The rows of the same POI (position and color group) in a bucket become one row.
+
+    Parameters
+    ---
+    df: pd.DataFrame
+        The dataframe of get_animated_bubble_map, with date, latitude and longitude columns.
+    freq: {"minute", "hour", "day", "week", "month"}, a pandas period alias (e.g. "15T"), or int
+        The length of the buckets, or the number N of buckets of equal length between the first and the last date.
+    color_group_lab: str, default "spot_name"
+        The color column. Non-numeric values tell the POIs apart; numeric values are aggregated like the bubble size.
+    bubble_size: str -> name of column, or int -> constant bubble_size; default "interest_value"
+        The bubble size column, aggregated with agg.
+    agg: {"sum", "mean", "max", "last"}, default "sum"
+        How the values of a POI in a bucket are combined.
+
+    Returns
+    ---
+    Output a pandans.DataFrame sorted by date, where date is the start of the bucket, with the latitude, longitude,
+    color and size columns (and spot_name when it is not the color column, taken from the last row).
+
+    Example
+    ---
+    resample_frames(starb2, "week", agg = "mean")
+
+    """
+    if agg not in FRAME_AGGS:
+        raise ValueError(f"Unknown agg {agg!r}; choose one of {list(FRAME_AGGS)}")
+    df = _drop_missing_coordinates(df)
+
+    frame = pd.DataFrame(
+        {
+            "date": frame_buckets(df["date"], freq).to_numpy(),
+            "latitude": df["latitude"].to_numpy(dtype=float),
+            "longitude": df["longitude"].to_numpy(dtype=float),
+        }
+    )
+    keys = ["date", "latitude", "longitude"]
+    aggs = {}
+    for col in dict.fromkeys([color_group_lab, bubble_size, "spot_name"]):
+        if type(col) != str or col not in df.columns:
+            continue
+        if col == bubble_size or (
+            col == color_group_lab and pd.api.types.is_numeric_dtype(df[col])
+        ):
+            frame[col] = pd.to_numeric(df[col]).to_numpy()
+            aggs[col] = agg
+        elif col == color_group_lab:
+            frame[col] = df[col].to_numpy()
+            keys.append(col)
+        else:
+            frame[col] = df[col].to_numpy()
+            aggs[col] = "last"
+
+    if aggs:
+        out = frame.groupby(keys, sort=False).agg(aggs).reset_index()
+    else:
+        out = frame.drop_duplicates(keys)
+    return out.sort_values("date", kind="stable", ignore_index=True)
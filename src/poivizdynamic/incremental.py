@@ -0,0 +1,433 @@
+import copy
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+from . import poivizdynamic as pv
+from .export import SINKS
+from .frames import (
+    _drop_missing_coordinates,
+    frame_buckets,
+    freq_format,
+    resample_frames,
+)
+from .metrics import incr, observe
+from .streaming import _save_checkpoint
+
+logger = logging.getLogger(__name__)
+
+# stands for the frames in the figure written by plotly, replaced by the stored frames
+_FRAMES_PLACEHOLDER = "__poivizdynamic_frames__"
+# the options of get_footprint_map that do not need the whole trace (max_frames, cumulative, simplify and stats do)
+FOOTPRINT_KWARGS = ("title_text", "title_size", "zoom")
+
+
+def _sidecar_dir(output_dir, fig_name):
+    return os.path.join(output_dir, fig_name + ".sidecar")
+
+
+def _load_state(sidecar, kind):
+    path = os.path.join(sidecar, "state.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    if state["kind"] != kind:
+        raise ValueError(
+            f"The sidecar {sidecar} belongs to a {state['kind']} map, not a {kind} map"
+        )
+    return state
+
+
+def _store_frames(sidecar, state, frames):
+    """
+    Append finished frames to the sidecar, serialized once: one JSON frame per line in a new chunk file.
+    """
+    if not frames:
+        return
+    name = f"frames-{len(state['chunks']):05d}.jsonl"
+    with open(os.path.join(sidecar, name), "w") as f:
+        for frame in frames:
+            f.write(pio.json.to_json_plotly(frame) + "\n")
+    state["chunks"].append(name)
+
+
+def _write_output(sidecar, state, fig, output_dir, fig_name, sink):
+    """
+    Write the figure with the stored frames pasted in as they are, without serializing them again.
+    """
+    if sink is None:
+        return None
+    if sink not in SINKS:
+        raise ValueError(
+            f"Unknown sink {sink!r}; choose one of {sorted(SINKS)} or None"
+        )
+
+    frames = []
+    for name in state["chunks"]:
+        with open(os.path.join(sidecar, name)) as f:
+            frames.extend(line.rstrip("\n") for line in f)
+    if state["last_frame"] is not None:
+        frames.append(state["last_frame"])
+
+    fig = dict(fig, frames=[{"name": _FRAMES_PLACEHOLDER}])
+    if sink == "html":
+        text = pio.to_html(fig, validate=False)
+    else:
+        text = pio.to_json(fig, validate=False)
+    placeholder = pio.json.to_json_plotly([{"name": _FRAMES_PLACEHOLDER}])
+    text = text.replace(placeholder, "[" + ",".join(frames) + "]", 1)
+
+    path = os.path.join(output_dir, fig_name + SINKS[sink])
+    start = time.perf_counter()
+    with open(path, "w") as f:
+        f.write(text)
+    observe("render.write", time.perf_counter() - start, sink=sink)
+    incr("render.bytes_written", os.path.getsize(path), sink=sink)
+    return path
+
+
+def _frame_labels(dates, frame_freq, date_format):
+    dates = pd.to_datetime(pd.Series(dates))
+    if frame_freq is not None:
+        dates = frame_buckets(dates, frame_freq)
+    # format the distinct dates only
+    codes, uniques = pd.factorize(dates.to_numpy())
+    return pd.DatetimeIndex(uniques).strftime(date_format).to_numpy()[codes]
+
+
+def update_bubble_map(
+    df,
+    fig_name="my_animated_bubble_plot",
+    output_dir="demo_output",
+    sink="html",
+    frame_freq=None,
+    frame_agg="sum",
+    **kwargs,
+):
+    """
+    This function appends new POIs to an animated bubble map without rebuilding it: the frames of the previous calls are kept,
+    already serialized, in a sidecar directory next to the output (output_dir/fig_name.sidecar), and only the frames of the
+    new dates are built (engine = "fast"). The first call builds the map and its sidecar.
+    The frame of the latest date is rebuilt when new POIs share its date.
+
+    Parameters
+    ---
+    df: pd.DataFrame
+        The new POIs (cleaned as for get_animated_bubble_map), not older than the last frame of the map.
+    fig_name: str, default "my_animated_bubble_plot"
+        Customize name of saving file.
+    output_dir: str, default "demo_output"
+        Directory of the saved file and of its sidecar.
+    sink: {"html", "json", None}, default "html"
+        Format of the saved file (None only updates the sidecar).
+    frame_freq: str, default None
+        None makes one frame per day, or a bucket length of poivizdynamic.frames.resample_frames ("hour", "week"...).
+        A number of frames is not supported: it depends on the whole date range.
+    frame_agg: {"sum", "mean", "max", "last"}, default "sum"
+        How the values of a POI in a frame are combined, with frame_freq.
+    **kwargs:
+        title_text, title_size, color_group_lab, color_value_discrete, bubble_size, radius, zoom of get_animated_bubble_map.
+        They are read on the first call only; the later calls keep them, as well as the map center, the bubble scale (sizeref)
+        and the colors of the groups already shown.
+
+    Returns
+    ---
+    Output the path of the saved file (None with sink = None).
+
+    Example
+    ---
+    update_bubble_map(starb_monday, fig_name = "starbuck", zoom = 10)
+    update_bubble_map(starb_tuesday, fig_name = "starbuck")
+
+    """
+    sidecar = _sidecar_dir(output_dir, fig_name)
+    state = _load_state(sidecar, "bubble")
+    if state is None:
+        if isinstance(frame_freq, (int, np.integer)):
+            raise ValueError("update_bubble_map needs a bucket length as frame_freq")
+        if len(df) == 0:
+            raise ValueError("The first call of update_bubble_map needs POIs")
+        os.makedirs(sidecar, exist_ok=True)
+        state = {
+            "kind": "bubble",
+            "kwargs": kwargs,
+            "frame_freq": frame_freq,
+            "frame_agg": frame_agg,
+            "date_format": (
+                "%Y-%m-%d" if frame_freq is None else freq_format(frame_freq)
+            ),
+            "chunks": [],
+            "last_frame": None,
+            "last_label": None,
+            "first_label": None,
+        }
+        tail = None
+    else:
+        tail = pd.read_pickle(os.path.join(sidecar, "tail.pkl"))
+    style = state["kwargs"]
+    color_group_lab = style.get("color_group_lab", "spot_name")
+    bubble_size = style.get("bubble_size", "interest_value")
+
+    df = _drop_missing_coordinates(df)
+    columns = [
+        col
+        for col in dict.fromkeys(
+            ["date", "latitude", "longitude", color_group_lab, bubble_size, "spot_name"]
+        )
+        if type(col) == str and col in df.columns
+    ]
+    df = df[columns].assign(date=pd.to_datetime(df["date"]))
+    labels = _frame_labels(df["date"], state["frame_freq"], state["date_format"])
+    if state["last_label"] is not None and (labels < state["last_label"]).any():
+        raise ValueError(
+            f"New POIs are older than the last frame ({state['last_label']}): rebuild the map instead"
+        )
+
+    rows = pd.concat([tail, df], ignore_index=True) if tail is not None else df
+    rows = rows.sort_values("date", kind="stable", ignore_index=True)
+    built = rows
+    if state["frame_freq"] is not None:
+        built = resample_frames(
+            rows,
+            state["frame_freq"],
+            color_group_lab=color_group_lab,
+            bubble_size=bubble_size,
+            agg=state["frame_agg"],
+        )
+    fig = pv._build_bubble_figure(built, date_format=state["date_format"], **style)
+    frames = fig["frames"]
+
+    if state["last_frame"] is None:
+        state["figure"] = json.loads(
+            pio.json.to_json_plotly({"data": fig["data"], "layout": fig["layout"]})
+        )
+        state["first_label"] = frames[0]["name"]
+        traces = [trace for frame in frames for trace in frame["data"]]
+        state["sizeref"] = traces[0]["marker"]["sizeref"]
+        state["colors"] = {
+            trace["name"]: trace["marker"]["color"]
+            for trace in traces
+            if "coloraxis" not in trace["marker"]
+        }
+    else:
+        # keep the bubble scale and the colors of the map
+        palette, _ = pv._bubble_palette(style.get("color_value_discrete", True))
+        colors = state["colors"]
+        for frame in frames:
+            for trace in frame["data"]:
+                trace["marker"]["sizeref"] = state["sizeref"]
+                if "coloraxis" not in trace["marker"]:
+                    if trace["name"] not in colors:
+                        colors[trace["name"]] = palette[len(colors) % len(palette)]
+                    trace["marker"]["color"] = colors[trace["name"]]
+
+        if frames[0]["name"] != state["last_label"]:
+            _store_frames(sidecar, state, [json.loads(state["last_frame"])])
+        if frames[0]["name"] == state["first_label"]:
+            state["figure"]["data"] = json.loads(
+                pio.json.to_json_plotly(frames[0]["data"])
+            )
+        steps = state["figure"]["layout"]["sliders"][0]["steps"]
+        for frame in frames:
+            if frame["name"] != state["last_label"]:
+                step = copy.deepcopy(steps[-1])
+                step["label"] = frame["name"]
+                step["args"][0] = [frame["name"]]
+                steps.append(step)
+
+    _store_frames(sidecar, state, frames[:-1])
+    state["last_frame"] = pio.json.to_json_plotly(frames[-1])
+    state["last_label"] = frames[-1]["name"]
+
+    # the rows of the last frame, to rebuild it when more POIs of its date come
+    row_labels = _frame_labels(rows["date"], state["frame_freq"], state["date_format"])
+    rows[row_labels == state["last_label"]].to_pickle(os.path.join(sidecar, "tail.pkl"))
+    _save_checkpoint(os.path.join(sidecar, "state.json"), state)
+    logger.info("Added %d POIs; %d frames built", len(df), len(frames))
+
+    return _write_output(sidecar, state, state["figure"], output_dir, fig_name, sink)
+
+
+def update_footprint_map(
+    TOKEN_MAPBOX,
+    df_in,
+    fig_name="my_animate_map",
+    output_dir="demo_output",
+    sink="html",
+    frame_freq=None,
+    **kwargs,
+):
+    """
+    This function appends new POIs to a footprint map without rebuilding it: the frames of the previous calls are kept,
+    already serialized, in a sidecar directory next to the output (output_dir/fig_name.sidecar) with the coordinates
+    of the trace, and only the frames of the new POIs are built. The first call builds the map and its sidecar.
+
+    Parameters
+    ---
+    TOKEN_MAPBOX: an access token is required by Mapbox (same as get_footprint_map).
+    df_in:  pd.DataFrame
+        The new POIs, sorted by date, and not older than the last POI of the map.
+    fig_name: str, default "my_animate_map"
+        Customize name of saving file.
+    output_dir: str, default "demo_output"
+        Directory of the saved file and of its sidecar.
+    sink: {"html", "json", None}, default "html"
+        Format of the saved file (None only updates the sidecar).
+    frame_freq: str, default None
+        None makes one frame per POI, or a bucket length of poivizdynamic.frames.frame_buckets ("hour", "day"...);
+        the frame of the last bucket is rebuilt when new POIs fall into it. Read on the first call only.
+    **kwargs:
+        title_text, title_size, zoom of get_footprint_map, read on the first call only (the map center is kept too).
+        The frames are cumulative; the other options (max_frames, cumulative, simplify, stats) need the whole trace
+        and raise a ValueError.
+
+    Returns
+    ---
+    Output the path of the saved file (None with sink = None).
+
+    Example
+    ---
+    update_footprint_map(TOKEN_MAPBOX, travel_week1, fig_name = "my foot print", frame_freq = "day", zoom = 4)
+    update_footprint_map(TOKEN_MAPBOX, travel_week2, fig_name = "my foot print")
+
+    """
+    unsupported = sorted(set(kwargs) - set(FOOTPRINT_KWARGS))
+    if unsupported:
+        raise ValueError(
+            f"update_footprint_map does not support {unsupported}; only {list(FOOTPRINT_KWARGS)}"
+        )
+    sidecar = _sidecar_dir(output_dir, fig_name)
+    points_path = os.path.join(sidecar, "points.f8")
+    labels_path = os.path.join(sidecar, "labels.jsonl")
+    state = _load_state(sidecar, "footprint")
+    if state is not None:
+        frame_freq = state["frame_freq"]
+
+    dates = pd.to_datetime(df_in["date"]) if "date" in df_in.columns else None
+    if frame_freq is not None and dates is not None:
+        buckets = frame_buckets(dates, frame_freq).to_numpy()
+    else:
+        buckets = None
+
+    if state is None:
+        if isinstance(frame_freq, (int, np.integer)):
+            raise ValueError("update_footprint_map needs a bucket length as frame_freq")
+        os.makedirs(sidecar, exist_ok=True)
+        fig = pv._build_footprint_figure(
+            TOKEN_MAPBOX, df_in, frame_freq=frame_freq, **kwargs
+        )
+        # the trace itself lives in the points and labels files
+        base = copy.deepcopy({"data": fig["data"], "layout": fig["layout"]})
+        for key in ["lon", "lat", "text"]:
+            base["data"][0].pop(key)
+        base["data"][0]["marker"].pop("symbol")
+        state = {
+            "kind": "footprint",
+            "frame_freq": frame_freq,
+            "figure": base,
+            "chunks": [],
+            "last_frame": None,
+            "last_bucket": None,
+            "last_date": None,
+            "n_points": 0,
+            "labels_bytes": 0,
+        }
+        frames = fig["frames"]
+        replace_last = False
+        for path in [points_path, labels_path]:
+            if os.path.exists(path):
+                os.remove(path)
+    else:
+        if (
+            dates is not None
+            and dates.notna().any()
+            and state.get("last_date") is not None
+            and dates.min() < pd.Timestamp(state["last_date"])
+        ):
+            raise ValueError(
+                f"New POIs are older than the last POI of the map ({state['last_date']}): rebuild the map instead"
+            )
+        # drop whatever a crashed update appended after the last saved state
+        with open(points_path, "r+b") as f:
+            f.truncate(state["n_points"] * 16)
+        with open(labels_path, "r+b") as f:
+            f.truncate(state["labels_bytes"])
+        replace_last = (
+            buckets is not None
+            and len(buckets) > 0
+            and state["last_bucket"] is not None
+            and buckets[0] == np.datetime64(state["last_bucket"])
+        )
+
+    # append the new POIs to the trace
+    points = np.column_stack(
+        [
+            df_in["longitude"].to_numpy(dtype=float),
+            df_in["latitude"].to_numpy(dtype=float),
+        ]
+    )
+    with open(points_path, "ab") as f:
+        f.write(points.astype("<f8").tobytes())
+    with open(labels_path, "a") as f:
+        f.write(
+            json.dumps(
+                {
+                    "text": df_in["spot_name"].tolist(),
+                    "symbol": df_in["symbol"].tolist(),
+                }
+            )
+            + "\n"
+        )
+    trace = np.fromfile(points_path, dtype="<f8").reshape(-1, 2)
+    lon_arr, lat_arr = trace[:, 0], trace[:, 1]
+    n_old, n = state["n_points"], len(trace)
+
+    if n_old > 0:
+        if buckets is None:
+            ends = np.arange(max(n_old + 1, 2), n + 1)
+        else:
+            changes = np.flatnonzero(buckets[1:] != buckets[:-1]) + 1
+            ends = n_old + np.append(changes, len(buckets))
+        frames = [
+            {
+                "data": [
+                    {
+                        "type": "scattermapbox",
+                        "lon": lon_arr[:end],
+                        "lat": lat_arr[:end],
+                    }
+                ]
+            }
+            for end in ends
+        ]
+        if not replace_last and state["last_frame"] is not None:
+            _store_frames(sidecar, state, [json.loads(state["last_frame"])])
+
+    if frames:
+        _store_frames(sidecar, state, frames[:-1])
+        state["last_frame"] = pio.json.to_json_plotly(frames[-1])
+    state["n_points"] = n
+    state["labels_bytes"] = os.path.getsize(labels_path)
+    if buckets is not None and len(buckets) > 0:
+        state["last_bucket"] = str(buckets[-1])
+    if dates is not None and dates.notna().any():
+        state["last_date"] = str(dates.max())
+    _save_checkpoint(os.path.join(sidecar, "state.json"), state)
+    logger.info("Added %d POIs; %d frames built", len(df_in), len(frames))
+
+    text, symbol = [], []
+    with open(labels_path) as f:
+        for line in f:
+            labels = json.loads(line)
+            text.extend(labels["text"])
+            symbol.extend(labels["symbol"])
+    fig = copy.deepcopy(state["figure"])
+    fig["data"][0].update(lon=lon_arr, lat=lat_arr, text=text)
+    fig["data"][0]["marker"]["symbol"] = symbol
+    return _write_output(sidecar, state, fig, output_dir, fig_name, sink)
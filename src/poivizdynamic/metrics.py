@@ -0,0 +1,155 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# upper bounds (seconds) of the latency histogram buckets; the last one catches everything slower
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    float("inf"),
+)
+
+
+class Metrics:
+    """
+    A thread-safe collector of the counters and timings reported by the geocoding and map functions:
+    per-stage timings with a latency histogram (e.g. "geocode.request", "render.build", "render.write"),
+    and counters (e.g. "geocode.cache_hits", "http.retries", "render.bytes_written").
+
+    Hooks are called with every event, as hook(kind, name, value, tags), where kind is "count" or "timing",
+    value the increment or the seconds, and tags a dict (e.g. {"provider": "US"}): a way to forward
+    the events to a tracing or monitoring system.
+
+    Parameters
+    ---
+    buckets: tuple of float, default LATENCY_BUCKETS
+        Upper bounds in seconds of the histogram buckets, in increasing order, ending with inf.
+
+    Example
+    ---
+    metrics = Metrics()
+    set_metrics(metrics)
+    get_geo_dataset(api_key_us, starb, maptype = "US", max_workers = 8)
+    metrics.snapshot()["timings"]["geocode.request"]["mean"]
+
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.hooks = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.timings = {}
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def incr(self, name, value=1, **tags):
+        """
+        Add value to the counter name.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook("count", name, value, tags)
+
+    def observe(self, name, seconds, **tags):
+        """
+        Record one timing of name, in seconds.
+        """
+        with self._lock:
+            stat = self.timings.get(name)
+            if stat is None:
+                stat = self.timings[name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "min": float("inf"),
+                    "max": 0.0,
+                    "histogram": [0] * len(self.buckets),
+                }
+            stat["count"] += 1
+            stat["total"] += seconds
+            stat["min"] = min(stat["min"], seconds)
+            stat["max"] = max(stat["max"], seconds)
+            stat["histogram"][
+                min(bisect_left(self.buckets, seconds), len(self.buckets) - 1)
+            ] += 1
+        for hook in self.hooks:
+            hook("timing", name, seconds, tags)
+
+    @contextmanager
+    def timer(self, name, **tags):
+        """
+        Time the body of a with statement as one timing of name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **tags)
+
+    def snapshot(self):
+        """
+        Return a copy of the metrics: {"counters": {name: value},
+        "timings": {name: {"count", "total", "mean", "min", "max", "histogram": {upper bound: count}}}}.
+        """
+        with self._lock:
+            timings = {}
+            for name, stat in self.timings.items():
+                timings[name] = {
+                    "count": stat["count"],
+                    "total": stat["total"],
+                    "mean": stat["total"] / stat["count"],
+                    "min": stat["min"],
+                    "max": stat["max"],
+                    "histogram": dict(zip(self.buckets, stat["histogram"])),
+                }
+            return {"counters": dict(self.counters), "timings": timings}
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """
+    Return the Metrics collector the package reports to.
+    """
+    return _metrics
+
+
+def set_metrics(metrics):
+    """
+    Make the package report to another Metrics collector (e.g. a fresh one per job), and return the previous one.
+    """
+    global _metrics
+    previous, _metrics = _metrics, metrics
+    return previous
+
+
+def incr(name, value=1, **tags):
+    _metrics.incr(name, value, **tags)
+
+
+def observe(name, seconds, **tags):
+    _metrics.observe(name, seconds, **tags)
+
+
+def timer(name, **tags):
+    return _metrics.timer(name, **tags)
@@ -0,0 +1,178 @@
+import pandas as pd
+
+# USPS street suffix and directional abbreviations
+# https://pe.usps.com/text/pub28/28apc_002.htm
+STREET_ABBREVIATIONS = {
+    "alley": "aly",
+    "avenue": "ave",
+    "av": "ave",
+    "boulevard": "blvd",
+    "circle": "cir",
+    "court": "ct",
+    "drive": "dr",
+    "expressway": "expy",
+    "freeway": "fwy",
+    "highway": "hwy",
+    "lane": "ln",
+    "parkway": "pkwy",
+    "place": "pl",
+    "plaza": "plz",
+    "road": "rd",
+    "square": "sq",
+    "street": "st",
+    "terrace": "ter",
+    "trail": "trl",
+    "turnpike": "tpke",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+    "northeast": "ne",
+    "northwest": "nw",
+    "southeast": "se",
+    "southwest": "sw",
+    "suite": "ste",
+    "apartment": "apt",
+}
+
+STATE_ABBREVIATIONS = {
+    "alabama": "al",
+    "alaska": "ak",
+    "arizona": "az",
+    "arkansas": "ar",
+    "california": "ca",
+    "colorado": "co",
+    "connecticut": "ct",
+    "delaware": "de",
+    "district of columbia": "dc",
+    "florida": "fl",
+    "georgia": "ga",
+    "hawaii": "hi",
+    "idaho": "id",
+    "illinois": "il",
+    "indiana": "in",
+    "iowa": "ia",
+    "kansas": "ks",
+    "kentucky": "ky",
+    "louisiana": "la",
+    "maine": "me",
+    "maryland": "md",
+    "massachusetts": "ma",
+    "michigan": "mi",
+    "minnesota": "mn",
+    "mississippi": "ms",
+    "missouri": "mo",
+    "montana": "mt",
+    "nebraska": "ne",
+    "nevada": "nv",
+    "new hampshire": "nh",
+    "new jersey": "nj",
+    "new mexico": "nm",
+    "new york": "ny",
+    "north carolina": "nc",
+    "north dakota": "nd",
+    "ohio": "oh",
+    "oklahoma": "ok",
+    "oregon": "or",
+    "pennsylvania": "pa",
+    "rhode island": "ri",
+    "south carolina": "sc",
+    "south dakota": "sd",
+    "tennessee": "tn",
+    "texas": "tx",
+    "utah": "ut",
+    "vermont": "vt",
+    "virginia": "va",
+    "washington": "wa",
+    "west virginia": "wv",
+    "wisconsin": "wi",
+    "wyoming": "wy",
+}
+
+_STREET_PATTERN = r"\b(" + "|".join(STREET_ABBREVIATIONS) + r")\b"
+
+
+def _clean_text(values):
+    # lower case, punctuation to spaces, runs of whitespace collapsed
+    values = values.astype(str).str.lower()
+    values = values.str.replace(r"[^\w\s-]", " ", regex=True)
+    return values.str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def _normalize_street(values):
+    values = _clean_text(values)
+    # 114th -> 114
+    values = values.str.replace(r"\b(\d+)(st|nd|rd|th)\b", r"\1", regex=True)
+    return values.str.replace(
+        _STREET_PATTERN, lambda m: STREET_ABBREVIATIONS[m.group(1)], regex=True
+    )
+
+
+def _normalize_state(values):
+    values = _clean_text(values)
+    # "NY 10027" -> "ny"
+    values = values.str.replace(r"\s*\b\d{5}(-\d{4})?$", "", regex=True)
+    return values.replace(STATE_ABBREVIATIONS)
+
+
+_NORMALIZERS = {
+    "street": _normalize_street,
+    "city": _clean_text,
+    "state": _normalize_state,
+}
+
+
+def _normalize_unique(values, normalizer):
+    # normalize each distinct value once and broadcast the result back
+    codes, uniques = pd.factorize(values.astype(str))
+    normalized = normalizer(pd.Series(uniques, dtype=object)).to_numpy()
+    return pd.Series(normalized[codes], index=values.index)
+
+
+def normalize_addresses(df):
+    """
+    This function returns the normalized street, city, and state columns of a POI dataset, for address matching only
+    (the original columns are kept untouched for display).
+    Case, surrounding/ repeated whitespace and punctuation are unified; street suffixes and directions are abbreviated
+    (e.g. "Street" -> "st", "West" -> "w"), ordinals lose their suffix ("114th" -> "114"),
+    and full state names and trailing ZIP codes are turned into the two-letter state code ("New York 10027" -> "ny").
+
+    Parameters
+    ---
+    df : pandans.DataFrame
+        This is the input dataframe, which contains a list of POI's address information.
+
+    Returns
+    ---
+    Output a pandans.DataFrame with the normalized street, city, and state columns, aligned with the input index.
+
+    Example
+    ---
+    normalize_addresses(starbuck)
+
+    """
+    return pd.DataFrame(
+        {
+            col: _normalize_unique(df[col], normalizer)
+            for col, normalizer in _NORMALIZERS.items()
+        }
+    )
+
+
+def address_keys(df):
+    """
+    This function returns the canonical key ("street|city|state" of normalize_addresses) of every POI,
+    so that equivalent addresses like "123 Main St" and "123 Main Street " share the same key.
+
+    Parameters
+    ---
+    df : pandans.DataFrame
+        This is the input dataframe, which contains a list of POI's address information.
+
+    Returns
+    ---
+    Output a pandans.Series of str keys aligned with the input index.
+
+    """
+    normalized = normalize_addresses(df)
+    return normalized["street"] + "|" + normalized["city"] + "|" + normalized["state"]
@@ -1,20 +1,58 @@
 import requests
 import pandas as pd
 from statistics import median
-import os
 
 # from requests_oauthlib import OAuth1Session
 import time
+import csv
+import io
 from datetime import datetime, timedelta
 
 # from dateutil import rrule
+import logging
 import warnings
-
-import plotly.graph_objects as go
-import plotly.express as px
-
-
-def get_coordinate_api(api_key, dataframe, maptype="world"):
+from concurrent.futures import ThreadPoolExecutor
+
+from .clients import get_client
+from .providers import get_provider
+from .normalize import address_keys
+from .export import save_figure
+from .cluster import cluster_points
+from .metrics import incr, observe, timer
+from .frames import (
+    _drop_missing_coordinates,
+    frame_buckets,
+    frame_format,
+    resample_frames,
+)
+from .trajectory import _simplify_mask, trajectory_stats
+
+import numpy as np
+
+# plotly is imported by the map functions when they run, so that geocoding-only jobs never load it
+
+logger = logging.getLogger(__name__)
+
+# Census bulk geocoder: one upload takes a CSV of at most 10,000 addresses.
+# https://geocoding.geo.census.gov/geocoder/Geocoding_Services_API.html
+CENSUS_BATCH_URL = "https://geocoding.geo.census.gov/geocoder/geographies/addressbatch"
+CENSUS_BATCH_SIZE = 10000
+# (connect, read) timeouts of a batch upload, in seconds: the Census geocoder takes minutes on a full batch
+CENSUS_BATCH_TIMEOUT = (30, 900)
+
+# columns of text that clean_dataset(downcast = True) turns into categoricals
+TEXT_COLUMNS = [
+    "spot_name",
+    "street",
+    "city",
+    "state",
+    "country",
+    "symbol",
+    "formattedAddress",
+]
+
+
+def get_coordinate_api(api_key, dataframe, maptype="world", cache=None, provider=None):
     """
     This function returns a one-line pandans.DataFrame showing coordination information of a POI.
 
@@ -33,6 +71,15 @@ def get_coordinate_api(api_key, dataframe, maptype="world"):
     maptype : {"world", "US"}, default "world", optional
         Geo-API to use. The "US" API returns more accurate result than "world" when specifically looking at places in the US.
         Details provided in the links attached below the api_key description.
+        Other backends can be added with poivizdynamic.providers.register_provider.
+        Requests go through the shared client of the geo-API (see poivizdynamic.clients.configure_client),
+        which reuses connections, keeps to the provider quota and retries throttled requests.
+
+    cache : poivizdynamic.cache.GeocodeCache, default None, optional
+        Persistent geocode cache. It is looked up before any request is sent, and successful results are stored in it.
+
+    provider : poivizdynamic.providers.GeocoderProvider, default None, optional
+        Geocoding backend to use instead of the one registered for maptype, e.g. an offline GazetteerProvider.
 
     Returns
     ---
@@ -48,80 +95,75 @@ def get_coordinate_api(api_key, dataframe, maptype="world"):
 
     """
 
-    start = time.time()  # time in seconds
-
     addr = dataframe[["street", "city", "state", "country"]].values.tolist()[0]
 
-    if maptype == "world":
+    record = _get_coordinate_record(
+        api_key, addr, maptype=maptype, cache=cache, provider=provider
+    )
+    if record is None:
+        return None
+    return pd.DataFrame([record], columns=["latitude", "longitude", "formattedAddress"])
 
-        # GEO_RADAR_API_KEY = os.getenv("GEO_RADAR_API_KEY")
-        # api_key = GEO_RADAR_API_KEY
-        api_url = f"https://api.radar.io/v1/geocode/forward?query={addr}"
-        try:
-            r = requests.get(api_url, headers={"Authorization": api_key})
-            # If the response was successful, no Exception will be raised
-            r.raise_for_status()
-        except requests.exceptions.RequestException as http_err:
-            print(f"Error occurred:{http_err}")
-        else:
-            # json_output = json.loads(r.content)
-            print("Successful! Status Code:{}".format(r.status_code))
-            out_df = pd.DataFrame(r.json()["addresses"])[
-                ["latitude", "longitude", "formattedAddress"]
-            ]
-            if out_df.empty == True:
-                warnings.warn(
-                    "Sorry! This address cannot be searched through the api and returned an empty result"
-                )
-                return None
-            else:
-                end = time.time()
-                print(f"Requested the api in {end - start:0.4f} seconds")
-            # return out_df
-    elif maptype == "US":
-        # GEO_CENSUS_API_KEY = os.getenv("GEO_CENSUS_API_KEY")
-        # api_key = GEO_CENSUS_API_KEY
-
-        street, city, state, _ = addr
-
-        benchmark = "Public_AR_Census2020"
-        vintage = "Census2020_Census2020"
-        layers = "10"
-        api_url = f"https://geocoding.geo.census.gov/geocoder/geographies/address?street={street}&city={city}&state={state}&benchmark={benchmark}&vintage={vintage}&layers={layers}&format=json&key={api_key}"
+
+def _get_coordinate_record(api_key, addr, maptype="world", cache=None, provider=None):
+    """
+    Geocode one address (the [street, city, state, country] list of a POI) and return
+    a plain {"latitude", "longitude", "formattedAddress"} record, or None when nothing matched.
+    get_coordinate_api and get_geo_dataset are both built on it, so no DataFrame is made per request.
+    The request is made by provider, or by the provider registered for maptype.
+    """
+    if provider is None:
         try:
-            r = requests.get(api_url)
-            # If the response was successful, no Exception will be raised
-            r.raise_for_status()
-        except requests.exceptions.RequestException as http_err:
-            print(f"Error occurred:{http_err}")
-        else:
-            # json_output = json.loads(r.content)
-            print("Successful! Status Code:{}".format(r.status_code))
-            df = pd.DataFrame(r.json()["result"]["addressMatches"])
-            if df.empty == True:
-                warnings.warn(
-                    "Sorry! This address cannot be searched through census_geocoding api and returned an empty result"
-                )
-                return None
-            else:
-                cord = df["coordinates"].values.tolist()
-                cord_split = pd.DataFrame(cord, columns=["x", "y"])
-                # adds = df["addressComponents"].values.tolist()
-                # adds_split = pd.DataFrame(adds, columns = ['city', 'state', 'zip'])
-                # out_df = pd.concat([df, cord_split, adds_split],axis=1)
-                out_df = pd.concat([df, cord_split], axis=1)[
-                    ["y", "x", "matchedAddress"]
-                ]
-                out_df.columns = ["latitude", "longitude", "formattedAddress"]
-                end = time.time()
-                print(
-                    f"Requested the api and transformed into dataframe in {end - start:0.4f} seconds"
-                )
+            provider = get_provider(maptype, api_key)
+        except ValueError as err:
+            warnings.warn(f"Sorry! {err}")
+            return None
+
+    if cache is not None:
+        cached = cache.get(addr, provider.name)
+        if cached is not None:
+            incr("geocode.cache_hits", provider=provider.name)
+            return cached
+        incr("geocode.cache_misses", provider=provider.name)
+
+    with timer("geocode.request", provider=provider.name):
+        record = provider.geocode(addr)
+    if record is None:
+        incr("geocode.no_match", provider=provider.name)
+
+    if cache is not None and record is not None:
+        cache.set(addr, provider.name, record)
 
+    return record
+
+
+def _join_records(dataframe, records):
+    """
+    Append the latitude, longitude, and formattedAddress columns built from a list of
+    geocoded records (one per row of dataframe, None when unmatched) and keep the matched rows only.
+    The columns are assembled once, instead of one DataFrame per address.
+    """
+    matched = [i for i, record in enumerate(records) if record is not None]
+    out_df = dataframe.iloc[matched].reset_index(drop=True)
+    out_df["latitude"] = [records[i]["latitude"] for i in matched]
+    out_df["longitude"] = [records[i]["longitude"] for i in matched]
+    out_df["formattedAddress"] = [records[i]["formattedAddress"] for i in matched]
+    # an empty list gives an object column; keep the documented float dtypes
+    out_df = out_df.astype({"latitude": "float64", "longitude": "float64"})
     return out_df
 
 
-def get_geo_dataset(api_key, df, maptype="world"):
+def get_geo_dataset(
+    api_key,
+    df,
+    maptype="world",
+    max_workers=1,
+    cache=None,
+    bulk=False,
+    batch_size=CENSUS_BATCH_SIZE,
+    provider=None,
+    normalize=False,
+):
     """
     This function returns a whole dataset with geo-information, a pandans.DataFrame combined original information with matched geographical information.
 
@@ -140,10 +182,35 @@ def get_geo_dataset(api_key, df, maptype="world"):
         Geo-API to use. The "US" API returns more accurate result than "world" when specifically looking at places in the US.
         Details provided in the links attached below the api_key description.
 
+    max_workers : int, default 1, optional
+        Maximum number of geo-API requests kept in flight at the same time.
+        1 runs the requests one by one; a larger number sends them through a thread pool.
+        The output (and its row order) is the same whatever the value is.
+
+    cache : poivizdynamic.cache.GeocodeCache, default None, optional
+        Persistent geocode cache shared by all the requests, so addresses resolved by an earlier run are not requested again.
+
+    bulk : bool, default False, optional
+        Only used with maptype = "US". True uploads the unique addresses to the Census batch geocoder
+        (see get_census_batch_coordinates) instead of requesting them one by one, so N requests become N/ batch_size uploads.
+
+    batch_size : int, default 10000, optional
+        Number of addresses per upload in the bulk mode. 10000 is the maximum accepted by the Census geocoder.
+
+    provider : poivizdynamic.providers.GeocoderProvider, default None, optional
+        Geocoding backend to use instead of the one registered for maptype, e.g. an offline GazetteerProvider
+        or a ChainProvider trying it before a geo-API. maptype and bulk are ignored when it is given.
+
+    normalize : bool, default False, optional
+        True deduplicates the addresses on their canonical key (see poivizdynamic.normalize.address_keys)
+        instead of the exact street and city, so "123 Main St" and "123 Main Street " share one lookup.
+
     Returns
     ---
     Output the whole dataset with geo-information, a pandans.DataFrame combined original information with matched geographical information.
     The column number should be 12.
+    The dedup statistics (rows, unique_addresses, and dedup_ratio, the share of rows that needed no lookup of their own)
+    are reported in df.attrs["geocoding"].
 
     unique_id             int64
     spot_name            object
@@ -165,49 +232,215 @@ def get_geo_dataset(api_key, df, maptype="world"):
     get_coordinate_api(api_key = GEO_CENSUS_API_KEY, starbuck, maptype = "US")
 
     """
+    start = time.perf_counter()
 
     # apply api only on unique address in oreder to save time and even money.
     # get non-duplication dataset
-    temp_nodup = df.drop_duplicates(subset=["street", "city"])
+    if normalize:
+        keys = address_keys(df)
+        temp_nodup = df[~keys.duplicated()].assign(_address_key=keys)
+    else:
+        temp_nodup = df.drop_duplicates(subset=["street", "city"])
+
+    n_rows, n_unique = len(df), len(temp_nodup)
+    dedup_ratio = 1 - n_unique / n_rows if n_rows > 0 else 0.0
+    logger.info(
+        "Geocoding %d unique addresses for %d rows (dedup ratio %0.2f%%)",
+        n_unique,
+        n_rows,
+        dedup_ratio * 100,
+    )
 
-    for i in range(len(temp_nodup)):
-        temp = temp_nodup.iloc[i, :]
-        temp = pd.DataFrame([temp.values], columns=temp.index)
+    if bulk and maptype == "US" and provider is None:
+        df_out = get_census_batch_coordinates(
+            api_key, temp_nodup, batch_size=batch_size, cache=cache
+        )
+    else:
+        addrs = temp_nodup[["street", "city", "state", "country"]].values.tolist()
+        if provider is None:
+            # built once for the whole dataset: a registered factory may load an index or open a session
+            try:
+                provider = get_provider(maptype, api_key)
+            except ValueError as err:
+                warnings.warn(f"Sorry! {err}")
+
+        def geocode(addr):
+            return _get_coordinate_record(
+                api_key, addr, maptype=maptype, cache=cache, provider=provider
+            )
 
-        temp2 = get_coordinate_api(api_key, temp, maptype=maptype)
-        if i == 0:
-            df_out = pd.concat([temp, temp2], axis=1)
+        if provider is None:
+            records = [None] * len(addrs)
+        elif max_workers is None or max_workers <= 1:
+            records = [geocode(addr) for addr in addrs]
         else:
-            if temp2 is None:
-                continue
-            else:
+            # the requests spend nearly all their time waiting on the network,
+            # so threads are enough; executor.map keeps the input order.
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                records = list(executor.map(geocode, addrs))
 
-                mid = pd.concat([temp, temp2], axis=1)
-                df_out = df_out.append(mid, ignore_index=True)
-
-        i += 1
+        df_out = _join_records(temp_nodup, records)
 
     # left join the list of outcome to the original dataset (with duplicates)
-    df_out_final = df.merge(
-        df_out[
-            ["street", "city", "state", "latitude", "longitude", "formattedAddress"]
-        ],
-        on=["street", "city", "state"],
-        how="left",
-    )
+    if normalize:
+        df_out_final = (
+            df.assign(_address_key=keys)
+            .merge(
+                df_out[["_address_key", "latitude", "longitude", "formattedAddress"]],
+                on="_address_key",
+                how="left",
+            )
+            .drop(columns="_address_key")
+        )
+    else:
+        df_out_final = df.merge(
+            df_out[
+                ["street", "city", "state", "latitude", "longitude", "formattedAddress"]
+            ],
+            on=["street", "city", "state"],
+            how="left",
+        )
+
+    df_out_final.attrs["geocoding"] = {
+        "rows": n_rows,
+        "unique_addresses": n_unique,
+        "dedup_ratio": dedup_ratio,
+    }
+    observe("geocode.dataset", time.perf_counter() - start)
 
     return df_out_final
 
 
-def clean_dataset(df):
+def get_census_batch_coordinates(
+    api_key,
+    dataframe,
+    batch_size=CENSUS_BATCH_SIZE,
+    cache=None,
+    api_url=None,
+    timeout=CENSUS_BATCH_TIMEOUT,
+):
+    """
+    This function geocodes many US addresses at once through the Census batch geocoder ("addressbatch" endpoint).
+
+    Parameters
+    ---
+    api_key: the private api key GEO_CENSUS_API_KEY provided by the U.S. Census Bureau (same as get_coordinate_api with maptype = "US").
+
+    dataframe : pandans.DataFrame
+        This is the input dataframe, which contains a list of POI's address information (one row per address).
+
+    batch_size : int, default 10000, optional
+        Number of addresses uploaded per request. The Census geocoder accepts at most 10000.
+
+    cache : poivizdynamic.cache.GeocodeCache, default None, optional
+        Persistent geocode cache. Only the addresses missing from it are uploaded, and the matches are stored in it.
+
+    api_url : str, default None, optional
+        Batch endpoint to upload to. None uses CENSUS_BATCH_URL.
+
+    timeout : float or (float, float), default (30, 900), optional
+        Connect and read timeouts of an upload in seconds (None waits forever). An upload whose answer times out
+        is not sent again (the geocoder may still be working on it): its addresses are left unmatched.
+
+    Returns
+    ---
+    Output the matched rows of the input dataframe with the latitude, longitude, and formattedAddress columns appended.
+    Addresses without a match are left out, like in the one-by-one mode of get_geo_dataset.
+
+    Example
+    ---
+    get_census_batch_coordinates(api_key = GEO_CENSUS_API_KEY, starbuck)
+
+    """
+    if api_url is None:
+        api_url = CENSUS_BATCH_URL
+
+    addrs = dataframe[["street", "city", "state", "country"]].values.tolist()
+    records = [None] * len(addrs)
+
+    todo = []
+    for i, addr in enumerate(addrs):
+        if cache is not None:
+            records[i] = cache.get(addr, "US")
+        if records[i] is None:
+            todo.append(i)
+
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start : start + batch_size]
+
+        # upload format: Unique ID, Street address, City, State, ZIP
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for i in batch:
+            street, city, state, _ = addrs[i]
+            writer.writerow([i, street, city, state, ""])
+
+        data = {
+            "benchmark": "Public_AR_Census2020",
+            "vintage": "Census2020_Census2020",
+        }
+        if api_key is not None:
+            data["key"] = api_key
+        t0 = time.perf_counter()
+        try:
+            r = get_client("US").post(
+                api_url,
+                data=data,
+                files={"addressFile": ("addresses.csv", buffer.getvalue(), "text/csv")},
+                timeout=timeout,
+            )
+            r.raise_for_status()
+        except requests.exceptions.RequestException as http_err:
+            logger.warning("Error occurred: %s", http_err)
+            incr("geocode.errors", provider="US")
+            continue
+        observe("geocode.batch", time.perf_counter() - t0, provider="US")
+        logger.debug(
+            "Successful! Status Code: %s (%d addresses)", r.status_code, len(batch)
+        )
+
+        # response format: ID, input address, match indicator, match type,
+        # matched address, "longitude,latitude", ... (geography columns)
+        for row in csv.reader(io.StringIO(r.text)):
+            if len(row) < 6 or row[2] != "Match":
+                continue
+            lon, lat = row[5].split(",")
+            i = int(row[0])
+            records[i] = {
+                "latitude": float(lat),
+                "longitude": float(lon),
+                "formattedAddress": row[4],
+            }
+            if cache is not None:
+                cache.set(addrs[i], "US", records[i])
+
+    n_missing = sum(record is None for record in records)
+    if n_missing > 0:
+        warnings.warn(
+            f"Sorry! {n_missing} addresses cannot be searched through census batch geocoding api and returned an empty result"
+        )
+
+    return _join_records(dataframe, records)
+
+
+def clean_dataset(df, date_format=None, downcast=False, drop_invalid=False):
     """
     This function gets ready the data type in the dataset for animated map ploting usage.
     It ensures the "date" is date format; "longitude" and "latitude" are numeric format.
+    The input dataframe is left untouched, and columns already of the right type are neither parsed nor copied again.
+    The rows are sorted by date (stable), unless they already are.
 
     Parameters
     ---
     dataframe : pandans.DataFrame
         This is the input dataframe.
+    date_format : str, default None
+        The strftime format of the date strings, e.g. "%Y-%m-%d"; None infers it (slower on large dataframes).
+    downcast : bool, default False
+        True stores latitude and longitude as float32 (about 1 m precision) and the text columns
+        (spot_name, street, city, state, country, symbol, formattedAddress) as categoricals, to reduce the memory.
+    drop_invalid : bool, default False
+        True removes the rows with a missing date, or a missing or out of range coordinate.
 
     Returns
     ---
@@ -227,11 +460,59 @@ def clean_dataset(df):
     formattedAddress            object
     dtype: object
 
+    A validation report is kept in df.attrs["validation"]: the number of rows, of missing (or unparsable) dates,
+    of missing and out of range latitudes and longitudes, of dropped rows, and whether the rows were already sorted.
+
+    Example
+    ---
+    clean_dataset(starb2, date_format = "%Y-%m-%d", downcast = True)
+
     """
-    df["date"] = pd.to_datetime(df["date"])
-    df["longitude"] = pd.to_numeric(df["longitude"])  # ,errors = 'coerce'
-    df["latitude"] = pd.to_numeric(df["latitude"])
-    df = df.sort_values(by="date")
+    start = time.perf_counter()
+    # a shallow copy: the new columns replace the old ones in the copy only
+    df = df.copy(deep=False)
+
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df["date"] = pd.to_datetime(df["date"], format=date_format, errors="coerce")
+    coord_dtype = np.float32 if downcast else np.float64
+    for col in ["longitude", "latitude"]:
+        if df[col].dtype != coord_dtype:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(coord_dtype)
+    if downcast:
+        for col in TEXT_COLUMNS:
+            if col in df.columns and df[col].dtype == object:
+                df[col] = df[col].astype("category")
+
+    lat, lon = df["latitude"].to_numpy(), df["longitude"].to_numpy()
+    # comparisons with NaN are False: a missing coordinate is not out of range
+    lat_out = np.abs(lat) > 90
+    lon_out = np.abs(lon) > 180
+    invalid = df["date"].isna().to_numpy() | np.isnan(lat) | np.isnan(lon)
+    invalid |= lat_out | lon_out
+    report = {
+        "rows": len(df),
+        "missing_date": int(df["date"].isna().sum()),
+        "missing_latitude": int(np.isnan(lat).sum()),
+        "missing_longitude": int(np.isnan(lon).sum()),
+        "out_of_range_latitude": int(lat_out.sum()),
+        "out_of_range_longitude": int(lon_out.sum()),
+        "dropped": 0,
+    }
+    if invalid.any():
+        if drop_invalid:
+            df = df[~invalid]
+            report["dropped"] = int(invalid.sum())
+        else:
+            warnings.warn(
+                f"Sorry! {int(invalid.sum())} rows have a missing date or a missing/ out of range coordinate; "
+                "see df.attrs['validation'] or use drop_invalid = True"
+            )
+
+    report["already_sorted"] = bool(df["date"].is_monotonic_increasing)
+    if not report["already_sorted"]:
+        df = df.sort_values(by="date", kind="stable")
+    df.attrs["validation"] = report
+    observe("clean", time.perf_counter() - start)
     return df
 
 
@@ -242,6 +523,15 @@ def get_footprint_map(
     title_text="My animated map",
     title_size=20,
     zoom=2.5,
+    max_frames=None,
+    compact=False,
+    show=True,
+    output_dir="demo_output",
+    sink="html",
+    frame_freq=None,
+    cumulative=True,
+    simplify=None,
+    stats=False,
 ):
     """
     This function returns a dynamic footprint plotly map plot saved as "html" file in the "demo_output" directory.
@@ -260,51 +550,172 @@ def get_footprint_map(
         Customize the font size of the map title.
     zoom: float/ int, default 2.5
         Customize the zoom level of the map plot. 2.5 for country level, 10~20 for city/ street level.
+    max_frames: int, default None
+        Maximum number of animation frames (at least 1). None makes one frame per POI; for long traces, a bound keeps the
+        size of the html file and the build time linear in the trace length (the frames are spread evenly along the trace,
+        the last one showing it all).
+    compact: bool, default False
+        True writes the coordinates into the html file as base64 float32 typed arrays and the unchanging frame attributes once
+        (see poivizdynamic.export.compact_figure): a smaller file, faster to write and to load in the browser.
+    show: bool, default True
+        Display the figure with plotly's default renderer. Set False in scripts and batch jobs: nothing is opened.
+    output_dir: str, default "demo_output"
+        Directory of the saved file.
+    sink: {"html", "json", None}, default "html"
+        Format of the saved file: a standalone html page, the plotly figure JSON, or None to save nothing.
+    frame_freq: {"minute", "hour", "day", "week", "month"}, a pandas period alias, or int; default None
+        None makes the frames of max_frames. Otherwise one frame per time bucket of the date column, or N frames of equal length
+        for an int N (see poivizdynamic.frames.frame_buckets); the rows must be sorted by date, as clean_dataset does.
+    cumulative: bool, default True
+        True: each frame shows the footprint from the first POI on. False: only the POIs of the frame's own time window.
+    simplify: float, default None
+        Simplify the trace with the Douglas-Peucker algorithm before the frames are built, dropping the points within simplify meters
+        of the simplified path (see poivizdynamic.trajectory.simplify_trace): long GPS-like logs make much smaller frames.
+    stats: bool, default False
+        Show the distance from the first POI, the speed and the dwell time of every POI in its hover label,
+        computed on the whole trace before simplification (see poivizdynamic.trajectory.trajectory_stats for the table).
 
     Returns
     ---
     Output plotly dynamic map plot of the POIs' geometric information change with the date information. Trace line of the activity is shown.
+    The figure is returned as a plotly figure dict, which can be shown, saved, or reused again.
 
     Example
     ---
     get_footprint_map(TOKEN_MAPBOX, travel, fig_name = "my foot print", title_text = "My Animated Footprint Map")
 
     """
+    import plotly.io as pio
 
     # TOKEN_MAPBOX = os.getenv("TOKEN_MAPBOX")
 
-    lon = [df_in["longitude"][0]]
-    lat = [df_in["latitude"][0]]
+    with timer("render.build", kind="footprint"):
+        fig = _build_footprint_figure(
+            TOKEN_MAPBOX,
+            df_in,
+            title_text=title_text,
+            title_size=title_size,
+            zoom=zoom,
+            max_frames=max_frames,
+            frame_freq=frame_freq,
+            cumulative=cumulative,
+            simplify=simplify,
+            stats=stats,
+        )
 
-    mid_lat = df_in["latitude"].mean()
-    mid_lon = df_in["longitude"].mean()
-    lon_ls = df_in["longitude"].values.tolist()
-    lat_ls = df_in["latitude"].values.tolist()
+    if show:
+        # the frames are plain dicts: skip plotly's validation of every frame
+        pio.show(fig, validate=False)
 
-    frames = []
+    # save the html dynamic file
+    save_figure(fig, output_dir, fig_name, sink=sink, compact=compact)
+    return fig
 
-    for i in range(1, len(df_in)):
 
-        lon.append(lon_ls[i])
+def _coordinates(values):
+    # float32 coordinates (clean_dataset(downcast = True)) stay float32, like in plotly.express
+    return values.to_numpy(dtype=values.dtype if values.dtype.kind == "f" else float)
 
-        lat.append(lat_ls[i])
 
-        framei = go.Frame(
-            data=[
-                go.Scattermapbox(
-                    lon=lon,
-                    lat=lat,
-                )
-            ],
+def _footprint_frame_ends(n, max_frames=None):
+    """
+    Number of points shown by each frame of a footprint animation of n points: one frame per point
+    from the second one on, or at most max_frames frames evenly spread over the trace (the last one shows it all).
+    """
+    if max_frames is not None and max_frames < 1:
+        raise ValueError(f"max_frames must be positive, got {max_frames}")
+    if n < 2:
+        return np.array([], dtype=int)
+    if max_frames is None or max_frames >= n - 1:
+        return np.arange(2, n + 1)
+    # spread from the end of the trace: a single frame shows it all
+    return np.unique(np.linspace(n, 2, max_frames).round().astype(int))
+
+
+def _build_footprint_figure(
+    TOKEN_MAPBOX,
+    df_in,
+    title_text="My animated map",
+    title_size=20,
+    zoom=2.5,
+    max_frames=None,
+    frame_freq=None,
+    cumulative=True,
+    simplify=None,
+    stats=False,
+):
+    """
+    Build the figure of get_footprint_map as a plain plotly figure dict.
+    Frame k shows the trace up to its k-th end point (from the previous end point when not cumulative); the frame payloads
+    are views of the same two coordinate arrays, built once, instead of go.Frame objects validated (and copied) one by one.
+    """
+    import plotly.graph_objects as go
+
+    if stats or simplify is not None:
+        df_in = _drop_missing_coordinates(df_in)
+    if stats:
+        # on the whole trace: the simplified path is shorter than the one travelled
+        trip = trajectory_stats(df_in)
+        customdata = np.column_stack(
+            [
+                trip["cumulative_m"].to_numpy() / 1000,
+                trip["speed_mps"].to_numpy() * 3.6,
+                trip["dwell_s"].to_numpy() / 60,
+            ]
+        )
+    if simplify is not None:
+        mask = _simplify_mask(
+            df_in["latitude"].to_numpy(dtype=float),
+            df_in["longitude"].to_numpy(dtype=float),
+            simplify,
         )
-        frames.append(framei)
+        df_in = df_in[mask]
+        if stats:
+            customdata = customdata[mask]
+
+    lon_arr = _coordinates(df_in["longitude"])
+    lat_arr = _coordinates(df_in["latitude"])
+
+    mid_lat = df_in["latitude"].mean()
+    mid_lon = df_in["longitude"].mean()
+
+    if frame_freq is None:
+        ends = _footprint_frame_ends(len(df_in), max_frames)
+    else:
+        buckets = frame_buckets(df_in["date"], frame_freq).to_numpy()
+        ends = np.append(np.flatnonzero(buckets[1:] != buckets[:-1]) + 1, len(df_in))
+    starts = np.zeros(len(ends), dtype=int)
+    if not cumulative:
+        starts[1:] = ends[:-1]
+
+    frames = [
+        {
+            "data": [
+                {
+                    "type": "scattermapbox",
+                    "lon": lon_arr[start:end],
+                    "lat": lat_arr[start:end],
+                }
+            ]
+        }
+        for start, end in zip(starts, ends)
+    ]
+    if not cumulative:
+        # the labels and symbols of a window do not start with the first POI
+        text = df_in["spot_name"].tolist()
+        symbol = df_in["symbol"].tolist()
+        for frame, start, end in zip(frames, starts, ends):
+            frame["data"][0]["text"] = text[start:end]
+            frame["data"][0]["marker"] = {"symbol": symbol[start:end]}
+            if stats:
+                frame["data"][0]["customdata"] = customdata[start:end]
 
     fig = go.Figure(
         data=[
             go.Scattermapbox(
                 mode="markers+text+lines",
-                lon=lon_ls,
-                lat=lat_ls,
+                lon=lon_arr,
+                lat=lat_arr,
                 marker={"size": 20, "symbol": df_in["symbol"].tolist()},
                 text=df_in["spot_name"].tolist(),
                 textposition="bottom right"
@@ -320,7 +731,6 @@ def get_footprint_map(
             ],
             mapbox={"accesstoken": TOKEN_MAPBOX, "style": "light", "zoom": zoom},
         ),
-        frames=frames,
     )
 
     fig.update_layout(
@@ -330,16 +740,15 @@ def get_footprint_map(
         title_font_size=title_size,
     )
 
-    fig.show()
-
-    # save the html dynamic file
-    if not os.path.exists("demo_output"):
-        os.makedirs("demo_output")
-
-    html_path = f"demo_output/{fig_name}.html"
-    # html_path = f'{fig_name}.html'
-    fig.write_html(html_path)
-    # return fig
+    fig = fig.to_dict()
+    if stats:
+        fig["data"][0]["customdata"] = customdata
+        fig["data"][0]["hovertemplate"] = (
+            "%{text}<br>%{customdata[0]:.2f} km from the start"
+            "<br>%{customdata[1]:.1f} km/h<br>dwell %{customdata[2]:.0f} min<extra></extra>"
+        )
+    fig["frames"] = frames
+    return fig
 
 
 def get_animated_bubble_map(
@@ -352,6 +761,16 @@ def get_animated_bubble_map(
     radius=20,
     zoom=2.5,
     fig_name="my_animated_bubble_plot",
+    engine="express",
+    compact=False,
+    show=True,
+    output_dir="demo_output",
+    sink="html",
+    cluster=False,
+    cluster_agg="sum",
+    cluster_pixels=10,
+    frame_freq=None,
+    frame_agg="sum",
 ):
     """
     This function returns a dynamic bubble plotly map plot saved as "html" file in the "demo_output" directory. The bubble size and color could be controlled.
@@ -379,38 +798,142 @@ def get_animated_bubble_map(
         Customize the zoom level of the map plot. 2.5 for country level, 10~20 for city/ street level.
     fig_name: str, default "my_animate_map"
         Customize name of saving html file.
+    engine: {"express", "fast"}, default "express"
+        "express" builds the figure with plotly.express.
+        "fast" builds the same figure with a NumPy grouping done once and plain dict frames, at a fraction of the CPU time and memory for large dataframes.
+    compact: bool, default False
+        True writes the coordinates and values into the html file as base64 float32 typed arrays and the unchanging frame attributes once
+        (see poivizdynamic.export.compact_figure): a smaller file, faster to write and to load in the browser.
+    show: bool, default True
+        Display the figure with plotly's default renderer. Set False in scripts and batch jobs: nothing is opened.
+    output_dir: str, default "demo_output"
+        Directory of the saved file.
+    sink: {"html", "json", None}, default "html"
+        Format of the saved file: a standalone html page, the plotly figure JSON, or None to save nothing.
+    cluster: bool, default False
+        True merges, per date and color group, the POIs that overlap at the zoom level into one bubble at their mean position
+        (see poivizdynamic.cluster.cluster_points), for dense maps with too many points to draw.
+    cluster_agg: {"sum", "mean"}, default "sum"
+        How the bubble_size values (and continuous color values) of the clustered POIs are combined.
+    cluster_pixels: int, default 10
+        Size in screen pixels of the clustering cells.
+    frame_freq: {"minute", "hour", "day", "week", "month"}, a pandas period alias, or int; default None
+        None makes one frame per day. Otherwise one frame per time bucket of that length, or N frames of equal length for an int N
+        (see poivizdynamic.frames.resample_frames): the number of frames, the file size and the build time stay bounded
+        however fine the dates are.
+    frame_agg: {"sum", "mean", "max", "last"}, default "sum"
+        How the bubble_size values (and continuous color values) of a POI in a frame are combined, with frame_freq.
 
     Returns
     ---
     Output plotly dynamic bubble map plot of the POIs' geometric information change with the date information.
+    The figure is returned (a plotly figure dict with engine = "fast", a plotly.graph_objects.Figure otherwise).
 
     Example
     ---
     get_animated_bubble_map(TOKEN_MAPBOX, starb2, zoom = 10, color_value_discrete = False, bubble_size = "interest_value", color_group_lab = "interest_value", fig_name = "starbuck2")
 
     """
-    df = df.dropna(subset=["longitude", "latitude"], axis=0)
+    import plotly.io as pio
+
+    date_format = "%Y-%m-%d"
+    if frame_freq is not None:
+        df = resample_frames(
+            df,
+            frame_freq,
+            color_group_lab=color_group_lab,
+            bubble_size=bubble_size,
+            agg=frame_agg,
+        )
+        date_format = frame_format(df["date"])
+
+    if cluster:
+        n_points = len(df)
+        df = cluster_points(
+            df,
+            zoom,
+            color_group_lab=color_group_lab,
+            bubble_size=bubble_size,
+            agg=cluster_agg,
+            cell_pixels=cluster_pixels,
+            # the dates are already the frames after resampling
+            frame_freq="day" if frame_freq is None else None,
+        )
+        logger.info("Clustered %d POIs into %d bubbles", n_points, len(df))
+
+    start = time.perf_counter()
+    if engine == "fast":
+        fig = _build_bubble_figure(
+            df,
+            title_text=title_text,
+            title_size=title_size,
+            color_group_lab=color_group_lab,
+            color_value_discrete=color_value_discrete,
+            bubble_size=bubble_size,
+            radius=radius,
+            zoom=zoom,
+            date_format=date_format,
+        )
+    else:
+        fig = _build_bubble_figure_express(
+            df,
+            title_text=title_text,
+            title_size=title_size,
+            color_group_lab=color_group_lab,
+            color_value_discrete=color_value_discrete,
+            bubble_size=bubble_size,
+            radius=radius,
+            zoom=zoom,
+            date_format=date_format,
+        )
+    observe("render.build", time.perf_counter() - start, kind="bubble")
+
+    if show:
+        pio.show(fig, validate=False)
+
+    # save the html dynamic file
+    save_figure(fig, output_dir, fig_name, sink=sink, compact=compact)
+    return fig
+
+
+def _build_bubble_figure_express(
+    df,
+    title_text="My animated bubble map with value/ colored with spot or group",
+    title_size=20,
+    color_group_lab="spot_name",
+    color_value_discrete=True,
+    bubble_size="interest_value",
+    radius=20,
+    zoom=2.5,
+    date_format="%Y-%m-%d",
+):
+    """
+    Build the figure of get_animated_bubble_map through plotly.express (engine = "express").
+    """
+    import plotly.express as px
+
+    df = _drop_missing_coordinates(df)
 
     lat_lab = "latitude"
     lon_lab = "longitude"
 
-    date = df["date"].apply(lambda x: x.strftime("%Y-%m-%d"))
+    date = pd.to_datetime(df["date"]).dt.strftime(date_format)
 
     mid_lat = median(df[lat_lab])
 
     mid_lon = median(df[lon_lab])
 
     if type(bubble_size) == str:
-
-        df[bubble_size] = df[bubble_size].apply(lambda x: pd.to_numeric(x))
-        print("bubble_size will change along with the true value")
+        if not pd.api.types.is_numeric_dtype(df[bubble_size]):
+            df = df.assign(**{bubble_size: pd.to_numeric(df[bubble_size])})
+        logger.debug("bubble_size will change along with the true value")
     else:
         const_num = bubble_size
         bubble_size = [const_num] * len(df)
-        print("bubble_size is a constant number")
+        logger.debug("bubble_size is a constant number")
 
     if color_value_discrete == True:
-        print("the value is discrete")
+        logger.debug("the value is discrete")
         fig = px.scatter_mapbox(
             df,
             lat=lat_lab,
@@ -424,7 +947,7 @@ def get_animated_bubble_map(
             # labels = {value_lab:'income'} # only for continuous data
         )
     else:
-        print("the value is continuous")
+        logger.debug("the value is continuous")
         fig = px.scatter_mapbox(
             df,
             lat=lat_lab,
@@ -454,17 +977,226 @@ def get_animated_bubble_map(
     fig.layout.sliders[0].pad.t = 10
     fig.layout.updatemenus[0].pad.t = 10
 
-    fig.show()
+    return fig
 
-    # save the html dynamic file
-    if not os.path.exists("demo_output"):
-        os.makedirs("demo_output")
 
-    html_path = f"demo_output/{fig_name}.html"
-    # html_path = f'{fig_name}.html'
-    fig.write_html(html_path)
+def _bubble_palette(color_value_discrete=True):
+    """
+    Return the discrete color sequence and the continuous color scale of get_animated_bubble_map, as plotly.express picks them.
+    """
+    import plotly.colors
+    import plotly.io as pio
+
+    if color_value_discrete == True:
+        return plotly.colors.qualitative.D3, plotly.colors.sequential.Plasma
+    # the default of plotly.express: the colorway of the current template
+    return (
+        pio.templates[pio.templates.default].layout.colorway,
+        plotly.colors.sequential.Mint,
+    )
+
+
+def _build_bubble_figure(
+    df,
+    title_text="My animated bubble map with value/ colored with spot or group",
+    title_size=20,
+    color_group_lab="spot_name",
+    color_value_discrete=True,
+    bubble_size="interest_value",
+    radius=20,
+    zoom=2.5,
+    date_format="%Y-%m-%d",
+):
+    """
+    Build the figure of get_animated_bubble_map as a plain plotly figure dict (engine = "fast").
+    It is the same figure as the plotly.express one, but the rows are grouped once by (date, color group)
+    with NumPy, and the frames and traces are emitted as dicts holding array views, without plotly.express
+    grouping and validating the whole dataframe per frame.
+    """
+    import plotly.graph_objects as go
+
+    df = _drop_missing_coordinates(df)
+
+    lat = _coordinates(df["latitude"])
+    lon = _coordinates(df["longitude"])
+
+    mid_lat = median(lat)
+    mid_lon = median(lon)
+
+    # one frame per date label, in order of appearance like plotly.express
+    dates = pd.to_datetime(df["date"]).to_numpy()
+    if date_format == "%Y-%m-%d":
+        days = dates.astype("datetime64[D]")
+        frame_codes, frame_days = pd.factorize(days.view("int64"))
+        frame_labels = np.datetime_as_string(
+            frame_days.astype("datetime64[D]"), unit="D"
+        ).tolist()
+    else:
+        # format the distinct dates only, then merge those sharing a label
+        date_codes, uniques = pd.factorize(dates)
+        label_codes, frame_labels = pd.factorize(
+            pd.DatetimeIndex(uniques).strftime(date_format)
+        )
+        frame_codes = label_codes[date_codes]
+        frame_labels = frame_labels.tolist()
+
+    if type(bubble_size) == str:
+        size = pd.to_numeric(df[bubble_size]).to_numpy()
+        size_lab = bubble_size
+        logger.debug("bubble_size will change along with the true value")
+    else:
+        size = np.full(len(df), bubble_size)
+        size_lab = "size"
+        logger.debug("bubble_size is a constant number")
+    sizeref = size.max() / radius**2 if len(size) > 0 else 1
+
+    color = df[color_group_lab]
+    # plotly.express picks a continuous color scale for numeric columns whatever the sequence passed
+    continuous = pd.api.types.is_numeric_dtype(color)
+    if color_value_discrete == True:
+        logger.debug("the value is discrete")
+    else:
+        logger.debug("the value is continuous")
+    palette, colorscale = _bubble_palette(color_value_discrete)
+
+    if continuous:
+        group_codes = np.zeros(len(df), dtype=int)
+        group_names = [""]
+        color_values = color.to_numpy()
+    else:
+        group_codes, group_names = pd.factorize(color)
+        group_names = [str(name) for name in group_names]
+
+    def hover(group, frame):
+        # the hover fields and their order as written by plotly.express
+        fields = [f"animation_frame={frame}", f"{size_lab}=%{{marker.size}}"]
+        if not continuous:
+            fields.insert(0, f"{color_group_lab}={group}")
+        elif size_lab == color_group_lab:
+            fields[1] = f"{size_lab}=%{{marker.color}}"
+        fields += ["latitude=%{lat}", "longitude=%{lon}"]
+        if continuous and size_lab != color_group_lab:
+            fields.append(f"{color_group_lab}=%{{marker.color}}")
+        return "<br>".join(fields) + "<extra></extra>"
+
+    # sort once by (frame, group) and cut the sorted index into the traces
+    order = np.lexsort((group_codes, frame_codes))
+    # rows without color value are not drawn, as with plotly.express (code -1 would join the last group of the previous frame)
+    order = order[group_codes[order] >= 0]
+    keys = frame_codes[order] * len(group_names) + group_codes[order]
+    bounds = np.flatnonzero(np.diff(keys)) + 1
+    starts = np.concatenate([[0], bounds]).astype(int)
+    ends = np.concatenate([bounds, [len(order)]]).astype(int)
+
+    frames = [{"data": [], "name": label} for label in frame_labels]
+    for start, end in zip(starts, ends):
+        idx = order[start:end]
+        f, g = frame_codes[idx[0]], group_codes[idx[0]]
+        trace = {
+            "lat": lat[idx],
+            "lon": lon[idx],
+            "marker": {"size": size[idx], "sizemode": "area", "sizeref": sizeref},
+            "mode": "markers",
+            "subplot": "mapbox",
+            "type": "scattermapbox",
+        }
+        if continuous:
+            trace["hovertemplate"] = hover(None, frame_labels[f])
+            trace["legendgroup"] = ""
+            trace["name"] = ""
+            trace["showlegend"] = False
+            trace["marker"]["color"] = color_values[idx]
+            trace["marker"]["coloraxis"] = "coloraxis"
+        else:
+            trace["hovertemplate"] = hover(group_names[g], frame_labels[f])
+            trace["legendgroup"] = group_names[g]
+            trace["name"] = group_names[g]
+            trace["showlegend"] = True
+            trace["marker"]["color"] = palette[g % len(palette)]
+        frames[f]["data"].append(trace)
+
+    def animate_args(frame, duration):
+        return [
+            frame,
+            {
+                "frame": {"duration": duration, "redraw": True},
+                "fromcurrent": True,
+                "mode": "immediate",
+                "transition": {"duration": duration, "easing": "linear"},
+            },
+        ]
+
+    legend = {"itemsizing": "constant", "tracegroupgap": 0}
+    coloraxis = {"showscale": True}
+    if continuous:
+        coloraxis["colorbar"] = {"title": {"text": color_group_lab}}
+        coloraxis["colorscale"] = colorscale
+    else:
+        legend["title"] = {"text": color_group_lab}
+
+    layout = go.Layout(
+        legend=legend,
+        coloraxis=coloraxis,
+        mapbox={
+            "center": {"lat": mid_lat, "lon": mid_lon},
+            "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+            "style": "carto-positron",
+            "zoom": zoom,
+        },
+        margin={"r": 0, "t": 40, "l": 0, "b": 0},
+        title_text=title_text,
+        title_font_size=title_size,
+        sliders=[
+            {
+                "active": 0,
+                "currentvalue": {"prefix": "animation_frame="},
+                "len": 0.9,
+                "pad": {"b": 10, "t": 10},
+                "steps": [
+                    {
+                        "args": animate_args([label], 0),
+                        "label": label,
+                        "method": "animate",
+                    }
+                    for label in frame_labels
+                ],
+                "x": 0.1,
+                "xanchor": "left",
+                "y": 0,
+                "yanchor": "top",
+            }
+        ],
+        updatemenus=[
+            {
+                "buttons": [
+                    {
+                        "args": animate_args(None, 600),
+                        "label": "&#9654;",
+                        "method": "animate",
+                    },
+                    {
+                        "args": animate_args([None], 0),
+                        "label": "&#9724;",
+                        "method": "animate",
+                    },
+                ],
+                "direction": "left",
+                "pad": {"r": 10, "t": 10},
+                "showactive": False,
+                "type": "buttons",
+                "x": 0.1,
+                "xanchor": "right",
+                "y": 0,
+                "yanchor": "top",
+            }
+        ],
+    )
 
-    # return fig
+    return {
+        "data": frames[0]["data"] if frames else [],
+        "layout": go.Figure(layout=layout).to_dict()["layout"],
+        "frames": frames,
+    }
 
 
 def get_demo_data(df, demo_data="my travel map"):
@@ -0,0 +1,230 @@
+import logging
+import warnings
+
+import requests
+
+from .cache import _normalize_address
+from .clients import get_client
+from .metrics import incr
+
+logger = logging.getLogger(__name__)
+
+RADAR_URL = "https://api.radar.io/v1/geocode/forward"
+CENSUS_URL = "https://geocoding.geo.census.gov/geocoder/geographies/address"
+
+
+class GeocoderProvider:
+    """
+    Base class of the geocoding backends used by get_coordinate_api and get_geo_dataset.
+
+    A backend sets name (the key of its results in a GeocodeCache) and implements geocode(addr),
+    which takes the [street, city, state, country] list of a POI and returns a
+    {"latitude", "longitude", "formattedAddress"} record, or None when nothing matched.
+    New backends can be passed directly to get_geo_dataset(provider = ...) or made available
+    as a maptype through register_provider.
+    """
+
+    name = None
+
+    def geocode(self, addr):
+        raise NotImplementedError
+
+
+class RadarProvider(GeocoderProvider):
+    """
+    Radar forward geocoding (maptype = "world").
+
+    Parameters
+    ---
+    api_key: the private api key GEO_RADAR_API_KEY provided by Radar. https://radar.com/documentation/api
+    api_url: the forward geocoding endpoint, default None (RADAR_URL); e.g. a local stand-in for tests and benchmarks.
+
+    """
+
+    name = "world"
+
+    def __init__(self, api_key, api_url=None):
+        self.api_key = api_key
+        self.api_url = api_url if api_url is not None else RADAR_URL
+
+    def geocode(self, addr):
+        api_url = f"{self.api_url}?query={addr}"
+        try:
+            r = get_client(self.name).get(
+                api_url, headers={"Authorization": self.api_key}
+            )
+            # If the response was successful, no Exception will be raised
+            r.raise_for_status()
+        except requests.exceptions.RequestException as http_err:
+            logger.warning("Error occurred: %s", http_err)
+            incr("geocode.errors", provider=self.name)
+            return None
+        logger.debug("Successful! Status Code: %s", r.status_code)
+        addresses = r.json()["addresses"]
+        if len(addresses) == 0:
+            warnings.warn(
+                "Sorry! This address cannot be searched through the api and returned an empty result"
+            )
+            return None
+        return {
+            "latitude": addresses[0]["latitude"],
+            "longitude": addresses[0]["longitude"],
+            "formattedAddress": addresses[0]["formattedAddress"],
+        }
+
+
+class CensusProvider(GeocoderProvider):
+    """
+    U.S. Census Bureau single address geocoding (maptype = "US").
+
+    Parameters
+    ---
+    api_key: the private api key GEO_CENSUS_API_KEY provided by the U.S. Census Bureau. https://www.census.gov/data/developers/data-sets/popest-popproj/popest.html
+    api_url: the single address endpoint, default None (CENSUS_URL); e.g. a local stand-in for tests and benchmarks.
+
+    """
+
+    name = "US"
+
+    def __init__(self, api_key, api_url=None):
+        self.api_key = api_key
+        self.api_url = api_url if api_url is not None else CENSUS_URL
+
+    def geocode(self, addr):
+        street, city, state, _ = addr
+
+        benchmark = "Public_AR_Census2020"
+        vintage = "Census2020_Census2020"
+        layers = "10"
+        api_url = f"{self.api_url}?street={street}&city={city}&state={state}&benchmark={benchmark}&vintage={vintage}&layers={layers}&format=json&key={self.api_key}"
+        try:
+            r = get_client(self.name).get(api_url)
+            # If the response was successful, no Exception will be raised
+            r.raise_for_status()
+        except requests.exceptions.RequestException as http_err:
+            logger.warning("Error occurred: %s", http_err)
+            incr("geocode.errors", provider=self.name)
+            return None
+        logger.debug("Successful! Status Code: %s", r.status_code)
+        matches = r.json()["result"]["addressMatches"]
+        if len(matches) == 0:
+            warnings.warn(
+                "Sorry! This address cannot be searched through census_geocoding api and returned an empty result"
+            )
+            return None
+        return {
+            "latitude": matches[0]["coordinates"]["y"],
+            "longitude": matches[0]["coordinates"]["x"],
+            "formattedAddress": matches[0]["matchedAddress"],
+        }
+
+
+class GazetteerProvider(GeocoderProvider):
+    """
+    Offline geocoding from a local reference table, through an in-memory index built once.
+    A lookup is a dictionary access: no network and no API cost.
+
+    Parameters
+    ---
+    reference: pd.DataFrame
+        The reference table with street, city, state, latitude and longitude columns, and optionally formattedAddress
+        (for example a previous output of get_geo_dataset). Addresses are matched after normalization
+        (case and whitespace); the first row wins when an address appears several times.
+    name: str, default "gazetteer"
+        Key of the results in a GeocodeCache.
+
+    Example
+    ---
+    gazetteer = GazetteerProvider(pd.read_csv("known_pois.csv"))
+    get_geo_dataset(None, travel, provider = gazetteer)
+
+    """
+
+    def __init__(self, reference, name="gazetteer"):
+        self.name = name
+        reference = reference.dropna(subset=["latitude", "longitude"])
+        keys = zip(
+            *[
+                reference[col].astype(str).str.lower().str.split().str.join(" ")
+                for col in ["street", "city", "state"]
+            ]
+        )
+        if "formattedAddress" in reference.columns:
+            formatted = reference["formattedAddress"].tolist()
+        else:
+            formatted = (
+                reference["street"].astype(str)
+                + ", "
+                + reference["city"].astype(str)
+                + ", "
+                + reference["state"].astype(str)
+            ).tolist()
+        index = {}
+        for key, lat, lon, address in zip(
+            keys,
+            reference["latitude"].astype(float).tolist(),
+            reference["longitude"].astype(float).tolist(),
+            formatted,
+        ):
+            index.setdefault(
+                key, {"latitude": lat, "longitude": lon, "formattedAddress": address}
+            )
+        self.index = index
+
+    def geocode(self, addr):
+        return self.index.get(_normalize_address(addr[:3]))
+
+    def __len__(self):
+        return len(self.index)
+
+
+class ChainProvider(GeocoderProvider):
+    """
+    Try several providers in order and return the first match, e.g. a GazetteerProvider
+    in front of a paid geo-API so that only the unknown addresses are requested.
+
+    Example
+    ---
+    chain = ChainProvider([GazetteerProvider(known_pois), RadarProvider(GEO_RADAR_API_KEY)])
+    get_geo_dataset(None, travel, provider = chain)
+
+    """
+
+    def __init__(self, providers):
+        self.providers = list(providers)
+        self.name = "+".join(str(provider.name) for provider in self.providers)
+
+    def geocode(self, addr):
+        for provider in self.providers:
+            record = provider.geocode(addr)
+            if record is not None:
+                return record
+        return None
+
+
+_registry = {"world": RadarProvider, "US": CensusProvider}
+
+
+def register_provider(maptype, factory):
+    """
+    Make a provider available as a maptype of get_coordinate_api and get_geo_dataset.
+    factory is called with the api_key and returns a GeocoderProvider (a GeocoderProvider subclass works).
+
+    Example
+    ---
+    register_provider("local", lambda api_key: GazetteerProvider(known_pois))
+    get_geo_dataset(None, travel, maptype = "local")
+
+    """
+    _registry[maptype] = factory
+
+
+def get_provider(maptype, api_key=None):
+    """
+    Return the provider registered for a maptype ("world", "US", or any registered with register_provider).
+    """
+    if maptype not in _registry:
+        raise ValueError(
+            f"Unknown maptype {maptype!r}; choose one of {sorted(_registry)} or register a provider"
+        )
+    return _registry[maptype](api_key)
@@ -0,0 +1,203 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from . import poivizdynamic as pv
+from .export import save_figure
+
+logger = logging.getLogger(__name__)
+
+MAP_KINDS = {
+    "footprint": pv.get_footprint_map,
+    "bubble": pv.get_animated_bubble_map,
+}
+
+
+def _map_call(job, TOKEN_MAPBOX, output_dir, sink, compact):
+    """
+    Return the map function of a render job and its keyword arguments (the job defaults filled in).
+    """
+    kwargs = dict(job)
+    kind = kwargs.pop("kind", "bubble")
+    if kind not in MAP_KINDS:
+        raise ValueError(
+            f"Unknown map kind {kind!r}; choose one of {sorted(MAP_KINDS)}"
+        )
+    if kind == "footprint":
+        kwargs.setdefault("TOKEN_MAPBOX", TOKEN_MAPBOX)
+        if "df" in kwargs:
+            kwargs["df_in"] = kwargs.pop("df")
+    kwargs.setdefault("output_dir", output_dir)
+    kwargs.setdefault("sink", sink)
+    kwargs.setdefault("compact", compact)
+    kwargs["show"] = False
+    return MAP_KINDS[kind], kwargs
+
+
+def render_maps(
+    jobs,
+    TOKEN_MAPBOX=None,
+    output_dir="demo_output",
+    sink="html",
+    compact=False,
+    return_figures=True,
+):
+    """
+    This function builds and saves many animated maps in one call, without displaying any of them (no browser or renderer
+    is started), for scripts and headless batch jobs.
+
+    Parameters
+    ---
+    jobs: list of dict
+        One dict per map: "kind" ("footprint" for get_footprint_map, "bubble" for get_animated_bubble_map; default "bubble"),
+        "df" the dataframe to map, and any other parameter of that function, e.g. "fig_name", "zoom", "engine".
+        A parameter given in a job overrides the defaults below.
+    TOKEN_MAPBOX: str, default None
+        The Mapbox access token of the footprint maps.
+    output_dir: str, default "demo_output"
+        Directory of the saved files.
+    sink: {"html", "json", None}, default "html"
+        Format of the saved files: standalone html pages, plotly figure JSON files, or None to save nothing.
+    compact: bool, default False
+        Save the figures with base64 typed arrays (see poivizdynamic.export.compact_figure).
+    return_figures: bool, default True
+        False drops every figure once it is saved, so that the memory of a long batch does not grow with the number of maps.
+
+    Returns
+    ---
+    Output a list with the figure of every job, in the order of the jobs (None for each when return_figures = False).
+
+    Example
+    ---
+    render_maps([{"kind": "footprint", "df": travel, "fig_name": "travel"},
+                 {"df": starb2, "zoom": 10, "engine": "fast", "fig_name": "starbuck"}],
+                TOKEN_MAPBOX, output_dir = "maps")
+
+    """
+    figures = []
+    for job in jobs:
+        func, kwargs = _map_call(job, TOKEN_MAPBOX, output_dir, sink, compact)
+        fig = func(**kwargs)
+        figures.append(fig if return_figures else None)
+    return figures
+
+
+def _render_job(func, kwargs, output_dir, sink, compact):
+    """
+    Build and save one map in a worker process, and return its timings.
+    """
+    start = time.perf_counter()
+    fig = func(**kwargs)
+    built = time.perf_counter()
+    path = save_figure(fig, output_dir, kwargs["fig_name"], sink=sink, compact=compact)
+    return {
+        "path": path,
+        "build_seconds": built - start,
+        "write_seconds": time.perf_counter() - built,
+    }
+
+
+def _group_name(fig_name, group):
+    if not isinstance(group, tuple):
+        group = (group,)
+    name = fig_name.format(group="_".join(str(g) for g in group))
+    # a group value is not allowed to open a sub-directory
+    return name.replace(os.sep, "_")
+
+
+def render_groups(
+    df,
+    by,
+    kind="bubble",
+    TOKEN_MAPBOX=None,
+    output_dir="demo_output",
+    sink="html",
+    compact=False,
+    fig_name="{group}",
+    max_workers=None,
+    **kwargs,
+):
+    """
+    This function renders one animated map per group of a dataframe (e.g. per state, or per city and day) across a pool of
+    processes, each map in its own file, so that the rendering throughput grows with the number of CPU cores.
+
+    Parameters
+    ---
+    df: pd.DataFrame
+        The dataframe contains the information would be animated and mapped (the input of the map function).
+    by: str or list of str
+        The column(s) to group by, e.g. "state" or ["city", "day"].
+    kind: {"bubble", "footprint"}, default "bubble"
+        get_animated_bubble_map or get_footprint_map.
+    TOKEN_MAPBOX: str, default None
+        The Mapbox access token of the footprint maps.
+    output_dir: str, default "demo_output"
+        Directory of the saved files.
+    sink: {"html", "json"}, default "html"
+        Format of the saved files.
+    compact: bool, default False
+        Save the figures with base64 typed arrays (see poivizdynamic.export.compact_figure).
+    fig_name: str, default "{group}"
+        Name of the files; "{group}" is replaced by the group value (values joined by "_" for several columns),
+        e.g. "poi_{group}".
+    max_workers: int, default None
+        Number of worker processes. None uses the number of CPU cores; 1 renders in the current process, without a pool
+        (also the case of None on a single core machine).
+    **kwargs:
+        Other parameters of the map function, e.g. zoom, engine, max_frames.
+
+    Returns
+    ---
+    Output a pandans.DataFrame with one row per map: the group, its number of rows, the path of the file,
+    and the build, write and total seconds of the job.
+
+    Example
+    ---
+    render_groups(starb2, "state", zoom = 10, engine = "fast", fig_name = "starbuck_{group}", output_dir = "maps")
+
+    """
+    if sink is None:
+        raise ValueError(
+            "render_groups saves every map: choose sink = 'html' or 'json'"
+        )
+
+    groups, rows, calls = [], [], []
+    for group, sub in df.groupby(by, sort=True, observed=True):
+        job = dict(kwargs, kind=kind, df=sub, fig_name=_group_name(fig_name, group))
+        # the figures are saved by the workers, with their own timing
+        func, call = _map_call(job, TOKEN_MAPBOX, output_dir, None, False)
+        groups.append(group)
+        rows.append(len(sub))
+        calls.append((func, call))
+
+    start = time.perf_counter()
+    args = (
+        [func for func, _ in calls],
+        [call for _, call in calls],
+        [output_dir] * len(calls),
+        [sink] * len(calls),
+        [compact] * len(calls),
+    )
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1:
+        timings = list(map(_render_job, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            timings = list(executor.map(_render_job, *args))
+    total = time.perf_counter() - start
+
+    summary = pd.DataFrame(timings, columns=["path", "build_seconds", "write_seconds"])
+    summary.insert(0, "group", groups)
+    summary.insert(1, "rows", rows)
+    summary["seconds"] = summary["build_seconds"] + summary["write_seconds"]
+    logger.info(
+        "Rendered %d maps in %0.2f seconds (%0.1f maps/s with %d workers)",
+        len(summary),
+        total,
+        len(summary) / total if total > 0 else 0,
+        workers,
+    )
+    return summary
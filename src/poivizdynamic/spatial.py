@@ -0,0 +1,349 @@
+import numpy as np
+import pandas as pd
+
+from .frames import _drop_missing_coordinates
+from .metrics import timer
+from .trajectory import EARTH_RADIUS
+
+# meters per degree of latitude
+METERS_PER_DEGREE = EARTH_RADIUS * np.pi / 180
+# candidate pairs (query x reference point) handled at a time, to bound the memory of a batch
+PAIRS_PER_BATCH = 10_000_000
+# (query x cell) lookups handled at a time
+CELLS_PER_BATCH = 4_000_000
+BACKENDS = ("auto", "kdtree", "grid")
+
+
+def _kdtree():
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        raise ImportError(
+            "The kdtree backend requires scipy: pip install scipy, or use backend = 'grid'"
+        )
+    return cKDTree
+
+
+def _chord(meters):
+    # length of the chord through the unit sphere between two points meters apart: it grows with the great-circle distance
+    return 2 * np.sin(np.minimum(np.asarray(meters) / EARTH_RADIUS, np.pi) / 2)
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+
+
+class PointIndex:
+    """
+    An in-memory nearest neighbour index over the points of an already geocoded POI table, built once
+    and queried for batches of coordinates without any API call.
+
+    Two backends give the same (great-circle) nearest point:
+    "kdtree", a scipy cKDTree over the points on the unit sphere (scipy is optional), and "grid",
+    a NumPy grid of latitude/ longitude cells searched ring by ring for whole batches at once.
+
+    Parameters
+    ---
+    reference: pd.DataFrame
+        The POI table with latitude and longitude columns, e.g. the output of get_geo_dataset.
+        Rows without coordinates are left out, and the first row wins when several share the same coordinates.
+    columns: list of str, default ["spot_name", "formattedAddress"]
+        The columns of the reference returned for the nearest point (those missing from the reference are skipped).
+    backend: {"auto", "kdtree", "grid"}, default "auto"
+        "auto" uses the kdtree when scipy is installed, the grid otherwise.
+    cell_degrees: float, default None
+        Size of the grid cells in degrees; None sizes them for about one reference point per cell
+        (clustered POIs may be faster with smaller cells).
+
+    Example
+    ---
+    index = PointIndex(get_geo_dataset(api_key_us, starb, maptype = "US"))
+    distance, position = index.query(gps["latitude"], gps["longitude"], max_distance = 200)
+
+    """
+
+    def __init__(
+        self,
+        reference,
+        columns=("spot_name", "formattedAddress"),
+        backend="auto",
+        cell_degrees=None,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown backend {backend!r}; choose one of {list(BACKENDS)}"
+            )
+        if backend == "auto":
+            try:
+                _kdtree()
+                backend = "kdtree"
+            except ImportError:
+                backend = "grid"
+        self.backend = backend
+
+        reference = _drop_missing_coordinates(reference).drop_duplicates(
+            subset=["latitude", "longitude"]
+        )
+        self.values = reference[
+            [col for col in columns if col in reference.columns]
+        ].reset_index(drop=True)
+        self.lat = reference["latitude"].to_numpy(dtype=float)
+        self.lon = reference["longitude"].to_numpy(dtype=float)
+
+        self.xyz = _unit_vectors(self.lat, self.lon)
+        if backend == "kdtree":
+            self.tree = _kdtree()(self.xyz)
+        else:
+            self._build_grid(cell_degrees)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _build_grid(self, cell_degrees):
+        n = len(self.lat)
+        if cell_degrees is None:
+            span = (
+                max(np.ptp(self.lat), 1e-3) * max(np.ptp(self.lon), 1e-3) if n else 1.0
+            )
+            # about one point per cell if they were spread evenly: fewest candidate pairs
+            self._set_cell_size(np.clip(np.sqrt(span / max(n, 1)), 1e-5, 10))
+            # POIs are clustered (cities): smaller cells until a point shares its cell with about 2 others on average
+            for _ in range(5):
+                _, counts = np.unique(
+                    self._cells(self.lat, self.lon), return_counts=True
+                )
+                crowd = (counts.astype(float) ** 2).sum() / n
+                if crowd <= 3 or self.cell_degrees <= 1e-5:
+                    break
+                self._set_cell_size(max(self.cell_degrees / np.sqrt(crowd / 2), 1e-5))
+        else:
+            self._set_cell_size(cell_degrees)
+
+        # the points sorted by cell: the points of a cell are order[start:start + count]
+        cells = self._cells(self.lat, self.lon)
+        self.order = np.argsort(cells, kind="stable")
+        self.keys, self.starts, self.counts = np.unique(
+            cells[self.order], return_index=True, return_counts=True
+        )
+
+    def _set_cell_size(self, cell_degrees):
+        self.cell_degrees = float(cell_degrees)
+        self.n_lat = int(np.ceil(180 / self.cell_degrees))
+        self.n_lon = int(np.ceil(360 / self.cell_degrees))
+
+    def _cell_xy(self, lat, lon):
+        cy = np.clip(
+            ((lat + 90) / self.cell_degrees).astype(np.int64), 0, self.n_lat - 1
+        )
+        cx = ((lon + 180) / self.cell_degrees).astype(np.int64) % self.n_lon
+        return cy, cx
+
+    def _cells(self, lat, lon):
+        cy, cx = self._cell_xy(lat, lon)
+        return cy * self.n_lon + cx
+
+    def _ring_cells(self, cy, cx, ring):
+        """
+        The position in self.keys and the number of points of the (2 ring + 1)^2 cells around the cell of every query,
+        as (queries, cells) arrays; empty cells count 0 points.
+        """
+        offsets = np.arange(-ring, ring + 1)
+        dy, dx = (d.ravel() for d in np.meshgrid(offsets, offsets, indexing="ij"))
+        ny = cy[:, None] + dy
+        nx = (cx[:, None] + dx) % self.n_lon
+        keys = ny * self.n_lon + nx
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = (ny >= 0) & (ny < self.n_lat) & (self.keys[pos] == keys)
+        return pos, np.where(found, self.counts[pos], 0)
+
+    def _pairs(self, pos, counts):
+        """
+        Expand the cells of _ring_cells into (query, reference point) pairs, grouped by query, without a loop.
+        """
+        n_cells = pos.shape[1]
+        pos, counts = pos.ravel(), counts.ravel()
+        query = np.repeat(np.arange(len(counts)) // n_cells, counts)
+        first = np.repeat(self.starts[pos] - (np.cumsum(counts) - counts), counts)
+        return query, self.order[first + np.arange(len(query))]
+
+    def _update_nearest(self, sub, pos, counts, xyz, chord, position):
+        """
+        Update the chord and position of the queries sub with the points of their cells, where nearer.
+        """
+        query, ref = self._pairs(pos, counts)
+        if len(query) == 0:
+            return
+        d = ((xyz[sub][query] - self.xyz[ref]) ** 2).sum(axis=1)
+        # the pairs come grouped by query: the nearest of each group, without sorting
+        starts = np.flatnonzero(np.diff(query, prepend=-1))
+        nearest = np.minimum.reduceat(d, starts)
+        hits = np.flatnonzero(
+            d == np.repeat(nearest, np.diff(np.append(starts, len(d))))
+        )
+        best = hits[np.flatnonzero(np.diff(query[hits], prepend=-1))]
+        rows = sub[query[best]]
+        better = d[best] < chord[rows] ** 2
+        chord[rows[better]] = np.sqrt(d[best[better]])
+        position[rows[better]] = ref[best[better]]
+
+    def _query_grid(self, lat, lon, max_distance):
+        """
+        The chord (on the unit sphere) to the nearest point of every query, and its position.
+        The queries are searched in growing blocks of cells, until the nearest point found is closer than any point
+        outside the block could be.
+        """
+        m = len(lat)
+        chord = np.full(m, np.inf)
+        position = np.full(m, -1, dtype=np.int64)
+        if m == 0 or len(self) == 0:
+            return chord, position
+        cy, cx = self._cell_xy(lat, lon)
+        xyz = _unit_vectors(lat, lon)
+
+        todo = np.arange(m)
+        ring = 1
+        # past as many cells as points (e.g. a query far from dense POIs), the plain search below is cheaper
+        while (
+            len(todo) > 0
+            and ring < max(self.n_lat, self.n_lon)
+            and (2 * ring + 1) ** 2 <= max(len(self), 9)
+        ):
+            # the points out of the block are at least ring cells away (narrower towards the poles)
+            lat_edge = np.minimum(
+                np.abs(lat[todo]) + (ring + 1) * self.cell_degrees, 90
+            )
+            reach = _chord(
+                ring
+                * self.cell_degrees
+                * METERS_PER_DEGREE
+                * np.cos(np.radians(lat_edge))
+            )
+            batch = max(1, CELLS_PER_BATCH // (2 * ring + 1) ** 2)
+            for start in range(0, len(todo), batch):
+                block = todo[start : start + batch]
+                pos, counts = self._ring_cells(cy[block], cx[block], ring)
+                # pieces of at most PAIRS_PER_BATCH pairs (or a single query), to bound the memory
+                pairs = np.cumsum(counts.sum(axis=1))
+                cuts = np.searchsorted(
+                    pairs, np.arange(PAIRS_PER_BATCH, pairs[-1], PAIRS_PER_BATCH)
+                )
+                for piece in np.split(np.arange(len(block)), np.unique(cuts)):
+                    self._update_nearest(
+                        block[piece], pos[piece], counts[piece], xyz, chord, position
+                    )
+            done = chord[todo] <= reach
+            if max_distance is not None:
+                # nothing unseen can be within max_distance
+                done |= reach >= _chord(max_distance)
+            todo = todo[~done]
+            ring *= 2
+
+        # past the whole grid (e.g. near the poles) or the largest ring: a plain search over every point
+        batch = max(1, PAIRS_PER_BATCH // len(self))
+        for start in range(0, len(todo), batch):
+            sub = todo[start : start + batch]
+            d = ((xyz[sub][:, None, :] - self.xyz[None, :, :]) ** 2).sum(axis=2)
+            position[sub] = d.argmin(axis=1)
+            chord[sub] = np.sqrt(d[np.arange(len(sub)), position[sub]])
+        return chord, position
+
+    def query(self, lat, lon, max_distance=None):
+        """
+        Return the great-circle distance in meters to the nearest reference point of every (lat, lon),
+        and the position of that point in self.values; inf and -1 when there is none within max_distance meters
+        or when the coordinates are missing.
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        distance = np.full(len(lat), np.inf)
+        position = np.full(len(lat), -1, dtype=np.int64)
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        if len(self) == 0 or not valid.any():
+            return distance, position
+
+        if self.backend == "kdtree":
+            bound = (
+                np.inf if max_distance is None else _chord(max_distance) * (1 + 1e-9)
+            )
+            c, p = self.tree.query(
+                _unit_vectors(lat[valid], lon[valid]), distance_upper_bound=bound
+            )
+            p = np.where(np.isfinite(c), p, -1)
+        else:
+            c, p = self._query_grid(lat[valid], lon[valid], max_distance)
+        d = np.full(len(c), np.inf)
+        hit = np.isfinite(c)
+        d[hit] = 2 * EARTH_RADIUS * np.arcsin(np.minimum(c[hit] / 2, 1))
+
+        if max_distance is not None:
+            p = np.where(d <= max_distance, p, -1)
+            d = np.where(d <= max_distance, d, np.inf)
+        distance[valid] = d
+        position[valid] = p
+        return distance, position
+
+
+def reverse_geocode(
+    df,
+    reference,
+    columns=("spot_name", "formattedAddress"),
+    max_distance=None,
+    backend="auto",
+):
+    """
+    This function attaches to every point of a dataset the nearest known POI of an already geocoded table (reverse geocoding/
+    spatial join), locally through an in-memory PointIndex: no API is called.
+
+    Parameters
+    ---
+    df: pd.DataFrame
+        The incoming points, with latitude and longitude columns (e.g. raw GPS coordinates).
+    reference: pd.DataFrame or PointIndex
+        The known POIs, e.g. the output of get_geo_dataset, or a PointIndex built on them once and reused for many batches.
+    columns: list of str, default ["spot_name", "formattedAddress"]
+        The columns of the nearest POI attached to the points (when reference is a DataFrame).
+    max_distance: float, default None
+        Points farther than max_distance meters from every POI get no match (missing values). None always matches.
+    backend: {"auto", "kdtree", "grid"}, default "auto"
+        The index of a reference DataFrame (see PointIndex).
+
+    Returns
+    ---
+    Output a pandans.DataFrame: df with the columns of the nearest POI (a name already in df gets the suffix "_nearest")
+    and distance_m, the great-circle distance in meters to it. The input dataframe is left untouched.
+    df.attrs["reverse_geocoding"] holds the number of points and of matched points, and the backend.
+
+    Example
+    ---
+    reverse_geocode(gps_log, get_geo_dataset(api_key_us, starb, maptype = "US"), max_distance = 100)
+
+    """
+    if not isinstance(reference, PointIndex):
+        reference = PointIndex(reference, columns=columns, backend=backend)
+
+    with timer("reverse_geocode", backend=reference.backend):
+        distance, position = reference.query(
+            df["latitude"].to_numpy(dtype=float),
+            df["longitude"].to_numpy(dtype=float),
+            max_distance=max_distance,
+        )
+    matched = position >= 0
+
+    out = df.copy(deep=False)
+    for col in reference.values.columns:
+        values = reference.values[col].to_numpy()
+        # the values of the matched points, missing elsewhere
+        column = pd.Series(values[np.maximum(position, 0)], index=df.index).where(
+            matched
+        )
+        out[col + "_nearest" if col in df.columns else col] = column
+    out["distance_m"] = np.where(matched, distance, np.nan)
+    out.attrs["reverse_geocoding"] = {
+        "points": len(df),
+        "matched": int(matched.sum()),
+        "backend": reference.backend,
+    }
+    return out
@@ -0,0 +1,117 @@
+import json
+
+# the columns read by get_footprint_map and get_animated_bubble_map
+MAP_COLUMNS = ["spot_name", "symbol", "interest_value", "date", "latitude", "longitude"]
+
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+# key of the dataframe attrs (e.g. the geocoding and validation reports) in the file schema
+_ATTRS_KEY = b"poivizdynamic.attrs"
+
+
+def _format(path, format):
+    if format is not None:
+        if format not in FORMATS.values():
+            raise ValueError(f"Unknown format {format!r}; choose 'parquet' or 'arrow'")
+        return format
+    for ext, fmt in FORMATS.items():
+        if str(path).rstrip("/").endswith(ext):
+            return fmt
+    raise ValueError(
+        f"Cannot tell the format of {path}: use a {sorted(FORMATS)} extension or pass format"
+    )
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError(
+            "Reading and writing Parquet/ Arrow files requires pyarrow: pip install pyarrow"
+        )
+    return pyarrow
+
+
+def write_dataset(df, path, format=None, compression=None):
+    """
+    This function saves a POI dataset (e.g. the output of get_geo_dataset or clean_dataset) as a Parquet or Arrow file,
+    with its schema: the column types (dates, float32 coordinates, categoricals...) and df.attrs are read back as they were.
+    The index is not saved.
+
+    Parameters
+    ---
+    df : pandans.DataFrame
+        The dataset to save.
+    path : str
+        The file, ".parquet" for Parquet, ".arrow" or ".feather" for Arrow (Feather V2).
+    format : {"parquet", "arrow"}, default None
+        Overrides the format told by the extension.
+    compression : str, default None
+        None uses "snappy" for Parquet, and no compression for Arrow so that the file can be memory-mapped by read_dataset.
+
+    Returns
+    ---
+    Output the path of the file.
+
+    Example
+    ---
+    write_dataset(clean_dataset(get_geo_dataset(api_key_us, starb, maptype = "US")), "starbuck.arrow")
+
+    """
+    pa = _pyarrow()
+    format = _format(path, format)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_ATTRS_KEY] = json.dumps(df.attrs, default=str).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    if format == "parquet":
+        pa.parquet.write_table(table, path, compression=compression or "snappy")
+    else:
+        pa.feather.write_feather(table, path, compression=compression or "uncompressed")
+    return path
+
+
+def read_dataset(path, columns=None, memory_map=True, format=None):
+    """
+    This function loads a POI dataset saved by write_dataset (or a Parquet directory of stream_geo_dataset),
+    with its column types and df.attrs, reading only the columns asked for.
+
+    Parameters
+    ---
+    path : str
+        The Parquet file or directory, or the Arrow file.
+    columns : list of str, default None
+        The columns to read; None reads them all. MAP_COLUMNS are those used by the map functions.
+    memory_map : bool, default True
+        Map the file in memory instead of reading it into a buffer first: an uncompressed Arrow file is then
+        decoded straight from the page cache.
+    format : {"parquet", "arrow"}, default None
+        Overrides the format told by the extension.
+
+    Returns
+    ---
+    Output a pandans.DataFrame.
+
+    Example
+    ---
+    get_animated_bubble_map(read_dataset("starbuck.arrow", columns = MAP_COLUMNS), engine = "fast")
+
+    """
+    pa = _pyarrow()
+    format = _format(path, format)
+
+    if format == "parquet":
+        table = pa.parquet.read_table(path, columns=columns, memory_map=memory_map)
+    else:
+        table = pa.feather.read_table(path, columns=columns, memory_map=memory_map)
+
+    metadata = table.schema.metadata or {}
+    # one block per column: no copy to consolidate the columns of the same type
+    df = table.to_pandas(split_blocks=True)
+    if _ATTRS_KEY in metadata:
+        df.attrs.update(json.loads(metadata[_ATTRS_KEY]))
+    return df
@@ -0,0 +1,252 @@
+import base64
+import json
+import logging
+import os
+
+import pandas as pd
+
+from . import poivizdynamic as pv
+
+logger = logging.getLogger(__name__)
+
+# the Arrow types of the columns added by get_geo_dataset, in every Parquet part
+_GEO_TYPES = {
+    "latitude": "float64",
+    "longitude": "float64",
+    "formattedAddress": "string",
+}
+
+
+def _read_chunks(input_path, chunksize):
+    """
+    Yield the input file (CSV or Parquet) as DataFrames of at most chunksize rows.
+    """
+    if input_path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "Reading Parquet files requires pyarrow: pip install pyarrow"
+            )
+        for batch in pq.ParquetFile(input_path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(input_path, chunksize=chunksize)
+
+
+def _job_schema(table):
+    """
+    The Arrow schema of the Parquet parts of a job, from its first chunk: the geocoded columns get fixed types,
+    and the columns without any value stay open (null type) until a chunk has values for them.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for field, column in zip(table.schema, table.columns):
+        if field.name in _GEO_TYPES:
+            field = pa.field(field.name, pa.type_for_alias(_GEO_TYPES[field.name]))
+        elif column.null_count == len(column):
+            field = pa.field(field.name, pa.null())
+        fields.append(field)
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+
+def _write_part(out, part_path, schema):
+    """
+    Write a chunk as a Parquet part cast to the schema of the job (None: the schema of this first chunk),
+    so that the parts read together whatever each chunk holds (e.g. a column empty in one chunk would be saved as double).
+    Return the schema, widened where this chunk needs it: the open columns it has values for get their type,
+    and the integer columns where it has floats become float64.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(out, preserve_index=False)
+    if schema is None:
+        schema = _job_schema(table)
+    columns = []
+    for i, field in enumerate(schema):
+        column = table.column(field.name)
+        if column.null_count < len(column):
+            if pa.types.is_null(field.type):
+                schema = schema.set(i, pa.field(field.name, column.type))
+            elif pa.types.is_integer(field.type) and pa.types.is_floating(column.type):
+                schema = schema.set(i, pa.field(field.name, pa.float64()))
+        field = schema.field(i)
+        columns.append(
+            pa.nulls(len(table))
+            if pa.types.is_null(field.type)
+            else column.cast(field.type)
+        )
+    pq.write_table(pa.Table.from_arrays(columns, schema=schema), part_path)
+    return schema
+
+
+def _recast_parts(output_path, n_parts, schema):
+    # the parts written before a column got its type: null there, cast at no risk
+    import pyarrow.parquet as pq
+
+    for i in range(n_parts):
+        part_path = os.path.join(output_path, f"part-{i:05d}.parquet")
+        pq.write_table(pq.read_table(part_path).cast(schema), part_path + ".tmp")
+        os.replace(part_path + ".tmp", part_path)
+
+
+def _encode_schema(schema):
+    return base64.b64encode(schema.serialize().to_pybytes()).decode()
+
+
+def _decode_schema(text):
+    import pyarrow as pa
+
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(text)))
+
+
+def _load_checkpoint(checkpoint_path, input_path, output_path, chunksize):
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    if checkpoint["input"] != os.path.abspath(input_path) or checkpoint[
+        "output"
+    ] != os.path.abspath(output_path):
+        raise ValueError(
+            f"The checkpoint {checkpoint_path} belongs to another job ({checkpoint['input']} -> {checkpoint['output']})"
+        )
+    # the finished chunks are counted, not the rows: another chunksize would skip or repeat rows
+    if checkpoint.get("chunksize") != chunksize:
+        raise ValueError(
+            f"The checkpoint {checkpoint_path} was written with chunksize = {checkpoint.get('chunksize')}: "
+            "resume with the same chunksize, or remove the checkpoint to start over"
+        )
+    return checkpoint
+
+
+def _save_checkpoint(checkpoint_path, checkpoint):
+    # write then rename, so a crash never leaves a half-written checkpoint
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def stream_geo_dataset(
+    api_key,
+    input_path,
+    output_path,
+    maptype="world",
+    chunksize=100000,
+    checkpoint_path=None,
+    **kwargs,
+):
+    """
+    This function geocodes a CSV or Parquet file of POIs chunk by chunk and writes the enriched chunks incrementally,
+    so files larger than memory are processed in constant memory. An interrupted job resumes from its last finished chunk.
+
+    Parameters
+    ---
+    api_key: a private api key (pass the api key to get_geo_dataset(); same help doc of that one).
+
+    input_path : str
+        The input file with a list of POI's address information, ".parquet" for Parquet (requires pyarrow), CSV otherwise.
+
+    output_path : str
+        Where to write the geocoded dataset.
+        ".parquet": a directory of Parquet part files, one per chunk (requires pyarrow), all with the column types of the job;
+        it reads back with pd.read_parquet(output_path).
+        Anything else: a single CSV file.
+
+    maptype : {"world", "US"}, default "world", optional
+        Geo-API to use (same as get_geo_dataset).
+
+    chunksize : int, default 100000, optional
+        Number of input rows geocoded and written at a time.
+
+    checkpoint_path : str, default None, optional
+        JSON file recording the progress of the job. None uses output_path + ".checkpoint.json".
+        When it exists, the job skips the chunks already written (it must be resumed with the same chunksize);
+        it is removed once the job finishes.
+
+    **kwargs :
+        Passed to get_geo_dataset, e.g. max_workers, cache, bulk.
+        A GeocodeCache is recommended so that addresses repeated across chunks are requested only once.
+
+    Returns
+    ---
+    Output a dict with the number of chunks and rows written by the job.
+
+    Example
+    ---
+    cache = GeocodeCache("geocode_cache.sqlite")
+    stream_geo_dataset(GEO_CENSUS_API_KEY, "pois.csv", "pois_geo.parquet", maptype = "US", bulk = True, cache = cache)
+
+    """
+    if checkpoint_path is None:
+        checkpoint_path = output_path + ".checkpoint.json"
+    to_parquet = output_path.endswith(".parquet")
+
+    checkpoint = _load_checkpoint(checkpoint_path, input_path, output_path, chunksize)
+    if checkpoint is None:
+        checkpoint = {
+            "input": os.path.abspath(input_path),
+            "output": os.path.abspath(output_path),
+            "chunksize": chunksize,
+            "chunks_done": 0,
+            "rows_done": 0,
+            "output_bytes": 0,
+            "schema": None,
+        }
+        # a fresh job overwrites the output of a previous one
+        if to_parquet:
+            if os.path.isdir(output_path):
+                for name in os.listdir(output_path):
+                    if name.startswith("part-"):
+                        os.remove(os.path.join(output_path, name))
+        elif os.path.exists(output_path):
+            os.remove(output_path)
+    else:
+        logger.info(
+            "Resuming from chunk %d (%d rows done)",
+            checkpoint["chunks_done"],
+            checkpoint["rows_done"],
+        )
+        if not to_parquet and os.path.exists(output_path):
+            # drop whatever a crashed run wrote after the last finished chunk
+            with open(output_path, "r+b") as f:
+                f.truncate(checkpoint["output_bytes"])
+
+    if to_parquet and not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    for i, chunk in enumerate(_read_chunks(input_path, chunksize)):
+        if i < checkpoint["chunks_done"]:
+            continue
+
+        out = pv.get_geo_dataset(api_key, chunk, maptype=maptype, **kwargs)
+
+        if to_parquet:
+            part_path = os.path.join(output_path, f"part-{i:05d}.parquet")
+            schema = checkpoint.get("schema")
+            schema = _decode_schema(schema) if schema is not None else None
+            new_schema = _write_part(out, part_path + ".tmp", schema)
+            os.replace(part_path + ".tmp", part_path)
+            if schema is not None and not new_schema.equals(schema):
+                _recast_parts(output_path, i, new_schema)
+            checkpoint["schema"] = _encode_schema(new_schema)
+        else:
+            out.to_csv(output_path, mode="a", header=(i == 0), index=False)
+            checkpoint["output_bytes"] = os.path.getsize(output_path)
+
+        checkpoint["chunks_done"] = i + 1
+        checkpoint["rows_done"] += len(out)
+        _save_checkpoint(checkpoint_path, checkpoint)
+        logger.info(
+            "Chunk %d: geocoded %d rows (%d in total)",
+            i,
+            len(out),
+            checkpoint["rows_done"],
+        )
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return {"chunks": checkpoint["chunks_done"], "rows": checkpoint["rows_done"]}
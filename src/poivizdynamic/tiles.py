@@ -0,0 +1,287 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cluster import MAX_LATITUDE, TILE_SIZE
+from .frames import _drop_missing_coordinates, frame_buckets, frame_format
+from .metrics import incr, timer
+
+# the viewer: Leaflet with OpenStreetMap tiles, and a canvas layer drawing the POI tiles of the viewport, fetched on demand
+VIEWER_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>
+  html, body, #map { height: 100%; margin: 0; }
+  #bar { position: absolute; z-index: 1000; bottom: 20px; left: 50px; right: 50px; padding: 6px 10px;
+         background: rgba(255, 255, 255, 0.9); font: 14px sans-serif; display: flex; gap: 10px; align-items: center; }
+  #frame { flex: 1; }
+</style>
+</head>
+<body>
+<div id="map"></div>
+<div id="bar"><button id="play">Play</button><input id="frame" type="range" min="0" value="0"><span id="label"></span></div>
+<script>
+const COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"];
+fetch("tiles.json").then(r => r.json()).then(meta => {
+  const map = L.map("map", {preferCanvas: true}).fitBounds(meta.bounds);
+  L.tileLayer("https://tile.openstreetmap.org/{z}/{x}/{y}.png", {
+    maxZoom: 19, attribution: "&copy; OpenStreetMap contributors"}).addTo(map);
+  const slider = document.getElementById("frame"), label = document.getElementById("label");
+  slider.max = meta.frames.length - 1;
+  let frame = 0;
+  // one request per tile of a frame, kept across frame changes so that playing the animation again fetches nothing;
+  // a tile missing from the export (no POI) is an empty tile. The oldest tiles are dropped past MAX_TILES.
+  const MAX_TILES = 5000, cache = new Map();
+  function load(url) {
+    if (!cache.has(url)) {
+      cache.set(url, fetch(url).then(r => r.ok ? r.json() : {features: []}).catch(() => ({features: []})));
+      if (cache.size > MAX_TILES) cache.delete(cache.keys().next().value);
+    }
+    return cache.get(url);
+  }
+  const Layer = L.GridLayer.extend({
+    createTile: function (coords, done) {
+      const tile = L.DomUtil.create("canvas");
+      tile.width = tile.height = 256;
+      // deeper than the export: the parent tile of the deepest zoom, drawn at this zoom
+      const z = Math.min(coords.z, meta.max_zoom), shift = coords.z - z, x = coords.x >> shift, y = coords.y >> shift;
+      const max = meta.max_value[z - meta.min_zoom] || 1;
+      load(`${frame}/${z}/${x}/${y}.geojson`).then(data => {
+        const ctx = tile.getContext("2d"), origin = coords.scaleBy(this.getTileSize());
+        ctx.globalAlpha = 0.7;
+        for (const f of data.features) {
+          const [lon, lat] = f.geometry.coordinates;
+          const p = map.project([lat, lon], coords.z).subtract(origin);
+          if (p.x < -meta.radius || p.y < -meta.radius || p.x > 256 + meta.radius || p.y > 256 + meta.radius) continue;
+          ctx.fillStyle = COLORS[f.properties.group % COLORS.length];
+          ctx.beginPath();
+          ctx.arc(p.x, p.y, Math.max(2, meta.radius * Math.sqrt(f.properties.value / max)), 0, 2 * Math.PI);
+          ctx.fill();
+        }
+        done(null, tile);
+      });
+      return tile;
+    }
+  });
+  const layer = new Layer({minZoom: meta.min_zoom}).addTo(map);
+  function show(i) {
+    frame = i;
+    slider.value = i;
+    label.textContent = meta.frames[i];
+    layer.redraw();
+  }
+  slider.oninput = () => show(+slider.value);
+  let playing = null;
+  document.getElementById("play").onclick = e => {
+    if (playing) { clearInterval(playing); playing = null; e.target.textContent = "Play"; return; }
+    e.target.textContent = "Pause";
+    playing = setInterval(() => show((frame + 1) % meta.frames.length), meta.frame_duration);
+  };
+  show(0);
+});
+</script>
+</body>
+</html>
+"""
+
+
+def _mercator(lat, lon):
+    # position of the points on the Web Mercator world, in [0, 1) from the top left corner
+    lat = np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE)
+    x = (lon + 180) / 360
+    y = (1 - np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)) / np.pi) / 2
+    return np.clip(x, 0, np.nextafter(1, 0)), np.clip(y, 0, np.nextafter(1, 0))
+
+
+def _features(lon, lat, count, value, group):
+    # the GeoJSON Point features of the bins, formatted directly (no dict per feature)
+    return [
+        '{"type":"Feature","geometry":{"type":"Point","coordinates":[%.6f,%.6f]},'
+        '"properties":{"count":%d,"value":%.6g,"group":%d}}' % row
+        for row in zip(
+            lon.tolist(), lat.tolist(), count.tolist(), value.tolist(), group.tolist()
+        )
+    ]
+
+
+def export_tiles(
+    df,
+    output_dir,
+    min_zoom=0,
+    max_zoom=10,
+    frame_freq="day",
+    color_group_lab="spot_name",
+    bubble_size="interest_value",
+    cell_pixels=8,
+    radius=12,
+    title_text="My tiled bubble map",
+    frame_duration=500,
+):
+    """
+    This function exports a POI dataset (e.g. the output of get_geo_dataset or clean_dataset) as spatially tiled map data with a viewer,
+    instead of one html file holding every point: per frame and per zoom level, the POIs are binned into cells of cell_pixels
+    screen pixels and written as one small GeoJSON file per 256 x 256 pixel Web Mercator tile. The viewer (index.html) only fetches
+    the tiles of the viewport, so that the memory and the loading time of the browser depend on what is on screen,
+    not on the size of the dataset.
+
+    The viewer fetches files: open it through a web server, e.g. "python -m http.server" in output_dir, then http://localhost:8000.
+
+    Parameters
+    ---
+    df: pd.DataFrame
+        The dataframe of get_animated_bubble_map, with latitude and longitude columns (and date when frame_freq is not None).
+    output_dir: str
+        Directory of the export, created when missing: index.html, tiles.json (frames, zoom levels, bounds, groups),
+        and <frame>/<zoom>/<x>/<y>.geojson. Tiles without POI are not written.
+    min_zoom, max_zoom: int, default 0 and 10
+        The zoom levels exported. Deeper zoom levels show the tiles of max_zoom.
+    frame_freq: {"minute", "hour", "day", "week", "month"}, a pandas period alias, int, or None; default "day"
+        The frames of the animation (see poivizdynamic.frames.frame_buckets); None exports one static frame.
+    color_group_lab: str, default "spot_name"
+        The column coloring the bubbles; its values are binned apart. None for one group.
+    bubble_size: str -> name of column, or int -> constant bubble_size; default "interest_value"
+        The column summed in every bin; a constant sizes the bins by their number of POIs.
+    cell_pixels: int, default 8
+        Size in screen pixels of the bins.
+    radius: int, default 12
+        Radius in pixels of the largest bubble of a zoom level.
+    title_text: str, default "My tiled bubble map"
+        Title of the viewer page.
+    frame_duration: int, default 500
+        Milliseconds per frame when playing the animation.
+
+    Returns
+    ---
+    Output a dict with the number of frames, of tiles and of features written, and the bytes written.
+    Every feature is a bin: a point at the mean position of its POIs, with count (number of POIs), value (summed size)
+    and group (index in the groups of tiles.json) properties.
+
+    Example
+    ---
+    export_tiles(clean_dataset(starb2), "starbuck_tiles", max_zoom = 12, frame_freq = "week")
+
+    """
+    if TILE_SIZE % cell_pixels != 0:
+        raise ValueError(f"cell_pixels must divide the tile size {TILE_SIZE}")
+    df = _drop_missing_coordinates(df)
+    lat = df["latitude"].to_numpy(dtype=float)
+    lon = df["longitude"].to_numpy(dtype=float)
+    x, y = _mercator(lat, lon)
+
+    if frame_freq is None:
+        frame = np.zeros(len(df), dtype=np.int64)
+        labels = ["all"]
+    else:
+        buckets = frame_buckets(df["date"], frame_freq)
+        frame, uniques = pd.factorize(buckets, sort=True)
+        labels = pd.Series(uniques).dt.strftime(frame_format(uniques)).tolist()
+    if color_group_lab is None:
+        group = np.zeros(len(df), dtype=np.int64)
+        groups = [""]
+    else:
+        group, uniques = pd.factorize(df[color_group_lab], sort=True)
+        groups = [str(g) for g in uniques]
+        # missing values make the last group (use_na_sentinel needs pandas >= 1.5)
+        if (group < 0).any():
+            group = np.where(group < 0, len(groups), group)
+            groups.append("nan")
+    if type(bubble_size) == str:
+        value = pd.to_numeric(df[bubble_size]).to_numpy(dtype=float)
+    else:
+        value = np.ones(len(df))
+
+    os.makedirs(output_dir, exist_ok=True)
+    cells_per_tile = TILE_SIZE // cell_pixels
+    n_tiles, n_features, n_bytes, max_value = 0, 0, 0, []
+    with timer("tiles.export"):
+        for zoom in range(min_zoom, max_zoom + 1):
+            n_cells = cells_per_tile * 2**zoom
+            cx = (x * n_cells).astype(np.int64)
+            cy = (y * n_cells).astype(np.int64)
+            bins = (
+                pd.DataFrame(
+                    {
+                        "frame": frame,
+                        "tx": cx // cells_per_tile,
+                        "ty": cy // cells_per_tile,
+                        "cell": cy * n_cells + cx,
+                        "group": group,
+                        "lat": lat,
+                        "lon": lon,
+                        "value": value,
+                    }
+                )
+                .groupby(["frame", "tx", "ty", "cell", "group"], sort=True)
+                .agg(
+                    lat=("lat", "mean"),
+                    lon=("lon", "mean"),
+                    count=("lat", "size"),
+                    value=("value", "sum"),
+                )
+                .reset_index()
+            )
+            max_value.append(float(bins["value"].max()) if len(bins) else 1.0)
+
+            features = _features(
+                bins["lon"].to_numpy(),
+                bins["lat"].to_numpy(),
+                bins["count"].to_numpy(),
+                bins["value"].to_numpy(),
+                bins["group"].to_numpy(),
+            )
+            # the bins are sorted by frame and tile: one slice of features per file
+            keys = bins[["frame", "tx", "ty"]].to_numpy()
+            starts = np.flatnonzero(
+                np.any(np.diff(keys, axis=0, prepend=-1) != 0, axis=1)
+            )
+            ends = np.append(starts[1:], len(bins))
+            made = set()
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                f, tx, ty = keys[start].tolist()
+                directory = os.path.join(output_dir, str(f), str(zoom), str(tx))
+                if directory not in made:
+                    os.makedirs(directory, exist_ok=True)
+                    made.add(directory)
+                text = (
+                    '{"type":"FeatureCollection","features":['
+                    + ",".join(features[start:end])
+                    + "]}"
+                )
+                with open(os.path.join(directory, f"{ty}.geojson"), "w") as out:
+                    out.write(text)
+                n_bytes += len(text)
+            n_tiles += len(starts)
+            n_features += len(bins)
+
+    meta = {
+        "frames": labels,
+        "groups": groups,
+        "min_zoom": min_zoom,
+        "max_zoom": max_zoom,
+        "max_value": max_value,
+        "radius": radius,
+        "frame_duration": frame_duration,
+        "bounds": (
+            [[float(lat.min()), float(lon.min())], [float(lat.max()), float(lon.max())]]
+            if len(df)
+            else [[-60, -180], [75, 180]]
+        ),
+    }
+    incr("render.bytes_written", n_bytes, sink="tiles")
+    with open(os.path.join(output_dir, "tiles.json"), "w") as out:
+        json.dump(meta, out)
+    with open(os.path.join(output_dir, "index.html"), "w") as out:
+        out.write(VIEWER_HTML.replace("__TITLE__", title_text))
+
+    return {
+        "frames": len(labels),
+        "tiles": n_tiles,
+        "features": n_features,
+        "bytes": n_bytes,
+    }
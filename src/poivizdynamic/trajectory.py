@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+
+from .frames import _drop_missing_coordinates
+
+# mean Earth radius in meters (IUGG)
+EARTH_RADIUS = 6371008.8
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Return the great-circle distance in meters between two arrays of points (degrees), element-wise.
+    """
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def trajectory_stats(df, stop_speed=0.5):
+    """
+    This function computes the distance, speed and dwell time along a footprint trace (a GPS-like log of POIs sorted by date,
+    as clean_dataset returns it), from segment to segment, without any loop over the rows.
+
+    Parameters
+    ---
+    df: pd.DataFrame
+        The dataframe of get_footprint_map, with latitude and longitude columns, and optionally a date column.
+    stop_speed: float, default 0.5
+        Segments slower than stop_speed meters per second are stops; a run of consecutive stops makes one stay,
+        whose duration is the dwell time (unlike a distance threshold, this does not depend on the sampling rate of the log).
+
+    Returns
+    ---
+    Output a pandans.DataFrame with the index of df and one row per point (rows without coordinates are left out):
+    distance_m (from the previous point), cumulative_m (from the first point), elapsed_s (from the previous point),
+    speed_mps (over the segment from the previous point), stay (number of the stay of the point) and dwell_s
+    (time spent stopped during that stay). The times are NaN, and every point is its own stay, without date column.
+    df.attrs["trajectory"] holds the totals: points, distance_m, duration_s, mean_speed_mps, max_speed_mps, and stops,
+    the number of stays with a dwell time.
+
+    Example
+    ---
+    trajectory_stats(clean_dataset(life), stop_speed = 1)
+
+    """
+    df = _drop_missing_coordinates(df)
+    n = len(df)
+    lat = df["latitude"].to_numpy(dtype=float)
+    lon = df["longitude"].to_numpy(dtype=float)
+
+    distance = np.zeros(n)
+    distance[1:] = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    if "date" in df.columns:
+        dates = pd.to_datetime(df["date"]).to_numpy()
+        elapsed = np.zeros(n)
+        elapsed[1:] = (dates[1:] - dates[:-1]) / np.timedelta64(1, "s")
+        if n > 0:
+            elapsed[0] = np.nan if pd.isna(dates[0]) else 0.0
+    else:
+        dates = None
+        elapsed = np.full(n, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speed = np.where(elapsed > 0, distance / elapsed, np.nan)
+    if n > 0:
+        speed[0] = np.nan
+
+    # a new stay starts at every point reached by moving (comparisons with NaN are False: no date, no stop)
+    stopped = distance <= stop_speed * elapsed
+    if n > 0:
+        stopped[0] = False
+    stay = np.cumsum(~stopped) - 1
+    if dates is not None:
+        dwell = np.bincount(stay, weights=np.where(stopped, elapsed, 0))
+        point_dwell = dwell[stay]
+    else:
+        dwell = np.array([])
+        point_dwell = np.full(n, np.nan)
+
+    out = pd.DataFrame(
+        {
+            "distance_m": distance,
+            "cumulative_m": np.cumsum(distance),
+            "elapsed_s": elapsed,
+            "speed_mps": speed,
+            "stay": stay,
+            "dwell_s": point_dwell,
+        },
+        index=df.index,
+    )
+    duration = (
+        float((dates[-1] - dates[0]) / np.timedelta64(1, "s"))
+        if dates is not None and n > 0
+        else np.nan
+    )
+    out.attrs["trajectory"] = {
+        "points": n,
+        "distance_m": float(distance.sum()),
+        "duration_s": duration,
+        "mean_speed_mps": float(distance.sum() / duration) if duration > 0 else np.nan,
+        "max_speed_mps": (
+            float(np.nanmax(speed)) if np.isfinite(speed).any() else np.nan
+        ),
+        "stops": int((dwell > 0).sum()),
+    }
+    return out
+
+
+def _simplify_mask(lat, lon, tolerance):
+    """
+    Douglas-Peucker: the mask of the points kept so that the simplified path stays within tolerance meters of every point.
+    The distances are measured on a local equirectangular projection (fine at the scale of a city or a country);
+    every step handles all the points of a segment at once, so the loop runs once per kept point, not per row.
+    """
+    n = len(lat)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[[0, n - 1]] = True
+
+    lat0 = np.radians(np.nanmean(lat))
+    x = EARTH_RADIUS * np.radians(lon) * np.cos(lat0)
+    y = EARTH_RADIUS * np.radians(lat)
+
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1 : last] - x[first], y[first + 1 : last] - y[first]
+        norm = dx * dx + dy * dy
+        # distance to the segment (not the line): the trace may turn back
+        t = np.clip((px * dx + py * dy) / norm, 0, 1) if norm > 0 else 0.0
+        d = np.hypot(px - t * dx, py - t * dy)
+        i = int(np.argmax(d))
+        if d[i] > tolerance:
+            mid = first + 1 + i
+            keep[mid] = True
+            stack.append((first, mid))
+            stack.append((mid, last))
+    return keep
+
+
+def simplify_trace(df, tolerance=10):
+    """
+    This function simplifies a footprint trace with the Douglas-Peucker algorithm: the points that the path does not need
+    to stay within tolerance meters of the original one are dropped, e.g. the many points of a straight road or of a stop.
+    Frames built on the simplified trace carry fewer coordinates.
+
+    Parameters
+    ---
+    df: pd.DataFrame
+        The dataframe of get_footprint_map, with latitude and longitude columns, sorted by date.
+    tolerance: float, default 10
+        Largest distance in meters allowed between a dropped point and the simplified path.
+
+    Returns
+    ---
+    Output the kept rows of df (rows without coordinates are left out), in the same order; the first and last points are always kept.
+
+    Example
+    ---
+    get_footprint_map(TOKEN_MAPBOX, simplify_trace(clean_dataset(life), tolerance = 25))
+
+    """
+    df = _drop_missing_coordinates(df)
+    mask = _simplify_mask(
+        df["latitude"].to_numpy(dtype=float),
+        df["longitude"].to_numpy(dtype=float),
+        tolerance,
+    )
+    return df[mask]
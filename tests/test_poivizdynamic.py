@@ -1,7 +1,44 @@
 from poivizdynamic import poivizdynamic as pv
 from poivizdynamic import __version__
+from poivizdynamic.cache import GeocodeCache
+from poivizdynamic.clients import ProviderClient, TokenBucket
+from poivizdynamic.streaming import stream_geo_dataset
+from poivizdynamic.export import compact_figure
+from poivizdynamic.render import render_groups, render_maps
+from poivizdynamic.cluster import cluster_points
+from poivizdynamic.frames import resample_frames
+from poivizdynamic.incremental import update_bubble_map, update_footprint_map
+from poivizdynamic.storage import MAP_COLUMNS, read_dataset, write_dataset
+from poivizdynamic.metrics import Metrics, set_metrics
+from poivizdynamic.spatial import PointIndex, reverse_geocode
+from poivizdynamic.tiles import export_tiles
+from poivizdynamic.trajectory import haversine, simplify_trace, trajectory_stats
+from poivizdynamic.providers import (
+    CensusProvider,
+    ChainProvider,
+    GazetteerProvider,
+    GeocoderProvider,
+    RadarProvider,
+    register_provider,
+)
 import os
+import subprocess
+import sys
+import time
+import csv
+import json
+import io
+import logging
+import base64
+import socket
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import numpy as np
 import pandas as pd
+import plotly.io as pio
+import pytest
+import requests
 
 df = pd.read_csv("src/poivizdynamic/data/demo_fake_data.csv")
 travel = pv.get_demo_data(df, "my travel map")
@@ -24,3 +61,968 @@ def test_get_geo_dataset_preprocess(df=travel):
     assert df_world.dtypes["interest_value"] in [int, float]
     assert df_world.dtypes["latitude"] in [int, float]
     assert df_world.dtypes["longitude"] in [int, float]
+
+
+def fake_coordinate_record(api_key, addr, maptype="world", cache=None, provider=None):
+    # offline stand-in for the geo-APIs: a deterministic coordinate per street,
+    # with an uneven delay so that concurrent requests finish out of order.
+    street = addr[0]
+    time.sleep(0.001 * (len(street) % 5))
+    if street.startswith("400"):
+        return None
+    return {
+        "latitude": float(len(street)),
+        "longitude": -float(len(street)),
+        "formattedAddress": street.upper(),
+    }
+
+
+def test_get_geo_dataset_concurrent_matches_serial(monkeypatch):
+    monkeypatch.setattr(pv, "_get_coordinate_record", fake_coordinate_record)
+    df_serial = pv.get_geo_dataset("key", df, maptype="world")
+    df_concurrent = pv.get_geo_dataset("key", df, maptype="world", max_workers=8)
+    pd.testing.assert_frame_equal(df_serial, df_concurrent)
+    assert df_serial.shape == (len(df), 12)
+
+
+class FakeRadarResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, url):
+        self.url = url
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {
+            "addresses": [
+                {"latitude": 40.78, "longitude": -73.96, "formattedAddress": "NYC"}
+            ]
+        }
+
+
+def test_geocode_cache_ttl_lru_and_counters(tmp_path, monkeypatch):
+    cache = GeocodeCache(str(tmp_path / "cache.sqlite"), ttl=60, max_size=2)
+    record = {"latitude": 1.0, "longitude": 2.0, "formattedAddress": "a"}
+    cache.set(["1 Main St", "Town", "NY", "us"], "world", record)
+    assert cache.get([" 1  main st", "TOWN", "ny", "US"], "world") == record
+    assert cache.get(["1 Main St", "Town", "NY", "us"], "US") is None
+
+    cache.set(["2 Main St", "Town", "NY", "us"], "world", record)
+    cache.get(["1 Main St", "Town", "NY", "us"], "world")
+    cache.set(["3 Main St", "Town", "NY", "us"], "world", record)
+    # "2 Main St" is the least recently used entry
+    assert len(cache) == 2
+    assert cache.get(["2 Main St", "Town", "NY", "us"], "world") is None
+    assert cache.stats() == {"hits": 2, "misses": 2, "size": 2}
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get(["3 Main St", "Town", "NY", "us"], "world") is None
+    assert len(cache) == 1
+
+    # a replaced entry is counted once, and the count survives reopening the file
+    cache.set(["4 Main St", "Town", "NY", "us"], "world", record)
+    cache.set(["4 Main St", "Town", "NY", "us"], "world", record)
+    assert len(cache) == 2
+    cache.close()
+    with GeocodeCache(str(tmp_path / "cache.sqlite")) as cache:
+        assert len(cache) == 2
+
+
+def test_get_geo_dataset_uses_persistent_cache(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_request(self, method, url, **kwargs):
+        calls.append(url)
+        return FakeRadarResponse(url)
+
+    monkeypatch.setattr(requests.Session, "request", fake_request)
+    path = str(tmp_path / "cache.sqlite")
+    with GeocodeCache(path) as cache:
+        first = pv.get_geo_dataset("key", travel, maptype="world", cache=cache)
+    assert len(calls) == len(travel)
+
+    with GeocodeCache(path) as cache:
+        second = pv.get_geo_dataset("key", travel, maptype="world", cache=cache)
+        assert cache.stats()["hits"] == len(travel)
+    assert len(calls) == len(travel)
+    pd.testing.assert_frame_equal(first, second)
+
+
+class StubCensusBatchHandler(BaseHTTPRequestHandler):
+    # local stand-in for the Census "addressbatch" endpoint: every street
+    # starting with a digit is a match, the others are not.
+    uploads = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        message = BytesParser().parsebytes(
+            b"Content-Type: "
+            + self.headers["Content-Type"].encode()
+            + b"\r\n\r\n"
+            + body
+        )
+        parts = {
+            part.get_param("name", header="content-disposition"): part.get_payload(
+                decode=True
+            )
+            for part in message.get_payload()
+        }
+        rows = list(csv.reader(io.StringIO(parts["addressFile"].decode())))
+        self.uploads.append(len(rows))
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for uid, street, city, state, _ in rows:
+            address = f"{street}, {city}, {state}"
+            if street[:1].isdigit():
+                writer.writerow(
+                    [
+                        uid,
+                        address,
+                        "Match",
+                        "Exact",
+                        address.upper(),
+                        f"-{len(street)}.5,{len(city)}.25",
+                        "1",
+                        "L",
+                    ]
+                )
+            else:
+                writer.writerow([uid, address, "No_Match"])
+        out = buffer.getvalue().encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_get_geo_dataset_census_bulk(monkeypatch):
+    server = HTTPServer(("127.0.0.1", 0), StubCensusBatchHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(
+        pv, "CENSUS_BATCH_URL", f"http://127.0.0.1:{server.server_port}/addressbatch"
+    )
+    StubCensusBatchHandler.uploads = []
+    try:
+        out = pv.get_geo_dataset("key", df, maptype="US", bulk=True, batch_size=4)
+    finally:
+        server.shutdown()
+
+    n_unique = len(df.drop_duplicates(subset=["street", "city"]))
+    assert StubCensusBatchHandler.uploads[0] == 4
+    assert sum(StubCensusBatchHandler.uploads) == n_unique
+    assert out.shape == (len(df), 12)
+    matched = out["street"].str[:1].str.isdigit()
+    assert out.loc[matched, "latitude"].notna().all()
+    assert out.loc[~matched, "latitude"].isna().all()
+    row = out[matched].iloc[0]
+    assert row["longitude"] == -len(row["street"]) - 0.5
+    assert (
+        row["formattedAddress"]
+        == f"{row['street']}, {row['city']}, {row['state']}".upper()
+    )
+
+
+class StubThrottlingHandler(BaseHTTPRequestHandler):
+    # answers 429 (with Retry-After), then 503, then 200
+    statuses = []
+
+    def do_GET(self):
+        status = self.statuses.pop(0) if self.statuses else 200
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_provider_client_retries_throttled_requests(monkeypatch):
+    server = HTTPServer(("127.0.0.1", 0), StubThrottlingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+    try:
+        StubThrottlingHandler.statuses = [429, 503]
+        client = ProviderClient(max_retries=2, backoff_factor=0.01)
+        assert client.get(url).status_code == 200
+
+        StubThrottlingHandler.statuses = [429, 503]
+        client = ProviderClient(max_retries=1, backoff_factor=0.01)
+        assert client.get(url).status_code == 503
+    finally:
+        server.shutdown()
+
+    # a host that does not resolve fails at once; other connection errors are retried
+    calls = []
+
+    def failing_request(method, url, **kwargs):
+        calls.append(url)
+        if url.startswith("http://slow"):
+            raise requests.exceptions.ReadTimeout("read timed out")
+        if url.startswith("http://dns"):
+            error = socket.gaierror(-2, "Name or service not known")
+        else:
+            error = ConnectionRefusedError(111, "Connection refused")
+        raise requests.exceptions.ConnectionError(error)
+
+    client = ProviderClient(max_retries=2, backoff_factor=0.01)
+    monkeypatch.setattr(client.session, "request", failing_request)
+    for host, tries in [("dns", 1), ("down", 3)]:
+        calls.clear()
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.get(f"http://{host}.invalid/")
+        assert len(calls) == tries
+
+    # a POST whose answer timed out may still be processed: it is not sent again
+    for send, tries in [(client.get, 3), (client.post, 1)]:
+        calls.clear()
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            send("http://slow.invalid/")
+        assert len(calls) == tries
+
+
+def test_token_bucket_keeps_to_the_rate():
+    bucket = TokenBucket(rate=100, capacity=5)
+    start = time.monotonic()
+    for _ in range(25):
+        bucket.acquire()
+    # the 5 burst tokens are free, the 20 others come at 100 per second
+    assert time.monotonic() - start >= 0.19
+
+
+def test_stream_geo_dataset_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(pv, "_get_coordinate_record", fake_coordinate_record)
+    input_path = str(tmp_path / "pois.csv")
+    df.to_csv(input_path, index=False)
+    expected = pd.concat(
+        [
+            pv.get_geo_dataset("key", chunk)
+            for chunk in pd.read_csv(input_path, chunksize=4)
+        ],
+        ignore_index=True,
+    )
+
+    # crash while geocoding the third chunk
+    calls = []
+
+    def crashing_record(*args, **kwargs):
+        calls.append(args)
+        if len(calls) > 8:
+            raise RuntimeError("worker died")
+        return fake_coordinate_record(*args, **kwargs)
+
+    output_path = str(tmp_path / "pois_geo.csv")
+    monkeypatch.setattr(pv, "_get_coordinate_record", crashing_record)
+    with pytest.raises(RuntimeError):
+        stream_geo_dataset("key", input_path, output_path, chunksize=4)
+    assert os.path.exists(output_path + ".checkpoint.json")
+
+    monkeypatch.setattr(pv, "_get_coordinate_record", fake_coordinate_record)
+    # the checkpoint counts chunks of 4 rows
+    with pytest.raises(ValueError):
+        stream_geo_dataset("key", input_path, output_path, chunksize=3)
+    summary = stream_geo_dataset("key", input_path, output_path, chunksize=4)
+    assert summary == {"chunks": -(-len(df) // 4), "rows": len(df)}
+    assert not os.path.exists(output_path + ".checkpoint.json")
+    pd.testing.assert_frame_equal(pd.read_csv(output_path), expected, check_dtype=False)
+
+    pytest.importorskip("pyarrow")
+    parquet_path = str(tmp_path / "pois_geo.parquet")
+    stream_geo_dataset("key", input_path, parquet_path, chunksize=4)
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(parquet_path), expected, check_dtype=False
+    )
+
+    # a first chunk without any match still reads back with the others
+    def later_record(api_key, addr, *args, **kwargs):
+        if addr[0] in df["street"].iloc[:4].tolist():
+            return None
+        return fake_coordinate_record(api_key, addr, *args, **kwargs)
+
+    monkeypatch.setattr(pv, "_get_coordinate_record", later_record)
+    stream_geo_dataset("key", input_path, parquet_path, chunksize=4)
+    expected = pd.concat(
+        [
+            pv.get_geo_dataset("key", chunk)
+            for chunk in pd.read_csv(input_path, chunksize=4)
+        ],
+        ignore_index=True,
+    )
+    assert expected["formattedAddress"].iloc[:4].isna().all()
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(parquet_path), expected, check_dtype=False
+    )
+
+    # a column empty in the first chunk takes the type of the later ones, also across a resume
+    sparse_path = str(tmp_path / "sparse.csv")
+    df.assign(symbol=df["symbol"].where(df.index >= 4)).to_csv(sparse_path, index=False)
+    calls.clear()
+    monkeypatch.setattr(pv, "_get_coordinate_record", crashing_record)
+    with pytest.raises(RuntimeError):
+        stream_geo_dataset("key", sparse_path, parquet_path, chunksize=4)
+    monkeypatch.setattr(pv, "_get_coordinate_record", fake_coordinate_record)
+    stream_geo_dataset("key", sparse_path, parquet_path, chunksize=4)
+    for out in [pd.read_parquet(parquet_path), read_dataset(parquet_path)]:
+        assert out["symbol"].iloc[:4].isna().all()
+        assert (
+            out["symbol"].iloc[4:].fillna("").tolist()
+            == df["symbol"].iloc[4:].fillna("").tolist()
+        )
+
+
+def test_gazetteer_provider_resolves_offline(monkeypatch):
+    monkeypatch.setattr(pv, "_get_coordinate_record", fake_coordinate_record)
+    expected = pv.get_geo_dataset("key", df)
+    monkeypatch.undo()
+
+    class CountingProvider(GeocoderProvider):
+        name = "counting"
+        calls = 0
+
+        def geocode(self, addr):
+            self.calls += 1
+            return None
+
+    unique = expected.drop_duplicates(subset=["street", "city"])
+    reference = unique.iloc[:9]
+    gazetteer = GazetteerProvider(reference)
+    fallback = CountingProvider()
+    out = pv.get_geo_dataset(None, df, provider=ChainProvider([gazetteer, fallback]))
+
+    known = df["street"].isin(reference["street"])
+    assert fallback.calls == len(unique) - 9 + reference["latitude"].isna().sum()
+    pd.testing.assert_frame_equal(out[known], expected[known])
+    assert out.loc[~known, "latitude"].isna().all()
+
+    record = gazetteer.geocode(
+        [
+            "  " + df["street"].iloc[0].upper(),
+            df["city"].iloc[0],
+            df["state"].iloc[0],
+            "us",
+        ]
+    )
+    assert record["latitude"] == expected["latitude"].iloc[0]
+
+    # a registered provider is built once per dataset, not per address
+    built = []
+
+    def factory(api_key):
+        built.append(api_key)
+        return GazetteerProvider(reference)
+
+    register_provider("test-gazetteer", factory)
+    local = pv.get_geo_dataset(None, df, maptype="test-gazetteer", max_workers=4)
+    assert len(built) == 1
+    pd.testing.assert_frame_equal(local[known], expected[known])
+
+
+def test_get_geo_dataset_normalized_dedup(monkeypatch):
+    calls = []
+
+    def counting_record(*args, **kwargs):
+        calls.append(args[1])
+        return fake_coordinate_record(*args, **kwargs)
+
+    monkeypatch.setattr(pv, "_get_coordinate_record", counting_record)
+    variants = pd.DataFrame(
+        {
+            "street": ["123 Main St", "123 Main Street ", "123  main st.", "9 Elm Ave"],
+            "city": ["New Haven", "new haven", "New Haven", "Hamden"],
+            "state": ["CT", "Connecticut", "CT 06511", "CT"],
+            "country": "us",
+        }
+    )
+
+    exact = pv.get_geo_dataset("key", variants)
+    assert len(calls) == 4
+    assert exact.attrs["geocoding"]["dedup_ratio"] == 0
+
+    calls.clear()
+    out = pv.get_geo_dataset("key", variants, normalize=True)
+    assert len(calls) == 2
+    assert out.attrs["geocoding"] == {
+        "rows": 4,
+        "unique_addresses": 2,
+        "dedup_ratio": 0.5,
+    }
+    assert out["formattedAddress"].tolist() == ["123 MAIN ST"] * 3 + ["9 ELM AVE"]
+    pd.testing.assert_frame_equal(out[variants.columns], variants)
+
+
+def make_trace(n):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "spot_name": [f"spot {i}" for i in range(n)],
+            "symbol": "car",
+            "interest_value": rng.integers(1, 100, n),
+            "date": pd.date_range("2021-09-01", periods=n, freq="H"),
+            "latitude": 40 + rng.random(n),
+            "longitude": -74 + rng.random(n),
+        }
+    )
+
+
+def test_footprint_figure_frames():
+    trace = make_trace(50)
+    fig = pv._build_footprint_figure("token", trace)
+    assert len(fig["frames"]) == 49
+    last = fig["frames"][-1]["data"][0]
+    assert list(last["lon"]) == trace["longitude"].tolist()
+    assert len(fig["frames"][0]["data"][0]["lat"]) == 2
+
+    fig = pv._build_footprint_figure("token", trace, max_frames=10)
+    ends = [len(frame["data"][0]["lon"]) for frame in fig["frames"]]
+    assert len(ends) == 10 and ends[-1] == 50 and ends == sorted(ends)
+    html = pio.to_html(fig, validate=False)
+    assert html.count("scattermapbox") >= 11
+
+    # a single frame shows the whole trace
+    fig = pv._build_footprint_figure("token", trace, max_frames=1)
+    assert [len(frame["data"][0]["lon"]) for frame in fig["frames"]] == [50]
+    with pytest.raises(ValueError):
+        pv._build_footprint_figure("token", trace, max_frames=0)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"color_value_discrete": False, "color_group_lab": "interest_value"},
+        {"color_value_discrete": False},
+        {"bubble_size": 15, "color_group_lab": "interest_value"},
+    ],
+)
+def test_fast_bubble_figure_matches_express(kwargs):
+    trace = make_trace(300)
+    trace["spot_name"] = trace["spot_name"].str[-1]
+    trace["date"] = trace["date"].dt.floor("D")
+    if not kwargs.get("color_group_lab"):
+        # POIs without name are left out by plotly.express
+        trace.loc[[40, 41], "spot_name"] = None
+    express = pv._build_bubble_figure_express(trace.copy(), **kwargs)
+    fast = pv._build_bubble_figure(trace.copy(), **kwargs)
+    assert json.loads(pio.to_json(fast, validate=False)) == json.loads(
+        pio.to_json(express, validate=False)
+    )
+
+
+def test_compact_figure_typed_arrays_and_dedup(monkeypatch):
+    trace = make_trace(50)
+    fig = pv._build_footprint_figure("token", trace, max_frames=10)
+    before = pio.to_json(fig, validate=False)
+    compact = compact_figure(fig)
+    # the input figure is left untouched
+    assert pio.to_json(fig, validate=False) == before
+
+    last = compact["frames"][-1]["data"][0]
+    assert last["lon"]["dtype"] == "f4"
+    lon = np.frombuffer(base64.b64decode(last["lon"]["bdata"]), dtype="<f4")
+    np.testing.assert_array_equal(lon, trace["longitude"].to_numpy(np.float32))
+    # only the growing coordinates are repeated in the frames
+    assert set(last) == {"lon", "lat"}
+    assert compact["data"][0]["type"] == "scattermapbox"
+
+    assert len(pio.to_html(compact, validate=False)) < len(
+        pio.to_html(fig, validate=False)
+    )
+
+    # the plotly.js of plotly < 5.19 cannot decode the typed arrays
+    monkeypatch.setattr("plotly.__version__", "5.4.0")
+    with pytest.raises(ImportError):
+        compact_figure(fig)
+
+
+def test_render_maps_batch_without_display(tmp_path, monkeypatch):
+    def fail_show(*args, **kwargs):
+        raise AssertionError("batch rendering must not display figures")
+
+    monkeypatch.setattr(pio, "show", fail_show)
+    trace = make_trace(30)
+    jobs = [
+        {"kind": "footprint", "df": trace, "fig_name": "footprint", "max_frames": 5},
+        {"df": trace, "fig_name": "bubble", "engine": "fast"},
+        {"df": trace, "fig_name": "nothing", "engine": "fast", "sink": None},
+    ]
+    figures = render_maps(jobs, "token", output_dir=str(tmp_path), sink="json")
+
+    assert sorted(os.listdir(tmp_path)) == ["bubble.json", "footprint.json"]
+    assert len(figures) == 3 and len(figures[0]["frames"]) == 5
+    with open(tmp_path / "bubble.json") as f:
+        saved = json.load(f)
+    assert saved == json.loads(pio.to_json(figures[1], validate=False))
+    assert figures[0]["layout"]["mapbox"]["accesstoken"] == "token"
+
+    assert render_maps(
+        jobs[:1], output_dir=str(tmp_path), sink="html", return_figures=False
+    ) == [None]
+    assert os.path.exists(tmp_path / "footprint.html")
+    with pytest.raises(ValueError):
+        render_maps([{"kind": "pie", "df": trace}], output_dir=str(tmp_path))
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_render_groups_one_file_per_group(tmp_path, max_workers):
+    trace = make_trace(60)
+    trace["state"] = np.repeat(["NY", "NJ", "CA/ORE"], 20)
+    summary = render_groups(
+        trace,
+        "state",
+        output_dir=str(tmp_path),
+        sink="json",
+        fig_name="poi_{group}",
+        max_workers=max_workers,
+        engine="fast",
+    )
+    assert summary["group"].tolist() == ["CA/ORE", "NJ", "NY"]
+    assert summary["rows"].tolist() == [20, 20, 20]
+    assert sorted(os.listdir(tmp_path)) == [
+        "poi_CA_ORE.json",
+        "poi_NJ.json",
+        "poi_NY.json",
+    ]
+    assert (summary["seconds"] > 0).all()
+    with open(tmp_path / "poi_NJ.json") as f:
+        fig = json.load(f)
+    serial = pv._build_bubble_figure(trace[trace["state"] == "NJ"])
+    assert fig == json.loads(pio.to_json(serial, validate=False))
+
+
+def test_cluster_points_per_frame_and_group():
+    trace = make_trace(48)
+    trace["spot_name"] = np.where(np.arange(48) % 2 == 0, "a", "b")
+    # two days, all POIs within about 100 m
+    trace["latitude"] = 40 + trace["latitude"] / 1000
+    trace["longitude"] = -74 + trace["longitude"] / 1000
+
+    clusters = cluster_points(trace, zoom=2.5)
+    assert len(clusters) == 4
+    assert clusters["n_points"].tolist() == [12, 12, 12, 12]
+    assert clusters.groupby("spot_name")["interest_value"].sum().to_dict() == (
+        trace.groupby("spot_name")["interest_value"].sum().to_dict()
+    )
+    means = cluster_points(trace, zoom=2.5, agg="mean")
+    assert means["interest_value"].max() <= trace["interest_value"].max()
+
+    # zooming in separates the points again
+    assert len(cluster_points(trace, zoom=20)) == 48
+    continuous = cluster_points(trace, zoom=2.5, color_group_lab="interest_value")
+    assert len(continuous) == 2
+
+    fig = pv.get_animated_bubble_map(
+        trace, engine="fast", cluster=True, show=False, sink=None
+    )
+    assert len(fig["frames"]) == 2
+    assert [len(t["lat"]) for t in fig["frames"][0]["data"]] == [1, 1]
+
+
+def test_resample_frames_bounds_the_frames():
+    trace = make_trace(96)
+    trace["spot_name"] = np.where(np.arange(96) % 2 == 0, "a", "b")
+    trace["latitude"] = np.where(trace["spot_name"] == "a", 40.0, 41.0)
+    trace["longitude"] = -74.0
+
+    daily = resample_frames(trace, "day")
+    assert len(daily) == 8 and daily["date"].nunique() == 4
+    assert daily["interest_value"].sum() == trace["interest_value"].sum()
+    assert resample_frames(trace, "day", agg="max")["interest_value"].max() == (
+        trace["interest_value"].max()
+    )
+    assert resample_frames(trace, 3)["date"].nunique() == 3
+
+    daily_trace = trace.assign(date=pd.date_range("2021-09-01", periods=96))
+    for engine in ["express", "fast"]:
+        fig = pv.get_animated_bubble_map(
+            daily_trace, engine=engine, frame_freq="week", show=False, sink=None
+        )
+        fig = json.loads(pio.to_json(fig, validate=False))
+        names = [frame["name"] for frame in fig["frames"]]
+        assert len(names) == 14 and names[:2] == ["2021-08-30", "2021-09-06"]
+    fig = pv.get_animated_bubble_map(
+        trace.iloc[:5], engine="fast", frame_freq="hour", show=False, sink=None
+    )
+    assert fig["frames"][1]["name"] == "2021-09-01 01:00"
+
+    windows = pv._build_footprint_figure(
+        "token", trace, frame_freq="day", cumulative=False
+    )
+    assert [len(frame["data"][0]["lon"]) for frame in windows["frames"]] == [24] * 4
+    assert windows["frames"][1]["data"][0]["text"][0] == trace["spot_name"][24]
+    growing = pv._build_footprint_figure("token", trace, frame_freq=2)
+    assert [len(frame["data"][0]["lon"]) for frame in growing["frames"]] == [48, 96]
+
+
+def test_incremental_updates_match_a_full_build(tmp_path):
+    trace = make_trace(120)
+    trace["spot_name"] = np.array(list("abc"))[np.arange(120) % 3]
+    # the largest bubble comes first, so that the first call sets the final scale
+    trace.loc[0, "interest_value"] = 200
+    parts = [trace.iloc[:30], trace.iloc[30:60], trace.iloc[60:]]
+
+    with pytest.raises(ValueError):
+        update_footprint_map(
+            "token",
+            parts[0],
+            fig_name="footprint",
+            output_dir=str(tmp_path),
+            stats=True,
+        )
+    for i, part in enumerate(parts):
+        update_bubble_map(
+            part, fig_name="bubble", output_dir=str(tmp_path), sink="json"
+        )
+        # the later calls keep the frame_freq of the first one
+        update_footprint_map(
+            "token",
+            part,
+            fig_name="footprint",
+            output_dir=str(tmp_path),
+            sink="json",
+            frame_freq="day" if i == 0 else None,
+        )
+    full = {
+        "bubble": pv._build_bubble_figure(trace),
+        "footprint": pv._build_footprint_figure("token", trace, frame_freq="day"),
+    }
+    for name, fig in full.items():
+        fig = json.loads(pio.to_json(fig, validate=False))
+        with open(tmp_path / f"{name}.json") as f:
+            updated = json.load(f)
+        # the map stays centered on the first POIs
+        fig["layout"]["mapbox"].pop("center")
+        updated["layout"]["mapbox"].pop("center")
+        assert updated == fig
+
+    with pytest.raises(ValueError):
+        update_bubble_map(parts[0], fig_name="bubble", output_dir=str(tmp_path))
+
+    # one frame per POI: older POIs are refused too
+    update_footprint_map("token", parts[1], fig_name="trace", output_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        update_footprint_map(
+            "token", parts[0], fig_name="trace", output_dir=str(tmp_path)
+        )
+
+    # hourly frames keep their hours, even when the first ones fall at midnight
+    start = pd.Timestamp("2021-09-01")
+    for hours in [0, 5, 9]:
+        update_bubble_map(
+            trace.iloc[:1].assign(date=start + pd.Timedelta(hours=hours)),
+            fig_name="hourly",
+            output_dir=str(tmp_path),
+            sink="json",
+            frame_freq="hour",
+        )
+    with open(tmp_path / "hourly.json") as f:
+        names = [frame["name"] for frame in json.load(f)["frames"]]
+    assert names == ["2021-09-01 00:00", "2021-09-01 05:00", "2021-09-01 09:00"]
+
+
+def test_clean_dataset_leaves_input_and_reports():
+    trace = make_trace(10)
+    raw = trace.assign(
+        date=trace["date"].dt.strftime("%d/%m/%Y %H:%M"),
+        latitude=trace["latitude"].astype(str),
+    )
+    raw.loc[3, "latitude"] = "not a number"
+    raw.loc[5, "longitude"] = 200.0
+    before = raw.copy()
+
+    with pytest.warns(UserWarning):
+        out = pv.clean_dataset(raw, date_format="%d/%m/%Y %H:%M")
+    pd.testing.assert_frame_equal(raw, before)
+    assert out["date"].tolist() == trace["date"].tolist()
+    assert out.attrs["validation"] == {
+        "rows": 10,
+        "missing_date": 0,
+        "missing_latitude": 1,
+        "missing_longitude": 0,
+        "out_of_range_latitude": 0,
+        "out_of_range_longitude": 1,
+        "dropped": 0,
+        "already_sorted": True,
+    }
+
+    small = pv.clean_dataset(raw.iloc[::-1], downcast=True, drop_invalid=True)
+    assert small.index.tolist() == [0, 1, 2, 4, 6, 7, 8, 9]
+    assert small.attrs["validation"]["dropped"] == 2
+    assert not small.attrs["validation"]["already_sorted"]
+    assert small["latitude"].dtype == np.float32
+    assert small["spot_name"].dtype == "category"
+
+
+@pytest.mark.parametrize("name", ["pois.parquet", "pois.arrow"])
+def test_write_and_read_dataset_keep_the_schema(tmp_path, name):
+    pytest.importorskip("pyarrow")
+    trace = make_trace(40).assign(street="1 Main St", state="NY")
+    trace["date"] = trace["date"].astype(str)
+    clean = pv.clean_dataset(trace.iloc[::-1], downcast=True)
+    path = write_dataset(clean, str(tmp_path / name))
+
+    loaded = read_dataset(path)
+    pd.testing.assert_frame_equal(loaded, clean.reset_index(drop=True))
+    assert loaded.attrs["validation"] == clean.attrs["validation"]
+
+    projected = read_dataset(path, columns=MAP_COLUMNS)
+    assert projected.columns.tolist() == MAP_COLUMNS
+    fig = pv._build_footprint_figure("token", projected, max_frames=4)
+    assert len(fig["frames"]) == 4
+    with pytest.raises(ValueError):
+        read_dataset(str(tmp_path / "pois.csv"))
+
+
+def test_geocoding_never_imports_plotly():
+    code = """
+import sys
+import pandas as pd
+import poivizdynamic.poivizdynamic as pv
+from poivizdynamic.providers import GazetteerProvider
+from poivizdynamic.streaming import stream_geo_dataset
+df = pd.DataFrame({"street": ["1 Main St"], "city": ["Reno"], "state": ["NV"], "country": ["US"]})
+out = pv.get_geo_dataset(None, df, provider=GazetteerProvider(df.assign(latitude=39.5, longitude=-119.8)))
+assert len(out) == 1
+print(sorted(name for name in sys.modules if name.split(".")[0] == "plotly"))
+"""
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.splitlines()[-1] == "[]"
+
+
+def test_metrics_hooks_and_logging(tmp_path, caplog, capsys):
+    reference = df.drop_duplicates(subset=["street", "city"]).assign(
+        latitude=40.0, longitude=-75.0
+    )
+    events = []
+    metrics = Metrics()
+    metrics.add_hook(lambda kind, name, value, tags: events.append((kind, name)))
+    previous = set_metrics(metrics)
+    try:
+        with caplog.at_level(logging.DEBUG, logger="poivizdynamic"):
+            out = pv.get_geo_dataset(None, df, provider=GazetteerProvider(reference))
+            pv.get_animated_bubble_map(
+                make_trace(30),
+                engine="fast",
+                show=False,
+                output_dir=str(tmp_path),
+                fig_name="bubble",
+                sink="json",
+            )
+    finally:
+        set_metrics(previous)
+
+    # nothing printed: the messages go through the logging module
+    assert capsys.readouterr().out == ""
+    assert any("unique addresses" in r.getMessage() for r in caplog.records)
+    assert any(r.getMessage() == "the value is discrete" for r in caplog.records)
+
+    snap = metrics.snapshot()
+    requests_ = snap["timings"]["geocode.request"]
+    assert requests_["count"] == len(reference)
+    assert sum(requests_["histogram"].values()) == requests_["count"]
+    assert requests_["min"] <= requests_["mean"] <= requests_["max"]
+    assert snap["timings"]["geocode.dataset"]["count"] == 1
+    assert snap["timings"]["render.build"]["count"] == 1
+    assert snap["counters"]["render.bytes_written"] == os.path.getsize(
+        tmp_path / "bubble.json"
+    )
+    assert ("timing", "render.write") in events
+    assert out["latitude"].notna().all()
+
+    metrics.reset()
+    assert metrics.snapshot() == {"counters": {}, "timings": {}}
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    # local stand-in for the Radar and Census single address endpoints
+    paths = []
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        if self.path.startswith("/radar"):
+            body = {
+                "addresses": [
+                    {"latitude": 1.5, "longitude": 2.5, "formattedAddress": "r"}
+                ]
+            }
+        else:
+            body = {
+                "result": {
+                    "addressMatches": [
+                        {"coordinates": {"x": 2.5, "y": 1.5}, "matchedAddress": "c"}
+                    ]
+                }
+            }
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_providers_use_the_configured_endpoint():
+    server = HTTPServer(("127.0.0.1", 0), StubGeocoderHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    StubGeocoderHandler.paths = []
+    addr = ["1 Main St", "Reno", "NV", "us"]
+    try:
+        radar = RadarProvider("key", api_url=base + "/radar").geocode(addr)
+        census = CensusProvider("key", api_url=base + "/census").geocode(addr)
+    finally:
+        server.shutdown()
+
+    assert radar == {"latitude": 1.5, "longitude": 2.5, "formattedAddress": "r"}
+    assert census == {"latitude": 1.5, "longitude": 2.5, "formattedAddress": "c"}
+    assert StubGeocoderHandler.paths[1].startswith("/census?street=1")
+    assert RadarProvider("key").api_url.startswith("https://api.radar.io/")
+
+
+def test_trajectory_stats_and_simplified_footprint():
+    # one degree of latitude north in 10 minutes, a 20 minute stop, then one degree east
+    trace = pd.DataFrame(
+        {
+            "spot_name": list("abcdef"),
+            "symbol": "car",
+            "date": pd.Timestamp("2022-01-01 10:00")
+            + pd.to_timedelta([0, 5, 10, 20, 30, 90], unit="min"),
+            "latitude": [0.0, 0.5, 1.0, 1.0, 1.0, 1.0],
+            "longitude": [0.0, 0.0, 0.0, 0.00001, 0.0, 1.0],
+        }
+    )
+    assert haversine(0, 0, 1, 0) == pytest.approx(111195, rel=1e-4)
+
+    stats = trajectory_stats(trace)
+    assert stats["distance_m"].iloc[1] == pytest.approx(111195 / 2, rel=1e-4)
+    assert stats["speed_mps"].iloc[1] == pytest.approx(111195 / 2 / 300, rel=1e-4)
+    assert stats["stay"].tolist() == [0, 1, 2, 2, 2, 3]
+    assert stats["dwell_s"].tolist() == [0, 0, 1200, 1200, 1200, 0]
+    assert stats.attrs["trajectory"]["stops"] == 1
+    assert stats.attrs["trajectory"]["duration_s"] == 5400
+    assert stats["cumulative_m"].iloc[-1] == pytest.approx(
+        stats.attrs["trajectory"]["distance_m"]
+    )
+
+    # the points on the straight lines and of the stop are dropped, the corner is kept
+    assert simplify_trace(trace, tolerance=10)["spot_name"].tolist() == ["a", "c", "f"]
+
+    fig = pv._build_footprint_figure("token", trace, simplify=10, stats=True)
+    assert len(fig["data"][0]["lon"]) == 3 and len(fig["frames"]) == 2
+    # the distance is the one travelled, measured before the simplification
+    assert fig["data"][0]["customdata"][-1, 0] == pytest.approx(
+        stats["cumulative_m"].iloc[-1] / 1000
+    )
+    assert "km/h" in fig["data"][0]["hovertemplate"]
+
+
+def test_export_tiles_bins_every_poi_once_per_zoom(tmp_path):
+    trace = make_trace(200)
+    trace.loc[0, "latitude"] = np.nan
+    trace.loc[1, "spot_name"] = np.nan
+    summary = export_tiles(
+        trace, str(tmp_path), max_zoom=6, frame_freq="day", bubble_size=1
+    )
+    with open(tmp_path / "tiles.json") as f:
+        meta = json.load(f)
+    assert meta["frames"][0] == "2021-09-01" and meta["frames"][-1] == "2021-09-09"
+    assert summary["frames"] == 9 and len(meta["groups"]) == 199
+    # the POI without name has a group of its own
+    assert meta["groups"][-1] == "nan"
+    assert (tmp_path / "index.html").read_text().count("tiles.json") == 1
+
+    days = trace.dropna(subset=["latitude"])["date"].dt.day
+    for zoom in range(7):
+        for frame in range(9):
+            counts = []
+            for path in (tmp_path / str(frame) / str(zoom)).glob("*/*.geojson"):
+                with open(path) as f:
+                    tile = json.load(f)
+                x, y = int(path.parent.name), int(path.stem)
+                for feature in tile["features"]:
+                    lon, lat = feature["geometry"]["coordinates"]
+                    # every bin lies in the tile of its file
+                    assert int((lon + 180) / 360 * 2**zoom) == x
+                    assert 0 <= y < 2**zoom
+                    counts.append(feature["properties"]["count"])
+            assert sum(counts) == (days == frame + 1).sum()
+
+
+def test_reverse_geocode_matches_a_brute_force_search():
+    rng = np.random.default_rng(0)
+    reference = pd.DataFrame(
+        {
+            "spot_name": [f"spot {i}" for i in range(500)],
+            "formattedAddress": [f"{i} Main St" for i in range(500)],
+            "latitude": rng.uniform(40, 41, 500),
+            "longitude": rng.uniform(-75, -73, 500),
+        }
+    )
+    # the same POIs visited again: one point each in the index
+    reference = pd.concat([reference, reference.iloc[:50]], ignore_index=True)
+    points = pd.DataFrame(
+        {
+            "spot_name": "gps",
+            "latitude": np.append(rng.uniform(39.9, 41.1, 300), [np.nan, 0.0]),
+            "longitude": np.append(rng.uniform(-75.1, -72.9, 300), [-74.0, 0.0]),
+        }
+    )
+    expected = haversine(
+        points["latitude"].to_numpy()[:, None],
+        points["longitude"].to_numpy()[:, None],
+        reference["latitude"].to_numpy()[:500],
+        reference["longitude"].to_numpy()[:500],
+    )
+
+    index = PointIndex(reference, backend="grid")
+    assert len(index) == 500
+    out = reverse_geocode(points, index)
+    assert out["spot_name_nearest"].iloc[:300].tolist() == [
+        f"spot {i}" for i in expected[:300].argmin(axis=1)
+    ]
+    np.testing.assert_allclose(out["distance_m"].iloc[:300], expected[:300].min(axis=1))
+    assert out["formattedAddress"].iloc[300:301].isna().all()
+    assert out["distance_m"].iloc[-1] > 5_000_000
+    assert points.columns.tolist() == ["spot_name", "latitude", "longitude"]
+
+    near = reverse_geocode(points, reference, max_distance=2000, backend="grid")
+    assert (
+        near.attrs["reverse_geocoding"]["matched"]
+        == (expected.min(axis=1) <= 2000).sum()
+    )
+    assert (near["distance_m"].dropna() <= 2000).all()
+
+
+def test_point_index_query_far_from_a_dense_cluster():
+    rng = np.random.default_rng(1)
+    reference = pd.DataFrame(
+        {
+            "latitude": rng.uniform(40, 40.2, 50_000),
+            "longitude": rng.uniform(-74, -73.8, 50_000),
+        }
+    )
+    index = PointIndex(reference, backend="grid")
+    lat = np.array([41.1, 43.1, 70.0, -40.1])
+    lon = np.array([-73.9, -73.9, 106.1, 106.1])
+    expected = haversine(
+        lat[:, None],
+        lon[:, None],
+        index.lat,
+        index.lon,
+    )
+    distance, position = index.query(lat, lon)
+    assert position.tolist() == expected.argmin(axis=1).tolist()
+    np.testing.assert_allclose(distance, expected.min(axis=1))